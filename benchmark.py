@@ -0,0 +1,306 @@
+#
+# @file <benchmark.py>
+#
+# @author Fernando Mendiburu - <fernando.mendiburu@ee.ufcg.edu.br>
+#
+
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import tracemalloc
+
+from common import Common
+from fake_psutil import FakePsutil, FakeGPUtil, FakeProcfs, FakeCgroupfs
+
+
+class Benchmark:
+    MACHINE = {'cores': 256, 'mounts': 500, 'nics': 100, 'sensors': 64, 'gpus': 8, 'processes': 1000, 'cgroups': 300}
+    # every collector measured in each update
+    CONFIG = {'CPU_MIN_WINDOW': 0,
+              'GPU_BACKEND': 'gputil',
+              'SAMPLE_PERIODS': {name: 0 for name in ('cpu', 'memory', 'temperature', 'gpu', 'battery', 'disk',
+                                                      'network', 'processes', 'cgroups', 'system')},
+              'COLLECTOR_TIMEOUT': 30,
+              'COLLECTOR_TIMEOUTS': {},
+              'DISK_EXCLUDE_FSTYPES': [],
+              'NOTIFICATION_SINK': 'null',
+              'RULES': {'cpu': 'avg(cpu.total, 5m) > HIGH_USAGE_CPU',
+                        'cores': 'max(cpu.core*, 1m) >= 95',
+                        'temperature': 'max(temp.*, 30s) >= critical',
+                        'battery': 'rate(battery, 10m) < -2%/min'}
+              }
+
+    def __init__(self, iterations, machine=None, backend='psutil'):
+        self.iterations = iterations
+        self.machine = dict(Benchmark.MACHINE, **(machine or {}))
+        self.backend = backend
+        self.procfs_root = None
+        self.state_dir = None
+        self.params_obj = None
+        self.results = {}
+
+    def install_backend(self):
+        # the collectors modules use the fake psutil, and GPUtil is the fake one
+        import procfs
+        import system
+        import processes
+        import partitions
+        import cpu_sampler
+
+        backend = FakePsutil(self.machine['cores'], self.machine['mounts'], self.machine['nics'],
+                             self.machine['sensors'], self.machine['processes'])
+        for module in (procfs, system, processes, partitions, cpu_sampler):
+            module.psutil = backend
+        sys.modules['GPUtil'] = FakeGPUtil(self.machine['gpus'])
+
+        # the state files, config and history are not the ones of the running pc_status
+        state_dir = self.state_dir = tempfile.mkdtemp(prefix='pc_status-benchmark-')
+        Common.CPU_STATE_FILE = os.path.join(state_dir, 'cpu_state.txt')
+        Common.ALARM_STATE_FILE = os.path.join(state_dir, 'alarm_state.txt')
+        Common.HISTORY_DIR = os.path.join(state_dir, 'history')
+
+        # procfs backend: the /proc and /sys files of the same machine (the counters do not advance), and the
+        # cgroups of its services and containers with both backends
+        self.procfs_root = os.path.join(state_dir, 'root')
+        FakeCgroupfs.write(self.procfs_root, self.machine['cgroups'])
+        if self.backend == 'procfs':
+            FakeProcfs.write(self.procfs_root, self.machine['cores'], self.machine['mounts'], self.machine['nics'],
+                             self.machine['sensors'])
+
+    def create_sensor(self):
+        from sensor import Sensor
+        from rw_parameters import ReadParametersFiles
+
+        config_params = dict(Common.parse_params(Common.CONFIG_FILE), **Benchmark.CONFIG)
+        config_params['BACKEND'] = self.backend
+        config_params['TEMPERATURE_BACKEND'] = 'hwmon' if self.backend == 'procfs' else 'psutil'
+        if self.procfs_root is not None:
+            config_params['PROCFS_ROOT'] = self.procfs_root
+        Common.CONFIG_FILE = os.path.join(self.state_dir, 'config.txt')
+        Common.write_params(Common.CONFIG_FILE, config_params)
+        self.params_obj = ReadParametersFiles()
+        sensor = Sensor(self.params_obj)
+        sensor.update()
+        return sensor
+
+    def get_cases(self, sensor):
+        from metrics import OpenMetrics
+        from shared_snapshot import SnapshotWriter
+        from output import BufferedOutput
+        from dashboard import Dashboard
+
+        dashboard = Dashboard(BufferedOutput(sensor.params_obj.config_params, io.BytesIO()),
+                              sensor.params_obj.config_params)
+        dashboard.sensor = sensor
+        snapshot_writer = SnapshotWriter(os.path.join(self.state_dir, 'snapshot'))
+        record = sensor.get_record()
+        cases = {f'update.{name}': collector.update for name, collector in sensor.collectors.items()}
+        cases.update({'update.sensor': sensor.update,
+                      'render.cpu.get_usage_msg': sensor.cpu.get_usage_msg,
+                      'render.memory.get_mem_swap_msg': sensor.memory.get_mem_swap_msg,
+                      'render.battery.get_percentage_msg': sensor.battery.get_percentage_msg,
+                      'render.temperature.get_temperature_string': sensor.temperature.get_temperature_string,
+                      'render.gpu.get_gpu_string': sensor.gpu.get_gpu_string,
+                      'render.disk.get_io_msg_list': sensor.disk.get_io_msg_list,
+                      'render.network.get_io_msg': lambda: [sensor.network.get_io_msg(name)
+                                                            for name in sensor.network.nics_io],
+                      'render.processes.get_top_cpu_msg': sensor.processes.get_top_cpu_msg,
+                      'render.sensor.get_status_msg': sensor.get_status_msg,
+                      'render.sensor.get_full_msg': sensor.get_full_msg,
+                      'render.sensor.get_record': sensor.get_record,
+                      'render.openmetrics': lambda: OpenMetrics.encode(sensor.get_metrics()),
+                      'render.snapshot.publish': lambda: snapshot_writer.publish(record),
+                      'render.dashboard.draw': dashboard.draw,
+                      'alarm.cpu.is_cpu_high_usage': sensor.cpu.is_cpu_high_usage,
+                      'alarm.memory.is_high_usage': sensor.memory.is_high_usage,
+                      'alarm.battery.is_discharging_below_threshold': sensor.battery.is_discharging_below_threshold,
+                      'alarm.temperature.is_high_temperature': sensor.temperature.is_high_temperature,
+                      'alarm.gpu.is_high_load': sensor.gpu.is_high_load,
+                      'alarm.rules': lambda: sensor.rules.evaluate(sensor.get_dispatcher(),
+                                                                   sensor.params_obj.config_params, sensor.get_limit),
+                      'alarm.sensor.notify': lambda: sensor.notify(False)
+                      })
+        return cases
+
+    @staticmethod
+    def get_percentile(sorted_values, percentile):
+        index = min(int(len(sorted_values) * percentile / 100), len(sorted_values) - 1)
+        return sorted_values[index]
+
+    def measure(self, function):
+        function()      # warm up (caches, first measures)
+        times = []
+        for _ in range(self.iterations):
+            start = time.perf_counter()
+            function()
+            times.append(time.perf_counter() - start)
+        times.sort()
+
+        # allocations in a second pass, tracemalloc slows down the timed one
+        allocations = []
+        tracemalloc.start()
+        for _ in range(min(self.iterations, 20)):
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            function()
+            allocations.append(tracemalloc.get_traced_memory()[1] - before)
+        tracemalloc.stop()
+        allocations.sort()
+
+        return {'p50': Benchmark.get_percentile(times, 50),
+                'p99': Benchmark.get_percentile(times, 99),
+                'alloc_bytes': Benchmark.get_percentile(allocations, 50)
+                }
+
+    def run(self, pattern=None):
+        self.install_backend()
+        sensor = None
+        try:
+            sensor = self.create_sensor()
+            for name, function in self.get_cases(sensor).items():
+                if pattern is None or pattern in name:
+                    self.results[name] = self.measure(function)
+                    print(Benchmark.get_result_msg(name, self.results[name]))
+        finally:
+            if sensor is not None:
+                sensor.close()
+            if self.params_obj is not None:
+                self.params_obj.history_store.close()
+            shutil.rmtree(self.state_dir, ignore_errors=True)
+        return self.results
+
+    @staticmethod
+    def get_result_msg(name, result):
+        return f'{name:<50}p50 {result["p50"] * 1e6:10.1f}us  p99 {result["p99"] * 1e6:10.1f}us  ' \
+               f'alloc {result["alloc_bytes"] / 1024:9.1f}KB'
+
+    def save(self, file):
+        with open(file, 'w') as fp:
+            json.dump({'machine': self.machine,
+                       'backend': self.backend,
+                       'iterations': self.iterations,
+                       'python': platform.python_version(),
+                       'results': self.results}, fp, indent=1)
+
+    def compare(self, file, tolerance, min_delta):
+        # regression: p50 slower than the baseline by more than the tolerance (and min_delta seconds)
+        with open(file, 'r') as fp:
+            baseline = json.load(fp)['results']
+        regressions = []
+        for name, result in self.results.items():
+            if name not in baseline:
+                print(f'{name:<50}new (not in the baseline)')
+                continue
+            before, after = baseline[name]['p50'], result['p50']
+            change = (after - before) / before * 100 if before else 0.0
+            b_regression = after > before * (1 + tolerance) and after - before > min_delta
+            print(f'{name:<50}{before * 1e6:10.1f}us -> {after * 1e6:10.1f}us ({change:+.1f}%)'
+                  f'{"  REGRESSION" if b_regression else ""}')
+            if b_regression:
+                regressions.append(name)
+        return regressions
+
+
+class BackendComparison:
+    # psutil and procfs backends on this machine (the real /proc and /sys): time and read system calls by sample
+    FUNCTIONS = (('cpu_times', {'percpu': True}),
+                 ('virtual_memory', {}),
+                 ('swap_memory', {}),
+                 ('disk_io_counters', {'perdisk': True}),
+                 ('net_io_counters', {'pernic': True}),
+                 ('sensors_temperatures', {}))
+
+    def __init__(self, iterations):
+        self.iterations = iterations
+
+    @staticmethod
+    def get_read_syscalls():
+        # read system calls of this process (the read of /proc/self/io included, see get_baseline)
+        with open('/proc/self/io', 'rb') as fp:
+            for line in fp:
+                if line.startswith(b'syscr:'):
+                    return int(line.split()[1])
+        return 0
+
+    def count_read_syscalls(self, function):
+        start = BackendComparison.get_read_syscalls()
+        for _ in range(self.iterations):
+            function()
+        return (BackendComparison.get_read_syscalls() - start) / self.iterations
+
+    def measure(self, function):
+        function()      # warm up (files opened, caches)
+        times = []
+        for _ in range(self.iterations):
+            start = time.perf_counter()
+            function()
+            times.append(time.perf_counter() - start)
+        times.sort()
+        return Benchmark.get_percentile(times, 50), self.count_read_syscalls(function)
+
+    def run(self):
+        import psutil
+        from procfs import ProcfsBackend
+
+        baseline = self.count_read_syscalls(lambda: None)
+        procfs = ProcfsBackend()
+        try:
+            for name, kwargs in BackendComparison.FUNCTIONS:
+                results = []
+                for backend in (psutil, procfs):
+                    function = getattr(backend, name)
+                    results.append(self.measure(lambda: function(**kwargs)))
+                (psutil_time, psutil_reads), (procfs_time, procfs_reads) = results
+                print(f'{name:<24}psutil {psutil_time * 1e6:8.1f}us {psutil_reads - baseline:6.1f} reads   '
+                      f'procfs {procfs_time * 1e6:8.1f}us {procfs_reads - baseline:6.1f} reads   '
+                      f'x{psutil_time / procfs_time:.1f}')
+        finally:
+            procfs.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='pc_status benchmark, with a simulated large machine')
+    parser.add_argument('--iterations', type=int, default=100, help='Measures of each case.')
+    parser.add_argument('--filter', type=str, default=None, help='Only the cases containing this text.')
+    parser.add_argument('--save', type=str, default=None, help='Save the results (JSON), ex. as a new baseline.')
+    parser.add_argument('--baseline', type=str, default=None, help='Compare with the results saved by --save.')
+    parser.add_argument('--tolerance', type=float, default=25, help='Allowed p50 slow down (%%).')
+    parser.add_argument('--min-delta', type=float, default=20, help='Ignored p50 slow down (us), noise.')
+    parser.add_argument('--backend', type=str, default='psutil', choices=['psutil', 'procfs'],
+                        help='Collectors backend (procfs: files of the simulated machine).')
+    parser.add_argument('--compare-backends', action='store_true',
+                        help='Compare the psutil and procfs backends on this machine (Linux).')
+    args = parser.parse_args()
+
+    if args.compare_backends:
+        print(Common.SEPARATOR)
+        BackendComparison(args.iterations).run()
+        print(Common.SEPARATOR)
+        return
+
+    benchmark = Benchmark(args.iterations, backend=args.backend)
+    print(Common.SEPARATOR)
+    print(f'Machine: {", ".join(f"{count} {name}" for name, count in benchmark.machine.items())}, '
+          f'backend {benchmark.backend}')
+    print(Common.SEPARATOR)
+    benchmark.run(args.filter)
+    if args.save is not None:
+        benchmark.save(args.save)
+    if args.baseline is not None:
+        print(Common.SEPARATOR)
+        regressions = benchmark.compare(args.baseline, args.tolerance / 100, args.min_delta / 1e6)
+        print(Common.SEPARATOR)
+        if regressions:
+            print(f'FAILED: {len(regressions)} regressions ({", ".join(regressions)})')
+            sys.exit(1)
+        print('OK: no regression')
+
+
+if __name__ == '__main__':
+    main()
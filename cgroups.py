@@ -0,0 +1,365 @@
+#
+# @file <cgroups.py>
+#
+# @author Fernando Mendiburu - <fernando.mendiburu@ee.ufcg.edu.br>
+#
+
+import os
+import time
+import errno
+import heapq
+import resource
+
+from operator import attrgetter
+from collections import namedtuple
+
+from common import Common
+from metrics import MetricFamily
+from procfs import ProcFile
+from rates import CounterRates
+
+scgroupio = namedtuple('scgroupio', 'usage_usec rbytes wbytes rios wios')
+
+
+class CgroupFile:
+    # a file of a cgroup, kept open (ProcFile) while the open files are below the limit, otherwise opened by read
+    def __init__(self, path, size):
+        self.path = path
+        self.size = size
+        self.file = None
+
+    def open(self):
+        self.file = ProcFile(self.path, self.size)
+
+    def read(self):
+        if self.file is not None:
+            return self.file.read()
+        with open(self.path, 'rb', buffering=0) as fp:
+            return fp.read()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class CgroupNode:
+    # one cgroup directory: its subdirectories are listed again only when its mtime changes
+    FILES = {'cpu.stat': 512, 'memory.current': 64, 'io.stat': 1024,
+             'cpu.pressure': 256, 'memory.pressure': 256, 'io.pressure': 256}
+    RESOURCES = ('cpu', 'memory', 'io')
+
+    def __init__(self, path, name, depth):
+        self.path = path
+        self.name = name            # relative to the root, ex. 'system.slice/nginx.service'
+        self.depth = depth
+        self.mtime = None
+        self.inode = None           # another inode: the directory was created again
+        self.children = []          # names of the subdirectories
+        self.files = {}             # name -> CgroupFile, None if the controller is not enabled
+        self.sample_files = None    # CgroupFile of FILES, in the same order
+        self.memory = None          # memory.current (bytes)
+        self.anon = None            # memory.stat, only for the top groups
+        self.file = None
+        self.pressure = {}          # resource -> 'some' avg10 (%)
+
+    def get_file(self, name, cgroups):
+        if name not in self.files:
+            path = os.path.join(self.path, name)
+            cgroup_file = self.files[name] = CgroupFile(path, CgroupNode.FILES.get(name, 4096)) \
+                if os.path.exists(path) else None
+            if cgroup_file is not None and cgroups.open_files < cgroups.max_open_files:
+                try:
+                    cgroup_file.open()
+                    cgroups.open_files += 1
+                except OSError:
+                    pass
+        return self.files[name]
+
+    def close(self, cgroups):
+        for cgroup_file in self.files.values():
+            if cgroup_file is not None and cgroup_file.file is not None:
+                cgroup_file.close()
+                cgroups.open_files -= 1
+        self.files = {}
+        self.sample_files = None
+
+    @staticmethod
+    def parse_keys(data, keys):
+        # 'key value' lines (cpu.stat, memory.stat)
+        values = {}
+        for line in data.split(b'\n'):
+            key, _, value = line.partition(b' ')
+            if key in keys:
+                values[key] = int(value)
+        return values
+
+    @staticmethod
+    def parse_io(data):
+        # '8:0 rbytes=1 wbytes=2 rios=3 wios=4 dbytes=0 dios=0' for each device, summed
+        totals = {b'rbytes': 0, b'wbytes': 0, b'rios': 0, b'wios': 0}
+        for field in data.split():
+            key, _, value = field.partition(b'=')
+            if key in totals:
+                totals[key] += int(value)
+        return totals
+
+    @staticmethod
+    def parse_usage(data):
+        # 'usage_usec' is the first line of cpu.stat
+        key, value, _ = data.split(None, 2)
+        if key != b'usage_usec':
+            return CgroupNode.parse_keys(data, (b'usage_usec',)).get(b'usage_usec', 0)
+        return int(value)
+
+    @staticmethod
+    def parse_pressure(data):
+        # 'some avg10=1.00 avg60=0.50 avg300=0.10 total=123': the 'some' avg10
+        return float(data[data.index(b'avg10=') + 6:].split(None, 1)[0])
+
+    @staticmethod
+    def read_value(cgroup_file, parse):
+        # None if the file is not available (ex. EOPNOTSUPP of the pressure files without PSI, EACCES in a container),
+        # OSError only if the cgroup was removed
+        if cgroup_file is None:
+            return None
+        try:
+            return parse(cgroup_file.read())
+        except OSError as error:
+            if error.errno in (errno.ENODEV, errno.ENOENT):
+                raise
+            return None
+        except (ValueError, IndexError):
+            return None
+
+    def update(self, cgroups):
+        # the counters of cpu.stat and io.stat (None if cpu.stat is not available), memory.current and the pressures
+        if self.sample_files is None:
+            self.sample_files = [self.get_file(name, cgroups) for name in CgroupNode.FILES]
+        cpu_stat, memory, io, *pressures = self.sample_files
+        usage = CgroupNode.read_value(cpu_stat, CgroupNode.parse_usage)
+        self.memory = CgroupNode.read_value(memory, int)
+        io = CgroupNode.read_value(io, CgroupNode.parse_io) or {}
+        for resource_name, pressure in zip(CgroupNode.RESOURCES, pressures):
+            self.pressure[resource_name] = CgroupNode.read_value(pressure, CgroupNode.parse_pressure)
+        if usage is None:
+            return None
+        return scgroupio(usage, io.get(b'rbytes', 0), io.get(b'wbytes', 0), io.get(b'rios', 0), io.get(b'wios', 0))
+
+    def update_memory_stat(self, cgroups):
+        values = CgroupNode.read_value(self.get_file('memory.stat', cgroups),
+                                       lambda data: CgroupNode.parse_keys(data, (b'anon', b'file'))) or {}
+        self.anon, self.file = values.get(b'anon'), values.get(b'file')
+
+
+class Cgroups:
+    # cgroup v2 groups without subgroups (services, containers, scopes) up to CGROUPS_MAX_DEPTH: CPU, memory, IO and
+    # pressure of each one. The tree is walked with one stat by directory, the files stay open.
+    IO_FIELDS = scgroupio._fields
+
+    def __init__(self, params_obj):
+        self.params_obj = params_obj
+        self.root = Cgroups.get_root(params_obj.config_params.get('PROCFS_ROOT', '/'))
+        self.nodes = {}             # path -> CgroupNode
+        self.leaves = []
+        self.io_rates = CounterRates(Cgroups.IO_FIELDS)
+        self.open_files = 0
+        self.max_open_files = params_obj.config_params.get('CGROUPS_MAX_OPEN_FILES',
+                                                           resource.getrlimit(resource.RLIMIT_NOFILE)[0] // 2)
+        self.top_cpu = []           # (cpu %, node)
+        self.top_memory = []
+        self.top_io = []            # (bytes/s, node)
+        self.top_pressure = []      # (max avg10 %, node)
+        self.b_rates_ready = False
+        self.cost = 0.0
+        self.scans = 0
+        self.update()
+
+    @staticmethod
+    def get_root(root):
+        # cgroup v2 only, or hybrid (v1 controllers, v2 in 'unified')
+        root = os.path.join(root, 'sys/fs/cgroup')
+        unified = os.path.join(root, 'unified')
+        if not os.path.exists(os.path.join(root, 'cgroup.controllers')) and \
+                os.path.exists(os.path.join(unified, 'cgroup.controllers')):
+            return unified
+        return root
+
+    def is_available(self):
+        return os.path.exists(os.path.join(self.root, 'cgroup.controllers'))
+
+    def get_max_depth(self):
+        return self.params_obj.config_params.get('CGROUPS_MAX_DEPTH', 4)
+
+    def scan(self, node):
+        # the subdirectories of a directory whose mtime changed (a cgroup was created or removed, a controller
+        # enabled, or the directory created again): the files not found before are looked for again, and the counters
+        # start again (ex. a service restarted)
+        self.scans += 1
+        self.io_rates.reset(node.name)
+        try:
+            node.children = sorted(entry.name for entry in os.scandir(node.path) if entry.is_dir(follow_symlinks=False))
+        except OSError:
+            node.children = []
+        node.close(self)
+
+    def walk(self):
+        # groups without subgroups (or at the maximum depth)
+        max_depth = self.get_max_depth()
+        root = self.nodes.get(self.root)
+        if root is None:
+            root = self.nodes[self.root] = CgroupNode(self.root, '', 0)
+        seen = set()
+        leaves = []
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            try:
+                stat = os.stat(node.path)
+            except OSError:
+                continue                        # removed: dropped below
+            seen.add(node.path)
+            if stat.st_mtime_ns != node.mtime or stat.st_ino != node.inode:
+                node.inode = stat.st_ino
+                node.mtime = stat.st_mtime_ns
+                self.scan(node)
+            if node.depth and (not node.children or node.depth >= max_depth):
+                leaves.append(node)
+                continue
+            for name in reversed(node.children):
+                path = os.path.join(node.path, name)
+                child = self.nodes.get(path)
+                if child is None:
+                    child = self.nodes[path] = CgroupNode(path, f'{node.name}/{name}'.lstrip('/'), node.depth + 1)
+                stack.append(child)
+        for path in list(self.nodes):
+            if path not in seen:
+                self.nodes.pop(path).close(self)
+        return leaves
+
+    def update(self):
+        start = time.perf_counter()
+        if not self.is_available():
+            self.leaves = []
+            return
+        counters = {}
+        leaves = []
+        for node in self.walk():
+            try:
+                node_counters = node.update(self)
+            except OSError:
+                node.mtime = None       # removed during the walk: listed again the next time
+                continue
+            if node_counters is not None:
+                counters[node.name] = node_counters
+            leaves.append(node)
+        self.leaves = leaves
+        self.io_rates.update(counters)
+
+        top_n = self.params_obj.config_params.get('CGROUPS_TOP_N', 5)
+        samples = [(self.get_cpu_usage(node), node) for node in leaves]
+        self.top_cpu = heapq.nlargest(top_n, [sample for sample in samples if sample[0] is not None],
+                                      key=lambda sample: sample[0])
+        self.top_memory = heapq.nlargest(top_n, [(node.memory, node) for node in leaves if node.memory is not None],
+                                         key=lambda sample: sample[0])
+        for _, node in self.top_memory:
+            try:
+                node.update_memory_stat(self)
+            except OSError:
+                pass            # removed since its update
+        samples = [(self.get_io_rate(node), node) for node in leaves]
+        self.top_io = heapq.nlargest(top_n, [sample for sample in samples if sample[0] is not None],
+                                     key=lambda sample: sample[0])
+        samples = [(max((value for value in node.pressure.values() if value is not None), default=None), node)
+                   for node in leaves]
+        self.top_pressure = heapq.nlargest(top_n, [sample for sample in samples if sample[0]],
+                                           key=lambda sample: sample[0])
+        self.b_rates_ready = bool(self.io_rates.rates)
+        self.cost = time.perf_counter() - start
+
+    def get_cpu_usage(self, node):
+        # percentage of one CPU, as the processes
+        rates = self.io_rates.get_rates(node.name)
+        return None if rates is None else rates['usage_usec'] / 1e6 * 100
+
+    def get_io_rate(self, node):
+        rates = self.io_rates.get_rates(node.name)
+        return None if rates is None else rates['rbytes'] + rates['wbytes']
+
+    def get_top_cpu_msg(self):
+        if not self.b_rates_ready:
+            return 'Top cgroups CPU: n/a (first measure)'
+        return 'Top cgroups CPU: ' + (', '.join(f'{node.name}: {cpu:.1f}%' for cpu, node in self.top_cpu) or 'none')
+
+    def get_top_memory_msg(self):
+        groups = []
+        for memory, node in self.top_memory:
+            detail = '' if node.anon is None else f' (anon {Common.convert_units(node.anon)}, ' \
+                                                  f'file {Common.convert_units(node.file)})'
+            groups.append(f'{node.name}: {Common.convert_units(memory)}{detail}')
+        return 'Top cgroups memory: ' + (', '.join(groups) or 'none')
+
+    def get_top_io_msg(self):
+        if not self.b_rates_ready:
+            return 'Top cgroups IO: n/a (first measure)'
+        groups = []
+        for _, node in self.top_io:
+            rates = self.io_rates.get_rates(node.name)
+            groups.append(f'{node.name}: read {Common.convert_units(rates["rbytes"])}/s '
+                          f'({rates["rios"]:.1f} IOPS), write {Common.convert_units(rates["wbytes"])}/s '
+                          f'({rates["wios"]:.1f} IOPS)')
+        return 'Top cgroups IO: ' + (', '.join(groups) or 'none')
+
+    def get_top_pressure_msg(self):
+        groups = []
+        for _, node in self.top_pressure:
+            pressure = ' '.join(f'{name} {value:.1f}%' for name, value in node.pressure.items() if value is not None)
+            groups.append(f'{node.name}: {pressure}')
+        return 'Top cgroups pressure (some avg10): ' + (', '.join(groups) or 'none')
+
+    def get_cost_msg(self):
+        return f'Cgroups: {len(self.leaves)} ({len(self.nodes)} directories, {self.scans} scans, ' \
+               f'{self.open_files} open files), update time: {self.cost * 1000:.2f}ms'
+
+    def info(self):
+        print(Common.SEPARATOR)
+        if not self.is_available():
+            print(f'Cgroups: n/a (no cgroup v2 in {self.root})')
+        else:
+            print(self.get_top_cpu_msg())
+            print(self.get_top_memory_msg())
+            print(self.get_top_io_msg())
+            print(self.get_top_pressure_msg())
+            print(self.get_cost_msg())
+        print(Common.SEPARATOR)
+
+    def get_metrics(self):
+        cpu = MetricFamily('cgroup_cpu_usage_percent', 'gauge', 'CPU usage of the cgroup (percentage of one CPU).')
+        memory = MetricFamily('cgroup_memory_bytes', 'gauge', 'Memory of the cgroup (memory.current).')
+        read = MetricFamily('cgroup_io_read_bytes_per_second', 'gauge', 'Bytes read by the cgroup by second.')
+        write = MetricFamily('cgroup_io_write_bytes_per_second', 'gauge', 'Bytes written by the cgroup by second.')
+        pressure = MetricFamily('cgroup_pressure_percent', 'gauge',
+                                'Share of the time (last 10s) some tasks of the cgroup were stalled on the resource.')
+        for node in sorted(self.leaves, key=attrgetter('name')):
+            cpu.add(self.get_cpu_usage(node), ('cgroup', node.name))
+            memory.add(node.memory, ('cgroup', node.name))
+            rates = self.io_rates.get_rates(node.name) or {}
+            read.add(rates.get('rbytes'), ('cgroup', node.name))
+            write.add(rates.get('wbytes'), ('cgroup', node.name))
+            for name, value in node.pressure.items():
+                pressure.add(value, ('cgroup', node.name), ('resource', name))
+        return [cpu, memory, read, write, pressure]
+
+    def close(self):
+        for node in self.nodes.values():
+            node.close(self)
+
+    def set_parameters(self, params_obj):
+        self.params_obj = params_obj
+
+    def run(self):
+        self.info()
+
+
+if __name__ == '__main__':
+    pass
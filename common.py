@@ -8,12 +8,18 @@ import sys
 import os
 import json
 
-from notifypy import Notify
+from profiler import StartupProfile
+from shared_snapshot import get_default_file
 
 
 class Common:
-    STATS_FILE = os.path.expanduser('~') + '/pc_status/config/stats_output.txt'
+    HISTORY_DIR = os.path.expanduser('~') + '/pc_status/config/history'
     CONFIG_FILE = os.path.expanduser('~') + '/pc_status/config/config.txt'
+    CPU_STATE_FILE = os.path.expanduser('~') + '/pc_status/config/cpu_state.txt'
+    ALARM_STATE_FILE = os.path.expanduser('~') + '/pc_status/config/alarm_state.txt'
+    SOCKET_FILE = os.path.expanduser('~') + '/pc_status/config/pc_status.sock'
+    FLEET_SOCKET_FILE = os.path.expanduser('~') + '/pc_status/config/fleet.sock'
+    SNAPSHOT_FILE = get_default_file()
 
     SEPARATOR = "-" * 80
     UNITS = ["", "K", "M", "G", "T", "P"]
@@ -51,7 +57,8 @@ class Common:
 
     @staticmethod
     def notification_send(title, message, config_dict, b_sound):
-        notification = Notify()
+        notifypy = StartupProfile.import_module('notifypy')
+        notification = notifypy.Notify()
         notification.title = title
         notification.message = message
         notification.icon = config_dict['PATH_NOTIF_ICON']
@@ -61,21 +68,26 @@ class Common:
 
     @staticmethod
     def write_params(file, data_dict):
-        with open(file, 'w') as fp:
-            json.dump(data_dict, fp)
+        # written in a temporary file then renamed: the readers never see a half-written file
+        temp_file = f'{file}.{os.getpid()}.tmp'
+        try:
+            with open(temp_file, 'w') as fp:
+                json.dump(data_dict, fp)
+            os.replace(temp_file, file)
+        except BaseException:
+            try:
+                os.unlink(temp_file)
+            except OSError:
+                pass
+            raise
 
     @staticmethod
-    def read_params(file):
-        try:
-            with open(file, 'r') as fp:
-                dict_params = json.load(fp)
-                dict_params = Common.verify_paths(dict_params)
-                return dict_params
-        except FileNotFoundError:
-            print(f'ERROR: File {file} not found!\nExit program!')
-            sys.exit()
-        except ValueError:
-            print(f'ERROR: Probably a problem in the data format of file {fp.name}!\nExit program!')
+    def parse_params(file):
+        with open(file, 'r') as fp:
+            dict_params = json.load(fp)
+        if not isinstance(dict_params, dict):
+            raise ValueError(f'{file} does not contain a dictionary')
+        return Common.verify_paths(dict_params)
 
     @staticmethod
     def verify_paths(params):
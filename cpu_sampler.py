@@ -0,0 +1,115 @@
+#
+# @file <cpu_sampler.py>
+#
+# @author Fernando Mendiburu - <fernando.mendiburu@ee.ufcg.edu.br>
+#
+
+import time
+import json
+import psutil
+
+from common import Common
+
+
+class CPUSampler:
+    # Computes the CPU usage from the delta of the jiffy counters between two calls,
+    # instead of blocking inside psutil.cpu_percent(interval=...).
+    def __init__(self, min_window=0.5, state_file=None, backend=None):
+        self.min_window = min_window
+        self.backend = backend if backend is not None else psutil     # psutil, or the procfs backend
+        self.state_file = state_file
+        self.prev_times = None
+        self.prev_time = None
+        self.cpu_usage = 0.0
+        self.cores_usage = []
+        self.window = 0.0
+        if self.state_file is not None:
+            self.load()
+
+    @staticmethod
+    def get_busy_total(cpu_times):
+        total = sum(cpu_times)
+        # guest times are already accounted in user and nice times (Linux)
+        total -= getattr(cpu_times, 'guest', 0.0) + getattr(cpu_times, 'guest_nice', 0.0)
+        idle = cpu_times.idle + getattr(cpu_times, 'iowait', 0.0)
+        return total - idle, total
+
+    def read_counters(self):
+        return [CPUSampler.get_busy_total(cpu_times) for cpu_times in self.backend.cpu_times(percpu=True)]
+
+    @staticmethod
+    def get_percentage(busy_delta, total_delta):
+        if total_delta <= 0:
+            return 0.0
+        return round(min(max(busy_delta / total_delta * 100, 0.0), 100.0), 1)
+
+    def is_valid_previous(self, counters):
+        if self.prev_times is None or len(self.prev_times) != len(counters):
+            return False
+        # counters restart from zero after a reboot or a cpu hotplug
+        for (prev_busy, prev_total), (busy, total) in zip(self.prev_times, counters):
+            if total < prev_total or busy < prev_busy:
+                return False
+        return True
+
+    def get_window(self, counters):
+        # seconds of the jiffy counters by core since the previous ones: also right when the previous ones were
+        # saved by another execution (cpu_state.txt), even a few milliseconds ago
+        if not counters:
+            return 0.0
+        return sum(total - prev_total for (_, prev_total), (_, total) in zip(self.prev_times, counters)) / len(counters)
+
+    def sample(self):
+        now = time.monotonic()
+        if self.prev_time is not None and now - self.prev_time < self.min_window:
+            return self.cpu_usage, self.cores_usage
+
+        counters = self.read_counters()
+        if not self.is_valid_previous(counters):
+            # cold start without a previous sample: the window starts now
+            self.prev_times = counters
+        window = self.get_window(counters)
+        if window < self.min_window:
+            # a shorter window would measure mostly the start of pc_status
+            time.sleep(self.min_window - window)
+            counters = self.read_counters()
+            now = time.monotonic()
+
+        busy_sum = total_sum = 0.0
+        cores_usage = []
+        for (prev_busy, prev_total), (busy, total) in zip(self.prev_times, counters):
+            cores_usage.append(CPUSampler.get_percentage(busy - prev_busy, total - prev_total))
+            busy_sum += busy - prev_busy
+            total_sum += total - prev_total
+
+        self.window = total_sum / len(counters) if counters else 0.0
+        self.cpu_usage = CPUSampler.get_percentage(busy_sum, total_sum)
+        self.cores_usage = cores_usage
+        self.prev_times = counters
+        self.prev_time = now
+        return self.cpu_usage, self.cores_usage
+
+    def load(self):
+        try:
+            with open(self.state_file, 'r') as fp:
+                state = json.load(fp)
+            if state['BOOT_TIME'] != self.backend.boot_time():
+                return
+            self.prev_times = [tuple(counter) for counter in state['COUNTERS']]
+        except (FileNotFoundError, ValueError, KeyError, TypeError):
+            self.prev_times = None
+
+    def save(self):
+        if self.state_file is None or self.prev_times is None:
+            return
+        state = {"BOOT_TIME": self.backend.boot_time(),
+                 "COUNTERS": self.prev_times
+                 }
+        try:
+            Common.write_params(self.state_file, state)
+        except OSError:
+            pass
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,185 @@
+#
+# @file <daemon.py>
+#
+# @author Fernando Mendiburu - <fernando.mendiburu@ee.ufcg.edu.br>
+#
+
+import os
+import sys
+import json
+import socket
+import threading
+import socketserver
+
+from profiler import SelfStats, IterationProfile
+from rw_parameters import WriteParametersStatFile
+from shared_snapshot import SnapshotWriter
+from common import Common
+
+
+class DaemonRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        command = self.rfile.readline(64).decode('utf-8', 'replace').strip()
+        snapshot = self.server.daemon.get_snapshot(command)
+        if snapshot is None:
+            snapshot = f'ERROR: unknown command {command!r}'
+        self.wfile.write(snapshot.encode('utf-8'))
+
+
+class DaemonServer:
+    FIRST_SAMPLE_TIMEOUT = 0.8      # seconds, the requests received while the daemon starts (client timeout 1s)
+
+    def __init__(self, params_obj, socket_file, is_notification, is_sound, metrics_address=None,
+                 push_address=None, push_protocol='udp', profile_iterations=0, profile_output=None):
+        self.params_obj = params_obj
+        self.profile_iterations = profile_iterations
+        self.profile_output = profile_output
+        self.socket_file = socket_file
+        self.is_notification = is_notification
+        self.is_sound = is_sound
+        self.snapshots = {}
+        self.sampled = threading.Event()        # the first sample is done
+        self.sensor = None
+        self.write_obj = WriteParametersStatFile(params_obj)
+        self.server = None
+        self.thread = None
+        self.metrics = None
+        if metrics_address is not None:
+            # imported here, the client does not need the HTTP server
+            from metrics_server import MetricsServer
+            self.metrics = MetricsServer(metrics_address)
+        self.agent = None
+        if push_address is not None:
+            from fleet import FleetAgent
+            self.agent = FleetAgent(push_address, push_protocol)
+        self.snapshot_writer = None
+        if params_obj.config_params.get('SNAPSHOT_PUBLISH', 'yes') == 'yes':
+            self.snapshot_writer = SnapshotWriter(Common.SNAPSHOT_FILE)
+
+    def get_snapshot(self, command):
+        # the dictionary is replaced as a whole by the sampling loop
+        if command == 'ping':       # answered before the first sample
+            return 'pong'
+        self.sampled.wait(DaemonServer.FIRST_SAMPLE_TIMEOUT)
+        return self.snapshots.get(command)
+
+    def is_running(self):
+        return DaemonClient.request(self.socket_file, 'ping') is not None
+
+    def start_server(self):
+        if os.path.exists(self.socket_file):
+            if self.is_running():
+                print(f'ERROR: pc_status daemon already running ({self.socket_file})!\nExit program!')
+                return False
+            os.unlink(self.socket_file)
+
+        self.server = socketserver.ThreadingUnixStreamServer(self.socket_file, DaemonRequestHandler)
+        self.server.daemon_threads = True
+        self.server.daemon = self
+        os.chmod(self.socket_file, 0o600)
+        self.thread = threading.Thread(target=self.server.serve_forever, name='pc_status-server', daemon=True)
+        self.thread.start()
+        return True
+
+    def stop_server(self):
+        if self.server is None:
+            return
+        self.server.shutdown()
+        self.server.server_close()
+        try:
+            os.unlink(self.socket_file)
+        except FileNotFoundError:
+            pass
+
+    def sample(self, sensor):
+        self.params_obj.update_parameters()
+        updated = sensor.update()
+        sensor.set_parameters(self.params_obj)
+        if self.is_notification:
+            sensor.notify(self.is_sound)
+        self.write_obj.write_parameters(sensor.get_stats_params())
+        record = sensor.get_record()
+        self.snapshots = {'full': sensor.get_full_msg(),
+                          'status': sensor.get_status_msg(),
+                          'record': json.dumps(record),
+                          'self': SelfStats.get_report()
+                          }
+        self.sampled.set()
+        if self.snapshot_writer is not None:
+            with SelfStats.timer('render', 'snapshot'):
+                self.snapshot_writer.publish(record)
+        if self.agent is not None and updated:
+            self.agent.push(sensor)
+        # encoded once per sample, the scrapes only send the cached page
+        if self.metrics is not None and updated:
+            with SelfStats.timer('render', 'openmetrics'):
+                self.metrics.set_families(sensor.get_metrics())
+
+    def save_state(self):
+        self.write_obj.close()
+        if self.agent is not None:
+            self.agent.close()
+        if self.snapshot_writer is not None:
+            self.snapshot_writer.close()
+        if self.sensor is not None:
+            self.sensor.save_state()
+            self.sensor.close()
+
+    def run(self):
+        from sensor import Sensor
+
+        profile = None
+        if self.profile_iterations > 0:
+            profile = IterationProfile(self.profile_iterations, self.profile_output)
+        try:
+            # before any sample: a second daemon does not notify, write the history nor publish the snapshot
+            if not self.start_server():
+                return
+            self.sensor = Sensor(self.params_obj)
+            if profile is not None:
+                profile.start()
+            self.sample(self.sensor)
+            if self.metrics is not None:
+                try:
+                    self.metrics.start()
+                except OSError as error:
+                    print(f'ERROR: cannot serve the metrics on {self.metrics.address}: {error}\nExit program!')
+                    return
+                print(f'pc_status metrics on http://{self.metrics.address[0]}:{self.metrics.address[1]}/metrics')
+
+            print(f'pc_status daemon listening on {self.socket_file}')
+            while True:
+                if profile is not None and profile.tick():
+                    print(profile.get_report(), file=sys.stderr)
+                self.sensor.wait()
+                if profile is not None:
+                    profile.start()
+                self.sample(self.sensor)
+        finally:
+            if self.metrics is not None:
+                self.metrics.stop()
+            self.stop_server()
+            self.save_state()
+
+
+class DaemonClient:
+    @staticmethod
+    def request(socket_file, command, timeout=1.0):
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+                client.settimeout(timeout)
+                client.connect(socket_file)
+                client.sendall(f'{command}\n'.encode('utf-8'))
+                chunks = []
+                while True:
+                    chunk = client.recv(65536)
+                    if not chunk:
+                        break
+                    chunks.append(chunk)
+        except OSError:
+            return None
+        return b''.join(chunks).decode('utf-8')
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,203 @@
+#
+# @file <dashboard.py>
+#
+# @author Fernando Mendiburu - <fernando.mendiburu@ee.ufcg.edu.br>
+#
+
+import time
+import shutil
+import signal
+import atexit
+import threading
+
+from common import Common
+from profiler import SelfStats
+from ring_buffer import RingBuffer
+
+
+class TerminalScreen:
+    # the lines on the terminal, to send only the characters that changed (as curses): for each changed run of a
+    # line, a cursor move and the new characters
+    GAP = 8         # unchanged characters sent again rather than a new cursor move (\x1b[row;colH)
+
+    def __init__(self):
+        self.lines = []
+        self.size = None
+
+    @staticmethod
+    def move(row, column):
+        return f'\x1b[{row + 1};{column + 1}H'
+
+    @staticmethod
+    def get_runs(old, new):
+        # (start, end) of the characters of new different from old, the runs closer than GAP merged
+        runs = []
+        for column in range(len(new)):
+            if column < len(old) and old[column] == new[column]:
+                continue
+            if runs and column - runs[-1][1] <= TerminalScreen.GAP:
+                runs[-1][1] = column + 1
+            else:
+                runs.append([column, column + 1])
+        return runs
+
+    def fit(self, lines, size):
+        # the lines do not wrap nor scroll: the cursor positions stay the ones of the lines
+        columns, rows = size
+        if len(lines) > rows:
+            lines = lines[:rows - 1] + [f'... {len(lines) - rows + 1} more lines']
+        return [line.expandtabs()[:columns] for line in lines]
+
+    def get_frame(self, lines, size):
+        # escape sequences and characters from the displayed lines to the new ones
+        parts = []
+        if size != self.size:       # first frame or terminal resized: everything is drawn again
+            self.size = size
+            self.lines = []
+            parts.append('\x1b[H\x1b[2J')
+        lines = self.fit(lines, size)
+        for row, line in enumerate(lines):
+            old = self.lines[row] if row < len(self.lines) else ''
+            if line == old:
+                continue
+            for start, end in TerminalScreen.get_runs(old, line):
+                parts.append(TerminalScreen.move(row, start) + line[start:end])
+            if len(line) < len(old):
+                parts.append(TerminalScreen.move(row, len(line)) + '\x1b[K')
+        for row in range(len(lines), len(self.lines)):
+            parts.append(TerminalScreen.move(row, 0) + '\x1b[K')
+        self.lines = lines
+        return ''.join(parts)
+
+
+class Dashboard:
+    # --info dashboard: full screen, only the changed characters are sent, in one write by frame.
+    # The frames are limited to DASHBOARD_FPS, whatever the sampling periods.
+    ENTER = '\x1b[?1049h\x1b[?25l'      # alternate screen, cursor hidden
+    LEAVE = '\x1b[?25h\x1b[?1049l'
+    SPARKS = ' ▁▂▃▄▅▆▇█'
+    # (title, history series or prefix of the series, unit, range of the sparkline)
+    SPARKLINES = (('CPU', 'cpu.total', '%', (0, 100)),
+                  ('Memory', 'memory', '%', (0, 100)),
+                  ('Temp', 'temp.', '°C', (20, 100)))
+    LABEL_WIDTH = 17        # title and value
+    SOURCE_WIDTH = 24       # name of the hottest sensor
+
+    def __init__(self, output, config_params, b_self_stats=False):
+        self.output = output
+        self.b_self_stats = b_self_stats
+        self.screen = TerminalScreen()
+        self.frame_bytes = RingBuffer(256)
+        self.frames = 0
+        self.first_bytes = None
+        self.sensor = None
+        self.b_pending = False
+        self.next_frame = 0.0
+        self.b_started = False
+        self.set_parameters(config_params)
+        atexit.register(self.close)     # registered after the output: the terminal is restored before its flush
+        self.previous_handler = None
+        if threading.current_thread() is threading.main_thread():
+            self.previous_handler = signal.signal(signal.SIGTERM, Dashboard.terminate)
+
+    @staticmethod
+    def terminate(signum, frame):
+        # SIGTERM (ex. kill, closed tmux pane): the loop ends as with Ctrl+C, the terminal is restored by close()
+        raise SystemExit(128 + signum)
+
+    def set_parameters(self, config_params):
+        self.frame_interval = 1 / max(config_params.get('DASHBOARD_FPS', 2), 0.1)
+
+    @staticmethod
+    def get_sparkline(values, low, high):
+        return ''.join(Dashboard.SPARKS[min(max(round((value - low) / (high - low) * 8), 0), 8)] for value in values)
+
+    @staticmethod
+    def get_series(history, name):
+        # the series, or the hottest one of the series starting with the prefix
+        if not name.endswith('.'):
+            return name, history.get(name)
+        series = [(buffer.get_last(), key, buffer) for key, buffer in history.buffers.items()
+                  if key.startswith(name) and len(buffer)]
+        if not series:
+            return name, None
+        _, key, buffer = max(series)
+        return key, buffer
+
+    def get_sparkline_lines(self, history, columns):
+        width = max(columns - Dashboard.LABEL_WIDTH - Dashboard.SOURCE_WIDTH, 10)
+        lines = []
+        for title, name, unit, (low, high) in Dashboard.SPARKLINES:
+            key, buffer = Dashboard.get_series(history, name)
+            if buffer is None or not len(buffer):
+                continue
+            value = f'{buffer.get_last():.1f}{unit}'
+            source = f' {key[len(name):]}' if name.endswith('.') else ''
+            lines.append(f'{title:<8}{value:>8} {Dashboard.get_sparkline(buffer.get_values(width), low, high)}'
+                         f'{source}')
+        return lines
+
+    def get_frames_msg(self):
+        # bytes sent by frame: the first one draws everything, the next ones only the changes
+        if not len(self.frame_bytes):
+            return f'Frames: {self.frames}' + (f', first {self.first_bytes}B' if self.frames else '')
+        return f'Frames: {self.frames}, first {self.first_bytes}B, last {self.frame_bytes.get_last():.0f}B, ' \
+               f'p50 {self.frame_bytes.get_percentile(50):.0f}B, max {self.frame_bytes.get_max():.0f}B'
+
+    def get_lines(self, columns):
+        header = f'pc_status {time.strftime("%H:%M:%S")}  {self.get_frames_msg()}'
+        lines = [header, Common.SEPARATOR] + self.get_sparkline_lines(self.sensor.history, columns)
+        lines += self.sensor.get_full_msg().split('\n')
+        if self.b_self_stats:
+            lines += [Common.SEPARATOR] + SelfStats.get_report().split('\n')
+        return lines
+
+    def show(self, sensor):
+        # after each measure: drawn now, or at the next frame if the last one is too recent
+        self.sensor = sensor
+        self.b_pending = True
+        if time.monotonic() >= self.next_frame:
+            self.draw()
+
+    def wait(self, deadline):
+        # until the next measure, drawing the pending frame when it is due
+        if self.b_pending and self.next_frame < deadline:
+            delay = self.next_frame - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            self.draw()
+        delay = deadline - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def draw(self):
+        with SelfStats.timer('render', 'dashboard'):
+            size = tuple(shutil.get_terminal_size())
+            frame = self.screen.get_frame(self.get_lines(size[0]), size)
+            if not self.b_started:
+                frame = Dashboard.ENTER + frame
+                self.b_started = True
+            frame_size = len(frame.encode('utf-8'))
+            self.frames += 1
+            if self.first_bytes is None:
+                self.first_bytes = frame_size
+            else:
+                self.frame_bytes.append(frame_size)
+            self.output.write(frame)
+            self.output.flush()
+        self.b_pending = False
+        self.next_frame = time.monotonic() + self.frame_interval
+
+    def close(self):
+        if self.previous_handler is not None:
+            signal.signal(signal.SIGTERM, self.previous_handler)
+            self.previous_handler = None
+        if not self.b_started:
+            return
+        self.b_started = False
+        self.output.write(Dashboard.LEAVE + self.get_frames_msg() + '\n')
+        self.output.flush()
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,255 @@
+#
+# @file <fake_psutil.py>
+#
+# @author Fernando Mendiburu - <fernando.mendiburu@ee.ufcg.edu.br>
+#
+
+import os
+import socket
+import random
+
+from collections import namedtuple
+
+# same fields as the psutil named tuples
+scputimes = namedtuple('scputimes', 'user nice system idle iowait irq softirq steal guest guest_nice')
+scpufreq = namedtuple('scpufreq', 'current min max')
+svmem = namedtuple('svmem', 'total available percent used free')
+sswap = namedtuple('sswap', 'total used free percent sin sout')
+sdiskpart = namedtuple('sdiskpart', 'device mountpoint fstype opts')
+sdiskusage = namedtuple('sdiskusage', 'total used free percent')
+sdiskio = namedtuple('sdiskio', 'read_count write_count read_bytes write_bytes read_time write_time busy_time')
+snetio = namedtuple('snetio', 'bytes_sent bytes_recv packets_sent packets_recv errin errout dropin dropout')
+snicaddr = namedtuple('snicaddr', 'family address netmask broadcast ptp')
+sbattery = namedtuple('sbattery', 'percent secsleft power_plugged')
+shwtemp = namedtuple('shwtemp', 'label current high critical')
+pmem = namedtuple('pmem', 'rss vms')
+FakeGPU = namedtuple('FakeGPU', 'id uuid name load memoryTotal memoryUsed memoryFree memoryUtil temperature')
+
+
+class NoSuchProcess(Exception):
+    pass
+
+
+class AccessDenied(Exception):
+    pass
+
+
+class FakeProcess:
+    def __init__(self, backend, pid, attrs=None):
+        self.backend = backend
+        self.pid = pid
+        self.create_time = backend.create_times.get(pid, 1000.0)
+        self.b_measured = False
+        self.info = self.as_dict(attrs or ['name'])
+
+    def name(self):
+        return f'process{self.pid}'
+
+    def is_running(self):
+        # same PID and create_time (not reused)
+        b_reused = self.backend.create_times.get(self.pid, 1000.0) != self.create_time
+        return self.pid <= self.backend.processes and not b_reused
+
+    def as_dict(self, attrs):
+        rng = self.backend.random
+        # cpu_percent is 0.0 in the first call, as psutil
+        values = {'name': self.name(), 'create_time': self.create_time,
+                  'cpu_percent': rng.uniform(0, 100) if self.b_measured else 0.0,
+                  'memory_info': pmem(rng.randrange(1 << 30), 1 << 32)}
+        if 'cpu_percent' in attrs:
+            self.b_measured = True
+        return {attr: values[attr] for attr in attrs}
+
+
+class FakePsutil:
+    # psutil replacement simulating a large machine, deterministic (seeded) and without any system call
+    NoSuchProcess = NoSuchProcess
+    AccessDenied = AccessDenied
+
+    def __init__(self, cores=256, mounts=500, nics=100, sensors=64, processes=1000, seed=0):
+        self.random = random.Random(seed)
+        self.cores = cores
+        self.mounts = mounts
+        self.nics = nics
+        self.sensors = sensors
+        self.processes = processes
+        self.create_times = {}      # pid -> create_time of the processes not started at 1000.0 (PID reused)
+        self.calls = 0
+        self.partitions = [sdiskpart(f'/dev/disk{i}', f'/mnt/volume{i}', 'ext4', 'rw') for i in range(mounts)]
+        self.addresses = {f'eth{i}': [snicaddr(socket.AF_INET, f'10.0.{i // 256}.{i % 256}', '255.255.0.0',
+                                               '10.0.255.255', None),
+                                      snicaddr(socket.AF_PACKET, f'02:00:00:00:{i // 256:02x}:{i % 256:02x}', None,
+                                               'ff:ff:ff:ff:ff:ff', None)]
+                          for i in range(nics)}
+
+    def tick(self):
+        # the counters advance with each call, as in a running machine
+        self.calls += 1
+        return self.calls
+
+    def cpu_times(self, percpu=False):
+        tick = self.tick()
+        times = [scputimes(tick * (i % 7 + 1), 0.0, tick, tick * 10.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0)
+                 for i in range(self.cores)]
+        return times if percpu else times[0]
+
+    def cpu_percent(self, interval=None, percpu=False):
+        return [50.0] * self.cores if percpu else 50.0
+
+    def cpu_freq(self):
+        return scpufreq(2400.0, 800.0, 3600.0)
+
+    def cpu_count(self, logical=True):
+        return self.cores if logical else self.cores // 2
+
+    @staticmethod
+    def boot_time():
+        return 1600000000.0
+
+    def virtual_memory(self):
+        used = self.random.randrange(1 << 38)
+        return svmem(1 << 39, (1 << 39) - used, round(used / (1 << 39) * 100, 1), used, (1 << 39) - used)
+
+    def swap_memory(self):
+        return sswap(1 << 34, 1 << 30, (1 << 34) - (1 << 30), 6.2, 0, 0)
+
+    def disk_partitions(self, all=False):
+        return list(self.partitions)
+
+    def disk_usage(self, path):
+        used = self.random.randrange(1 << 40)
+        return sdiskusage(1 << 41, used, (1 << 41) - used, round(used / (1 << 41) * 100, 1))
+
+    def disk_io_counters(self, perdisk=False):
+        tick = self.tick()
+        counters = {f'disk{i}': sdiskio(tick * 10, tick * 20, tick * 4096, tick * 8192, tick * 3, tick * 5, tick * 7)
+                    for i in range(self.mounts)}
+        if perdisk:
+            return counters
+        return sdiskio(*(sum(values) for values in zip(*counters.values())))
+
+    def net_if_addrs(self):
+        return self.addresses
+
+    def net_io_counters(self, pernic=False):
+        tick = self.tick()
+        counters = {name: snetio(tick * 1500, tick * 3000, tick, tick * 2, 0, 0, tick % 3, 0) for name in self.addresses}
+        if pernic:
+            return counters
+        return snetio(*(sum(values) for values in zip(*counters.values())))
+
+    def sensors_battery(self):
+        return sbattery(self.random.uniform(5, 100), 3600, False)
+
+    def sensors_temperatures(self, fahrenheit=False):
+        return {'coretemp': [shwtemp(f'Core {i}', self.random.uniform(30, 90), 80.0, 100.0)
+                             for i in range(self.sensors)]}
+
+    def pids(self):
+        return list(range(1, self.processes + 1))
+
+    def process_iter(self, attrs=None):
+        return (FakeProcess(self, pid, attrs) for pid in self.pids())
+
+    def Process(self, pid):
+        return FakeProcess(self, pid)
+
+
+class FakeGPUtil:
+    # GPUtil replacement (GPU_BACKEND 'gputil')
+    def __init__(self, gpus=8, seed=0):
+        self.random = random.Random(seed)
+        self.gpus = gpus
+
+    def getGPUs(self):
+        gpus = []
+        for i in range(self.gpus):
+            load = self.random.random()
+            gpus.append(FakeGPU(i, f'GPU-{i:08d}', f'Fake GPU {i}', load, 81920.0, 40960.0, 40960.0, 0.5,
+                                self.random.uniform(30, 90)))
+        return gpus
+
+
+class FakeProcfs:
+    # /proc and /sys files of the same machine, for the procfs backend (PROCFS_ROOT)
+    @staticmethod
+    def write_file(root, path, text):
+        path = os.path.join(root, path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as fp:
+            fp.write(text)
+
+    @staticmethod
+    def write(root, cores=256, mounts=500, nics=100, sensors=64, packages=2):
+        cpu_lines = [f'cpu{i} {1000 * (i % 7 + 1)} 0 1000 10000 20 0 5 0 0 0' for i in range(cores)]
+        FakeProcfs.write_file(root, 'proc/stat', '\n'.join([f'cpu  {4000 * cores} 0 {1000 * cores} {10000 * cores} '
+                                                            f'{20 * cores} 0 {5 * cores} 0 0 0'] + cpu_lines +
+                                                           ['intr 0', 'ctxt 0', 'btime 1600000000', '']))
+        FakeProcfs.write_file(root, 'proc/meminfo', 'MemTotal:       536870912 kB\nMemFree:        134217728 kB\n'
+                                                    'MemAvailable:   268435456 kB\nBuffers:          1048576 kB\n'
+                                                    'Cached:         67108864 kB\nSwapCached:            0 kB\n'
+                                                    'SReclaimable:    1048576 kB\nSwapTotal:       16777216 kB\n'
+                                                    'SwapFree:        15728640 kB\n')
+        FakeProcfs.write_file(root, 'proc/diskstats', ''.join(f'   8 {i} disk{i} {i * 10} 0 {i * 80} {i * 3} {i * 20} 0 '
+                                                              f'{i * 160} {i * 5} 0 {i * 7} {i * 8} 0 0 0 0\n'
+                                                              for i in range(mounts)))
+        for i in range(mounts):
+            os.makedirs(os.path.join(root, f'sys/block/disk{i}'), exist_ok=True)
+        FakeProcfs.write_file(root, 'proc/net/dev', 'Inter-|   Receive |  Transmit\n face |bytes packets |bytes\n' +
+                              ''.join(f'  eth{i}: {i * 3000} {i * 2} 0 {i % 3} 0 0 0 0 {i * 1500} {i} 0 0 0 0 0 0\n'
+                                      for i in range(nics)))
+        # one coretemp chip for each CPU package, with the same labels
+        for package in range(packages):
+            hwmon = f'sys/class/hwmon/hwmon{package}'
+            FakeProcfs.write_file(root, f'{hwmon}/name', 'coretemp\n')
+            device = os.path.join(root, f'sys/devices/platform/coretemp.{package}')
+            os.makedirs(device, exist_ok=True)
+            if not os.path.islink(os.path.join(root, hwmon, 'device')):
+                os.symlink(device, os.path.join(root, hwmon, 'device'))
+            for i in range(1, sensors // packages + 1):
+                for suffix, value in (('input', 30000 + i * 500), ('max', 80000), ('crit', 100000),
+                                      ('label', f'Core {i - 1}')):
+                    FakeProcfs.write_file(root, f'{hwmon}/temp{i}_{suffix}', f'{value}\n')
+
+
+class FakeCgroupfs:
+    # cgroup v2 tree (PROCFS_ROOT/sys/fs/cgroup): services and containers in system.slice, sessions in user.slice.
+    # Written again with a larger tick, the counters advance.
+    @staticmethod
+    def get_groups(groups):
+        services = groups // 2
+        containers = groups // 3
+        sessions = groups - services - containers
+        return [f'system.slice/service{i}.service' for i in range(services)] + \
+               [f'system.slice/docker-{i:012x}.scope' for i in range(containers)] + \
+               [f'user.slice/user-1000.slice/session-{i}.scope' for i in range(sessions)]
+
+    @staticmethod
+    def write_group(path, i, tick):
+        pressure = f'some avg10={i % 7 * 1.5:.2f} avg60=0.00 avg300=0.00 total={tick * i}\n' \
+                   f'full avg10=0.00 avg60=0.00 avg300=0.00 total=0\n'
+        files = {'cpu.stat': f'usage_usec {tick * 10000 * (i % 13 + 1)}\nuser_usec {tick * 8000}\n'
+                             f'system_usec {tick * 2000}\nnr_periods 0\nnr_throttled 0\nthrottled_usec 0\n',
+                 'memory.current': f'{(i % 17 + 1) << 24}\n',
+                 'memory.stat': f'anon {(i % 17 + 1) << 23}\nfile {(i % 17 + 1) << 23}\nkernel 0\nsock 0\nshmem 0\n',
+                 'io.stat': f'8:0 rbytes={tick * 4096 * (i % 5)} wbytes={tick * 8192 * (i % 3)} rios={tick * (i % 5)} '
+                            f'wios={tick * (i % 3)} dbytes=0 dios=0\n',
+                 'cpu.pressure': pressure,
+                 'memory.pressure': pressure,
+                 'io.pressure': pressure}
+        for name, text in files.items():
+            with open(os.path.join(path, name), 'w') as fp:
+                fp.write(text)
+
+    @staticmethod
+    def write(root, groups=300, tick=1):
+        cgroup_root = os.path.join(root, 'sys/fs/cgroup')
+        FakeProcfs.write_file(cgroup_root, 'cgroup.controllers', 'cpuset cpu io memory pids\n')
+        for i, group in enumerate(FakeCgroupfs.get_groups(groups)):
+            path = os.path.join(cgroup_root, group)
+            os.makedirs(path, exist_ok=True)
+            FakeCgroupfs.write_group(path, i, tick)
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,439 @@
+#
+# @file <fleet.py>
+#
+# @author Fernando Mendiburu - <fernando.mendiburu@ee.ufcg.edu.br>
+#
+
+import os
+import math
+import time
+import heapq
+import random
+import socket
+import struct
+import threading
+import socketserver
+
+from operator import itemgetter
+from ring_buffer import MetricHistory
+
+
+def get_socket_address(address, socket_type, flags=0):
+    # (family, address) of a (host, port): IPv4 or IPv6 (ex. '[::1]:9200')
+    family, _, _, _, socket_address = socket.getaddrinfo(address[0], address[1], 0, socket_type, 0, flags)[0]
+    return family, socket_address
+
+
+class Snapshot:
+    # compact binary state of a host, sent by the agents: ~60 bytes
+    MAGIC = b'PCS1'
+    HEADER = struct.Struct('<4sIdB')        # magic, sequence number, time, host name length
+    FIELDS = ('cpu', 'cpu_core_max', 'memory', 'swap', 'battery',
+              'temperature_margin', 'temperature_critical_margin', 'gpu')
+    VALUES = struct.Struct('<8fB')          # FIELDS (NaN: not available), flags
+    FLAG_POWER_PLUGGED = 1
+
+    def __init__(self, host, seq, timestamp, values, flags=0):
+        self.host = host
+        self.seq = seq
+        self.time = timestamp
+        self.values = values        # {field: value or None}
+        self.flags = flags
+
+    def is_power_plugged(self):
+        return bool(self.flags & Snapshot.FLAG_POWER_PLUGGED)
+
+    def encode(self):
+        host = self.host.encode('utf-8')[:255]
+        values = [math.nan if self.values.get(field) is None else self.values[field] for field in Snapshot.FIELDS]
+        return Snapshot.HEADER.pack(Snapshot.MAGIC, self.seq, self.time, len(host)) + host + \
+            Snapshot.VALUES.pack(*values, self.flags)
+
+    @staticmethod
+    def decode(data):
+        if len(data) < Snapshot.HEADER.size + Snapshot.VALUES.size:
+            raise ValueError('truncated snapshot')
+        magic, seq, timestamp, host_size = Snapshot.HEADER.unpack_from(data)
+        if magic != Snapshot.MAGIC:
+            raise ValueError('unknown snapshot format')
+        offset = Snapshot.HEADER.size + host_size
+        if len(data) != offset + Snapshot.VALUES.size:
+            raise ValueError('invalid snapshot size')
+        host = bytes(data[Snapshot.HEADER.size:offset]).decode('utf-8', 'replace')
+        *values, flags = Snapshot.VALUES.unpack_from(data, offset)
+        values = {field: None if math.isnan(value) else value for field, value in zip(Snapshot.FIELDS, values)}
+        return Snapshot(host, seq, timestamp, values, flags)
+
+    @staticmethod
+    def from_sensor(host, seq, sensor):
+        values = {'cpu': sensor.cpu.get_cpu_usage(),
+                  'cpu_core_max': max(sensor.cpu.cores_usage, default=None),
+                  'memory': sensor.memory.get_memory_usage(),
+                  'swap': sensor.memory.get_swap_usage(),
+                  'battery': sensor.battery.get_percentage(),
+                  'gpu': sensor.gpu.get_max_load()
+                  }
+        temperatures = sensor.temperature.temp_v.values()
+        if temperatures:
+            values['temperature_margin'] = max(value.current - value.high for value in temperatures)
+            values['temperature_critical_margin'] = max(value.current - value.critical for value in temperatures)
+        flags = Snapshot.FLAG_POWER_PLUGGED if sensor.battery.power_unplugged else 0     # psutil power_plugged
+        return Snapshot(host, seq, time.time(), values, flags)
+
+
+class FleetAgent:
+    # pushes the snapshots to the collector, a lost snapshot is replaced by the next one
+    FRAME = struct.Struct('<H')     # TCP: length of each snapshot
+
+    def __init__(self, address, protocol='udp', host=None):
+        self.address = address
+        self.protocol = protocol
+        self.host = host or socket.gethostname()
+        self.socket = None
+        self.target = None      # UDP: resolved address
+        self.seq = 0
+        self.sent = 0
+        self.errors = 0
+
+    def connect(self):
+        if self.protocol == 'udp':
+            family, self.target = get_socket_address(self.address, socket.SOCK_DGRAM)
+            self.socket = socket.socket(family, socket.SOCK_DGRAM)
+        else:
+            self.socket = socket.create_connection(self.address, timeout=1)
+            self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def send(self, data):
+        try:
+            if self.socket is None:
+                self.connect()
+            if self.protocol == 'udp':
+                self.socket.sendto(data, self.target)
+            else:
+                self.socket.sendall(FleetAgent.FRAME.pack(len(data)) + data)
+            self.sent += 1
+        except OSError:     # collector down: connects again in the next push
+            self.errors += 1
+            self.close()
+
+    def push(self, sensor):
+        self.seq += 1
+        self.send(Snapshot.from_sensor(self.host, self.seq, sensor).encode())
+
+    def close(self):
+        if self.socket is not None:
+            self.socket.close()
+            self.socket = None
+
+
+class HostState:
+    __slots__ = ('snapshot', 'seen_at', 'history', 'statuses')
+
+    def __init__(self, history_capacity):
+        self.snapshot = None
+        self.seen_at = None
+        self.history = MetricHistory(history_capacity)
+        self.statuses = {}
+
+
+class FleetState:
+    STATUS_NAMES = ('host', 'cpu', 'memory', 'temperature', 'battery', 'gpu')
+
+    def __init__(self, config_params):
+        self.config_params = config_params
+        self.hosts = {}
+        self.status_index = {}      # (status name, status) -> hosts
+        self.value_index = {field: {} for field in Snapshot.FIELDS}     # field -> {host: value}
+        self.lock = threading.Lock()
+        self.received = 0
+        self.rejected = 0
+        self.ingest_time = 0.0
+
+    @staticmethod
+    def get_level(value, threshold):
+        if value is None:
+            return 'N/A'
+        return 'HIGH' if value >= threshold else 'OK'
+
+    @staticmethod
+    def get_statuses(snapshot, config_params):
+        # the same thresholds as the local alarms, evaluated in the collector
+        values = snapshot.values
+        cpu = max((value for value in (values['cpu'], values['cpu_core_max']) if value is not None), default=None)
+        statuses = {'host': 'UP',
+                    'cpu': FleetState.get_level(cpu, config_params['HIGH_USAGE_CPU']),
+                    'memory': FleetState.get_level(values['memory'], config_params['HIGH_USAGE_MEM']),
+                    'gpu': FleetState.get_level(values['gpu'], config_params['HIGH_LOAD_GPU'])
+                    }
+        if values['temperature_margin'] is None:
+            statuses['temperature'] = 'N/A'
+        elif values['temperature_critical_margin'] >= 0:
+            statuses['temperature'] = 'CRITICAL'
+        else:
+            statuses['temperature'] = FleetState.get_level(values['temperature_margin'], 0)
+        if values['battery'] is None:
+            statuses['battery'] = 'N/A'
+        elif not snapshot.is_power_plugged() and values['battery'] <= config_params['DISCHARGING_BATTERY']:
+            statuses['battery'] = 'LOW'
+        else:
+            statuses['battery'] = 'OK'
+        return statuses
+
+    def set_statuses(self, host, state, statuses):
+        # only the changed statuses move between the index sets
+        for name, status in statuses.items():
+            previous = state.statuses.get(name)
+            if previous == status:
+                continue
+            if previous is not None:
+                self.status_index[(name, previous)].discard(host)
+            self.status_index.setdefault((name, status), set()).add(host)
+            state.statuses[name] = status
+
+    def ingest(self, snapshot, now=None):
+        if now is None:
+            now = time.monotonic()
+        start = time.perf_counter()
+        with self.lock:
+            self.received += 1
+            state = self.hosts.get(snapshot.host)
+            if state is None:
+                state = self.hosts[snapshot.host] = HostState(self.config_params.get('FLEET_HISTORY_CAPACITY', 60))
+            elif state.snapshot is not None and snapshot.time <= state.snapshot.time:
+                self.rejected += 1      # duplicated or out of order (UDP)
+                return False
+            state.snapshot = snapshot
+            state.seen_at = now
+            for field, value in snapshot.values.items():
+                if value is None:
+                    self.value_index[field].pop(snapshot.host, None)
+                else:
+                    self.value_index[field][snapshot.host] = value
+            state.history.record({'cpu': snapshot.values['cpu'], 'memory': snapshot.values['memory']},
+                                 snapshot.time)
+            self.set_statuses(snapshot.host, state, FleetState.get_statuses(snapshot, self.config_params))
+            self.ingest_time += time.perf_counter() - start
+        return True
+
+    def expire(self, now=None):
+        # hosts without snapshot since FLEET_HOST_TIMEOUT are DOWN (kept, with their last values)
+        if now is None:
+            now = time.monotonic()
+        timeout = self.config_params.get('FLEET_HOST_TIMEOUT', 10)
+        with self.lock:
+            for host in list(self.status_index.get(('host', 'UP'), ())):
+                if now - self.hosts[host].seen_at > timeout:
+                    self.set_statuses(host, self.hosts[host], {'host': 'DOWN'})
+                    for values in self.value_index.values():     # not in the top queries anymore
+                        values.pop(host, None)
+
+    def set_parameters(self, config_params):
+        self.config_params = config_params
+
+    def get_hosts(self, name, status, b_equal=True):
+        if name not in FleetState.STATUS_NAMES:
+            raise ValueError(f'unknown status {name!r}, expected one of {", ".join(FleetState.STATUS_NAMES)}')
+        if b_equal:
+            return sorted(self.status_index.get((name, status.upper()), ()))
+        return sorted(host for (index_name, index_status), hosts in self.status_index.items()
+                      if index_name == name and index_status != status.upper() for host in hosts)
+
+    def get_top(self, field, count):
+        if field not in self.value_index:
+            raise ValueError(f'unknown value {field!r}, expected one of {", ".join(Snapshot.FIELDS)}')
+        return heapq.nlargest(count, self.value_index[field].items(), key=itemgetter(1))
+
+    def get_host_msg(self, host):
+        state = self.hosts.get(host)
+        if state is None:
+            return f'ERROR: unknown host {host!r}'
+        lines = [f'Host: {host} ({state.statuses.get("host")}, seen {time.monotonic() - state.seen_at:.1f}s ago)']
+        for field in Snapshot.FIELDS:
+            value = state.snapshot.values[field]
+            lines.append(f'\t{field}: {"n/a" if value is None else f"{value:.1f}"}')
+        lines.append('\tStatus: ' + ', '.join(f'{name}: {status}' for name, status in state.statuses.items()))
+        window = self.config_params.get('FLEET_HISTORY_CAPACITY', 60)
+        for name in ('cpu', 'memory'):
+            lines.append('\t' + state.history.get_summary_msg(name, window, 95, '%'))
+        return '\n'.join(lines)
+
+    def get_stats_msg(self):
+        ingest = self.ingest_time / self.received * 1e6 if self.received else 0.0
+        return f'Hosts: {len(self.hosts)} ({len(self.status_index.get(("host", "UP"), ()))} up), ' \
+               f'snapshots: {self.received} ({self.rejected} rejected), ingest time: {ingest:.1f}us/snapshot'
+
+    def query(self, command):
+        # 'status NAME!=STATUS', 'status NAME=STATUS', 'top FIELD [N]', 'host NAME', 'stats'
+        words = command.split()
+        try:
+            with self.lock:
+                if words and words[0] == 'status' and len(words) == 2:
+                    b_equal = '!=' not in words[1]
+                    name, status = words[1].replace('!=', '=').split('=', 1)
+                    hosts = self.get_hosts(name, status, b_equal)
+                    return f'{len(hosts)} hosts' + ''.join(f'\n{host}: {self.hosts[host].statuses.get(name)}'
+                                                           for host in hosts)
+                if words and words[0] == 'top' and len(words) in (2, 3):
+                    top = self.get_top(words[1], int(words[2]) if len(words) == 3 else 10)
+                    return '\n'.join(f'{host}: {value:.1f}' for host, value in top) or 'no hosts'
+                if words and words[0] == 'host' and len(words) == 2:
+                    return self.get_host_msg(words[1])
+                if words == ['stats']:
+                    return self.get_stats_msg()
+        except ValueError as error:
+            return f'ERROR: {error}'
+        return f'ERROR: unknown query {command!r}'
+
+
+class FleetTCPHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        stream = self.request.makefile('rb')
+        collector = self.server.collector
+        while True:
+            header = stream.read(FleetAgent.FRAME.size)
+            if len(header) < FleetAgent.FRAME.size:
+                return
+            data = stream.read(FleetAgent.FRAME.unpack(header)[0])
+            collector.receive(data)
+
+
+class FleetTCPServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, address, family):
+        self.address_family = family        # before the socket is created
+        super().__init__(address, FleetTCPHandler)
+
+
+class FleetCollector:
+    def __init__(self, params_obj, address, query_socket_file):
+        self.params_obj = params_obj
+        self.address = address
+        self.query_socket_file = query_socket_file
+        self.state = FleetState(params_obj.config_params)
+        self.errors = 0
+        self.servers = []
+        self.udp_socket = None
+        self.udp_thread = None
+        self.b_stopped = False
+
+    def receive(self, data):
+        try:
+            snapshot = Snapshot.decode(data)
+        except (ValueError, struct.error):
+            self.errors += 1
+            return
+        self.state.ingest(snapshot)
+
+    def receive_udp(self, udp_socket):
+        buffer = bytearray(2048)
+        view = memoryview(buffer)
+        while True:
+            try:
+                size = udp_socket.recv_into(buffer)
+            except OSError:     # closed by stop()
+                return
+            if self.b_stopped:
+                return
+            self.receive(view[:size])
+
+    def get_snapshot(self, command):
+        # queries through the Unix socket, same protocol as the daemon
+        if command == 'ping':
+            return 'pong'
+        return self.state.query(command)
+
+    def start(self):
+        from daemon import DaemonRequestHandler
+
+        family, address = get_socket_address(self.address, socket.SOCK_DGRAM, socket.AI_PASSIVE)
+        udp_socket = self.udp_socket = socket.socket(family, socket.SOCK_DGRAM)
+        udp_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+        udp_socket.bind(address)
+        self.udp_thread = threading.Thread(target=self.receive_udp, args=(udp_socket,), name='pc_status-fleet-udp',
+                                           daemon=True)
+        self.udp_thread.start()
+
+        family, address = get_socket_address(self.address, socket.SOCK_STREAM, socket.AI_PASSIVE)
+        tcp_server = FleetTCPServer(address, family)
+        tcp_server.collector = self
+
+        query_server = socketserver.ThreadingUnixStreamServer(self.query_socket_file, DaemonRequestHandler)
+        query_server.daemon_threads = True
+        query_server.daemon = self
+
+        for server in (tcp_server, query_server):
+            threading.Thread(target=server.serve_forever, name='pc_status-fleet', daemon=True).start()
+            self.servers.append(server)
+
+    def stop(self):
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+        self.servers = []
+        if self.udp_socket is not None:
+            self.b_stopped = True
+            try:
+                self.udp_socket.shutdown(socket.SHUT_RDWR)     # wakes up the blocked recv_into
+            except OSError:
+                pass
+            self.udp_socket.close()
+            self.udp_thread.join(1)
+            self.udp_socket = None
+
+    def run(self):
+        from daemon import DaemonClient
+
+        if os.path.exists(self.query_socket_file):
+            if DaemonClient.request(self.query_socket_file, 'ping') is not None:
+                print(f'ERROR: pc_status fleet collector already running ({self.query_socket_file})!\nExit program!')
+                return
+            os.unlink(self.query_socket_file)
+        self.start()
+        print(f'pc_status fleet collector listening on {self.address[0]}:{self.address[1]} (UDP and TCP)')
+        try:
+            while True:
+                time.sleep(1)
+                self.params_obj.update_parameters()
+                self.state.set_parameters(self.params_obj.config_params)
+                self.state.expire()
+        finally:
+            self.stop()
+            os.unlink(self.query_socket_file)
+
+
+class FleetSimulator:
+    # simulated agents on localhost, to load the collector
+    def __init__(self, address, protocol, hosts, interval=1.0):
+        self.agent = FleetAgent(address, protocol)
+        self.hosts = [f'sim-{i:05d}' for i in range(hosts)]
+        self.interval = interval
+        self.values = {host: {'cpu': random.uniform(0, 100), 'memory': random.uniform(0, 100)}
+                       for host in self.hosts}
+
+    def get_snapshot(self, host, seq):
+        values = self.values[host]
+        for field in ('cpu', 'memory'):     # random walk
+            values[field] = min(max(values[field] + random.uniform(-5, 5), 0.0), 100.0)
+        return Snapshot(host, seq, time.time(),
+                        {'cpu': values['cpu'], 'cpu_core_max': values['cpu'], 'memory': values['memory'],
+                         'swap': 0.0, 'battery': None, 'temperature_margin': values['cpu'] - 85,
+                         'temperature_critical_margin': values['cpu'] - 100, 'gpu': None})
+
+    def run(self, rounds=None):
+        seq = 0
+        while rounds is None or seq < rounds:
+            seq += 1
+            start = time.monotonic()
+            for host in self.hosts:
+                self.agent.send(self.get_snapshot(host, seq).encode())
+            elapsed = time.monotonic() - start
+            print(f'Round {seq}: {len(self.hosts)} snapshots in {elapsed * 1000:.1f}ms '
+                  f'({self.agent.errors} errors)')
+            time.sleep(max(self.interval - elapsed, 0))
+        self.agent.close()
+
+
+if __name__ == '__main__':
+    pass
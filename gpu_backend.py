@@ -0,0 +1,158 @@
+#
+# @file <gpu_backend.py>
+#
+# @author Fernando Mendiburu - <fernando.mendiburu@ee.ufcg.edu.br>
+#
+
+import time
+import atexit
+import shutil
+import threading
+import subprocess
+
+
+class NvidiaGPU:
+    # same attributes as GPUtil.GPU
+    def __init__(self, index, uuid, name, load, memory_total, memory_used, memory_free, temperature):
+        self.id = index
+        self.uuid = uuid
+        self.name = name
+        self.load = load
+        self.memoryTotal = memory_total
+        self.memoryUsed = memory_used
+        self.memoryFree = memory_free
+        self.memoryUtil = memory_used / memory_total if memory_total else 0.0
+        self.temperature = temperature
+
+
+class NvidiaSmiStream:
+    FIELDS = 'index,uuid,name,utilization.gpu,memory.total,memory.used,memory.free,temperature.gpu'
+    MAX_FAILURES = 5        # consecutive restarts without any row before giving up
+
+    def __init__(self, interval_ms=1000, executable='nvidia-smi', timeout=2):
+        self.interval_ms = interval_ms
+        self.executable = executable
+        # the values are stale when no row is received during one interval and the timeout
+        self.max_age = interval_ms / 1000 + timeout
+        self.process = None
+        self.thread = None
+        self.lock = threading.Lock()
+        self.first_row = threading.Event()
+        self.gpus = {}
+        self.updated_at = None
+        self.started_at = None
+        self.restart_count = 0
+        self.failures = 0
+        self.b_failed = False
+        self.b_stopped = False
+
+    def get_command(self, path):
+        return [path, f'--query-gpu={NvidiaSmiStream.FIELDS}', '--format=csv,noheader,nounits',
+                '-lms', str(self.interval_ms)]
+
+    @staticmethod
+    def parse_float(value):
+        try:
+            return float(value)
+        except ValueError:      # '[N/A]', '[Not Supported]'
+            return 0.0
+
+    @staticmethod
+    def parse_row(line):
+        fields = [field.strip() for field in line.split(',')]
+        if len(fields) != 8 or not fields[0].isdigit():
+            return None
+        return NvidiaGPU(int(fields[0]), fields[1], fields[2],
+                         NvidiaSmiStream.parse_float(fields[3]) / 100,
+                         NvidiaSmiStream.parse_float(fields[4]),
+                         NvidiaSmiStream.parse_float(fields[5]),
+                         NvidiaSmiStream.parse_float(fields[6]),
+                         NvidiaSmiStream.parse_float(fields[7]))
+
+    def start(self):
+        path = shutil.which(self.executable)
+        if path is None:
+            self.b_failed = True
+            return False
+        self.thread = threading.Thread(target=self.run, args=(path,), name='pc_status-nvidia-smi', daemon=True)
+        self.thread.start()
+        atexit.register(self.stop)
+        return True
+
+    def run(self, path):
+        while not self.b_stopped:
+            b_rows = False
+            self.started_at = time.monotonic()
+            try:
+                self.process = subprocess.Popen(self.get_command(path), stdout=subprocess.PIPE,
+                                                stderr=subprocess.DEVNULL, text=True, bufsize=1)
+            except OSError:
+                self.process = None
+            else:
+                rows = set()        # indexes of the current interval, one row by GPU
+                for line in self.process.stdout:
+                    gpu = NvidiaSmiStream.parse_row(line)
+                    if gpu is None:
+                        continue
+                    with self.lock:
+                        if gpu.id in rows:
+                            # next interval: the GPUs missing from the previous one are removed
+                            for index in set(self.gpus) - rows:
+                                del self.gpus[index]
+                            rows.clear()
+                        rows.add(gpu.id)
+                        self.gpus[gpu.id] = gpu
+                        self.updated_at = time.monotonic()
+                    b_rows = True
+                    self.first_row.set()
+                self.process.wait()
+
+            if self.b_stopped:
+                break
+            # the child died (ex. driver reload): restart it, giving up if it never works
+            self.failures = 0 if b_rows else self.failures + 1
+            if self.failures >= NvidiaSmiStream.MAX_FAILURES:
+                self.b_failed = True
+                self.first_row.set()
+                break
+            self.restart_count += 1
+            time.sleep(min(2 ** self.failures * 0.1, 5))
+
+    def wait_first_row(self, timeout):
+        return self.first_row.wait(timeout) and not self.b_failed
+
+    def is_failed(self):
+        return self.b_failed
+
+    def is_stale(self, now):
+        # no row since the last one or the start of the child (a hung nvidia-smi does not die)
+        last = max(self.updated_at or 0.0, self.started_at or 0.0)
+        return self.started_at is not None and now - last > self.max_age
+
+    def restart(self):
+        # the reading thread starts a new child when this one exits
+        process = self.process
+        if process is not None and process.poll() is None:
+            process.kill()
+
+    def get_gpus(self):
+        with self.lock:
+            if self.is_stale(time.monotonic()):
+                self.gpus = {}
+                self.started_at = time.monotonic()      # once by timeout, until the new child starts
+                self.restart()
+                return []
+            return [self.gpus[index] for index in sorted(self.gpus)]
+
+    def stop(self):
+        self.b_stopped = True
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(1)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,234 @@
+#
+# @file <history_store.py>
+#
+# @author Fernando Mendiburu - <fernando.mendiburu@ee.ufcg.edu.br>
+#
+
+import os
+import json
+import mmap
+import time
+import struct
+
+from common import Common
+
+
+class HistoryLevel:
+    def __init__(self, name, record, segment_seconds, resolution):
+        self.name = name
+        self.record = record
+        self.segment_seconds = segment_seconds
+        self.resolution = resolution
+
+    def get_segment_start(self, timestamp):
+        return int(timestamp // self.segment_seconds * self.segment_seconds)
+
+
+class HistoryStore:
+    # raw: (time, value), rollups: (time, min, avg, max, count)
+    RAW = HistoryLevel('raw', struct.Struct('<dd'), 3600, 0)
+    MINUTE = HistoryLevel('1m', struct.Struct('<ddddq'), 86400, 60)
+    HOUR = HistoryLevel('1h', struct.Struct('<ddddq'), 30 * 86400, 3600)
+    LEVELS = [RAW, MINUTE, HOUR]
+    # seconds
+    DEFAULT_RETENTION = {'raw': 2 * 86400, '1m': 30 * 86400, '1h': 365 * 86400}
+
+    def __init__(self, root, retention=None):
+        self.root = root
+        self.set_retention(retention)
+        self.files = {}             # metric -> (segment start, open raw segment)
+        self.next_rollup = {}       # metric -> time of the next rollup
+
+    def set_retention(self, retention):
+        self.retention = dict(HistoryStore.DEFAULT_RETENTION)
+        if retention:
+            self.retention.update(retention)
+
+    def get_dir(self, metric, level):
+        return os.path.join(self.root, metric, level.name)
+
+    def get_segments(self, metric, level):
+        try:
+            names = os.listdir(self.get_dir(metric, level))
+        except FileNotFoundError:
+            return []
+        segments = []
+        for name in names:
+            # other files (ex. 'copy.seg' left by the user) are not segments
+            if name.endswith('.seg') and name[:-4].isdigit():
+                segments.append((int(name[:-4]), os.path.join(self.get_dir(metric, level), name)))
+        segments.sort()
+        return segments
+
+    def write_record(self, metric, level, timestamp, values):
+        start = level.get_segment_start(timestamp)
+        if level is HistoryStore.RAW:
+            segment = self.files.get(metric)
+            if segment is None or segment[0] != start:
+                if segment is not None:
+                    segment[1].close()
+                os.makedirs(self.get_dir(metric, level), exist_ok=True)
+                segment = (start, open(os.path.join(self.get_dir(metric, level), f'{start}.seg'), 'ab'))
+                self.files[metric] = segment
+            segment[1].write(level.record.pack(timestamp, *values))
+            segment[1].flush()
+            return
+        os.makedirs(self.get_dir(metric, level), exist_ok=True)
+        with open(os.path.join(self.get_dir(metric, level), f'{start}.seg'), 'ab') as fp:
+            fp.write(level.record.pack(timestamp, *values))
+
+    def append(self, metric, value, timestamp=None):
+        if value is None:
+            return
+        if timestamp is None:
+            timestamp = time.time()
+        self.write_record(metric, HistoryStore.RAW, timestamp, (float(value),))
+        if timestamp >= self.next_rollup.get(metric, 0):
+            self.maintain(metric, timestamp)
+            self.next_rollup[metric] = (timestamp // 60 + 1) * 60
+
+    def close(self):
+        for _, fp in self.files.values():
+            fp.close()
+        self.files = {}
+
+    @staticmethod
+    def find_start(buffer, record, count, start):
+        # records are appended in time order: binary search of the first record >= start
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            if struct.unpack_from('<d', buffer, middle * record.size)[0] < start:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def read_records(self, metric, level, start, end):
+        for segment_start, path in self.get_segments(metric, level):
+            if segment_start + level.segment_seconds <= start or segment_start >= end:
+                continue
+            with open(path, 'rb') as fp:
+                size = os.fstat(fp.fileno()).st_size
+                count = size // level.record.size       # ignores a partially written record
+                if count == 0:
+                    continue
+                with mmap.mmap(fp.fileno(), count * level.record.size, access=mmap.ACCESS_READ) as buffer:
+                    first = HistoryStore.find_start(buffer, level.record, count, start)
+                    for index in range(first, count):
+                        values = level.record.unpack_from(buffer, index * level.record.size)
+                        if values[0] >= end:
+                            break
+                        yield values
+
+    def read_state(self, metric):
+        try:
+            with open(os.path.join(self.root, metric, 'rollup.txt'), 'r') as fp:
+                return json.load(fp)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def rollup(self, metric, source, target, state, now):
+        end = now // target.resolution * target.resolution
+        start = state.get(target.name)
+        if start is None:
+            segments = self.get_segments(metric, source)
+            if not segments:
+                return
+            start = segments[0][0]
+        if start >= end:
+            return
+
+        bucket = None
+        row = None
+        for values in self.read_records(metric, source, start, end):
+            if len(values) == 2:
+                values = (values[0], values[1], values[1], values[1], 1)
+            values_bucket = values[0] // target.resolution * target.resolution
+            if values_bucket != bucket:
+                if row is not None:
+                    self.write_record(metric, target, bucket, (row[0], row[1] / row[3], row[2], row[3]))
+                bucket = values_bucket
+                row = [values[1], 0.0, values[3], 0]
+            row[0] = min(row[0], values[1])
+            row[1] += values[2] * values[4]
+            row[2] = max(row[2], values[3])
+            row[3] += values[4]
+        if row is not None:
+            self.write_record(metric, target, bucket, (row[0], row[1] / row[3], row[2], row[3]))
+        state[target.name] = end
+
+    def apply_retention(self, metric, now):
+        for level in HistoryStore.LEVELS:
+            for segment_start, path in self.get_segments(metric, level):
+                if segment_start + level.segment_seconds < now - self.retention[level.name]:
+                    os.unlink(path)
+
+    def maintain(self, metric, now=None):
+        if now is None:
+            now = time.time()
+        state = self.read_state(metric)
+        self.rollup(metric, HistoryStore.RAW, HistoryStore.MINUTE, state, now)
+        self.rollup(metric, HistoryStore.MINUTE, HistoryStore.HOUR, state, now)
+        Common.write_params(os.path.join(self.root, metric, 'rollup.txt'), state)
+        self.apply_retention(metric, now)
+
+    def get_level(self, seconds):
+        if seconds <= 2 * 3600:
+            return HistoryStore.RAW
+        if seconds <= 7 * 86400:
+            return HistoryStore.MINUTE
+        return HistoryStore.HOUR
+
+    def query(self, metric, seconds, now=None, level=None):
+        if now is None:
+            now = time.time()
+        if level is None:
+            level = self.get_level(seconds)
+        rows = []
+        for values in self.read_records(metric, level, now - seconds, now + 1):
+            if len(values) == 2:
+                values = (values[0], values[1], values[1], values[1], 1)
+            rows.append(values)
+        return rows
+
+    def get_value_before(self, metric, timestamp):
+        # last raw value recorded at or before timestamp
+        level = HistoryStore.RAW
+        for segment_start, path in reversed(self.get_segments(metric, level)):
+            if segment_start > timestamp:
+                continue
+            with open(path, 'rb') as fp:
+                count = os.fstat(fp.fileno()).st_size // level.record.size
+                if count == 0:
+                    continue
+                with mmap.mmap(fp.fileno(), count * level.record.size, access=mmap.ACCESS_READ) as buffer:
+                    index = HistoryStore.find_start(buffer, level.record, count, timestamp + 1e-6) - 1
+                    if index >= 0:
+                        return level.record.unpack_from(buffer, index * level.record.size)[1]
+        return None
+
+    @staticmethod
+    def parse_since(since):
+        # seconds of a window, ex. '90', '5m' or '2h': ValueError if it is empty, zero or negative
+        units = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 7 * 86400}
+        since = since.strip()
+        if since and since[-1] in units:
+            seconds = float(since[:-1]) * units[since[-1]]
+        else:
+            seconds = float(since)
+        if not seconds > 0:     # also NaN
+            raise ValueError(f'invalid time window: {since!r}')
+        return seconds
+
+    @staticmethod
+    def get_rows_msg(rows):
+        lines = [f'{"Time":<20}{"Min":>10}{"Avg":>10}{"Max":>10}{"Samples":>10}']
+        for timestamp, minimum, average, maximum, count in rows:
+            lines.append(f'{time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(timestamp)):<20}'
+                         f'{minimum:>10.2f}{average:>10.2f}{maximum:>10.2f}{count:>10d}')
+        return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    pass
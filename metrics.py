@@ -0,0 +1,67 @@
+#
+# @file <metrics.py>
+#
+# @author Fernando Mendiburu - <fernando.mendiburu@ee.ufcg.edu.br>
+#
+
+import math
+
+
+class MetricFamily:
+    PREFIX = 'pc_status_'
+
+    def __init__(self, name, metric_type, help_text):
+        self.name = MetricFamily.PREFIX + name
+        self.metric_type = metric_type      # 'gauge' or 'counter'
+        self.help_text = help_text
+        self.samples = []                   # (labels, value), labels: tuple of (name, value)
+        self.missing = []                   # labels of the values not available yet (ex. first rates): not exported
+
+    def add(self, value, *labels):
+        if value is None:
+            self.missing.append(labels)
+        else:
+            self.samples.append((labels, value))
+        return self
+
+
+class OpenMetrics:
+    CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+
+    @staticmethod
+    def escape(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+    @staticmethod
+    def format_value(value):
+        if isinstance(value, bool):
+            return '1' if value else '0'
+        if isinstance(value, int):
+            return str(value)
+        if math.isnan(value):
+            return 'NaN'
+        if math.isinf(value):
+            return '+Inf' if value > 0 else '-Inf'
+        return repr(float(value))
+
+    @staticmethod
+    def encode(families):
+        lines = []
+        for family in families:
+            if not family.samples:
+                continue
+            lines.append(f'# TYPE {family.name} {family.metric_type}')
+            lines.append(f'# HELP {family.name} {OpenMetrics.escape(family.help_text)}')
+            sample_name = family.name + '_total' if family.metric_type == 'counter' else family.name
+            for labels, value in family.samples:
+                if labels:
+                    labels = ','.join(f'{name}="{OpenMetrics.escape(label)}"' for name, label in labels)
+                    lines.append(f'{sample_name}{{{labels}}} {OpenMetrics.format_value(value)}')
+                else:
+                    lines.append(f'{sample_name} {OpenMetrics.format_value(value)}')
+        lines.append('# EOF\n')
+        return '\n'.join(lines).encode('utf-8')
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,74 @@
+#
+# @file <metrics_server.py>
+#
+# @author Fernando Mendiburu - <fernando.mendiburu@ee.ufcg.edu.br>
+#
+
+import socket
+import threading
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from metrics import OpenMetrics
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.send_page(True)
+
+    def do_HEAD(self):
+        self.send_page(False)
+
+    def send_page(self, b_body):
+        if self.path.split('?', 1)[0] not in ('/metrics', '/'):
+            self.send_error(404)
+            return
+        # the page encoded after the last sample: a scrape never measures anything
+        page = self.server.metrics.page
+        self.send_response(200)
+        self.send_header('Content-Type', OpenMetrics.CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(page)))
+        self.end_headers()
+        if b_body:
+            self.wfile.write(page)
+        self.server.metrics.scrapes += 1
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MetricsHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+
+class MetricsHTTPServer6(MetricsHTTPServer):
+    address_family = socket.AF_INET6
+
+
+class MetricsServer:
+    def __init__(self, address):
+        self.address = address      # (host, port)
+        self.page = OpenMetrics.encode([])
+        self.scrapes = 0
+        self.server = None
+        self.thread = None
+
+    def set_families(self, families):
+        # the page is replaced as a whole, the request threads read either the old or the new one
+        self.page = OpenMetrics.encode(families)
+
+    def start(self):
+        server_class = MetricsHTTPServer6 if ':' in self.address[0] else MetricsHTTPServer
+        self.server = server_class(self.address, MetricsRequestHandler)
+        self.server.metrics = self
+        self.thread = threading.Thread(target=self.server.serve_forever, name='pc_status-metrics', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        if self.server is None:
+            return
+        self.server.shutdown()
+        self.server.server_close()
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,178 @@
+#
+# @file <notifier.py>
+#
+# @author Fernando Mendiburu - <fernando.mendiburu@ee.ufcg.edu.br>
+#
+
+import sys
+import json
+import time
+import queue
+import threading
+
+from common import Common
+from profiler import SelfStats
+
+
+class NotifySink:
+    @staticmethod
+    def send(title, message, config_dict, b_sound):
+        Common.notification_send(title, message, config_dict, b_sound)
+
+
+class NullSink:
+    # keeps the last notifications instead of displaying them (tests, headless machines)
+    def __init__(self, size=100):
+        self.size = size
+        self.sent = []
+
+    def send(self, title, message, config_dict, b_sound):
+        self.sent.append((title, message))
+        del self.sent[:-self.size]
+
+
+class Alarm:
+    def __init__(self, name):
+        self.name = name
+        self.b_active = False
+        self.pending_since = None
+        self.last_fired = None
+
+    def update(self, b_trigger, b_clear, now, min_duration, cooldown):
+        # returns 'fire', 'suppressed' or None
+        if self.b_active:
+            if b_clear:     # hysteresis: cleared below a lower threshold than the trigger one
+                self.b_active = False
+                self.pending_since = None
+                return None
+            if now - self.last_fired >= cooldown:   # still active: reminder after the cooldown
+                self.last_fired = now
+                return 'fire'
+            return None
+
+        if not b_trigger:
+            self.pending_since = None
+            return None
+        if self.pending_since is None:
+            self.pending_since = now
+        if now - self.pending_since < min_duration:
+            return None
+
+        self.b_active = True
+        if self.last_fired is not None and now - self.last_fired < cooldown:
+            return 'suppressed'
+        self.last_fired = now
+        return 'fire'
+
+    def get_state(self):
+        return {'ACTIVE': self.b_active, 'PENDING_SINCE': self.pending_since, 'LAST_FIRED': self.last_fired}
+
+    def set_state(self, state):
+        self.b_active = state['ACTIVE']
+        self.pending_since = state['PENDING_SINCE']
+        self.last_fired = state['LAST_FIRED']
+        if self.b_active and self.last_fired is None:
+            self.b_active = False
+
+
+class NotificationDispatcher:
+    def __init__(self, sink, state_file=None, queue_size=16):
+        self.sink = sink
+        self.state_file = state_file
+        self.queue = queue.Queue(queue_size)
+        self.alarms = {}
+        self.tick = []          # alarms fired in the current tick: (title, message)
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+        self.suppressed = 0
+        self.errors = set()     # kinds of the send errors already printed
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.load_state()
+        self.thread = threading.Thread(target=self.loop, name='pc_status-notifications', daemon=True)
+        self.thread.start()
+
+    def loop(self):
+        while True:
+            notification = self.queue.get()
+            if notification is None:
+                break
+            title, message, config_dict, b_sound, queued_at = notification
+            try:
+                with SelfStats.timer('notification', 'send'):
+                    self.sink.send(title, message, config_dict, b_sound)
+                self.sent += 1
+            except Exception as error:      # a notification error must not stop the notifications
+                self.failed += 1
+                if type(error) not in self.errors:     # the next ones are only counted
+                    self.errors.add(type(error))
+                    print(f'WARNING: notification not sent ({type(error).__name__}: {error}).', file=sys.stderr)
+            latency = time.monotonic() - queued_at
+            self.latency_total += latency
+            self.latency_max = max(self.latency_max, latency)
+
+    def evaluate(self, name, b_trigger, b_clear, title, get_message, config_dict):
+        alarm = self.alarms.get(name)
+        if alarm is None:
+            alarm = self.alarms[name] = Alarm(name)
+        result = alarm.update(b_trigger, b_clear, time.time(),
+                              config_dict.get('ALARM_MIN_DURATION', 0),
+                              config_dict.get('ALARM_COOLDOWN', 300))
+        if result == 'fire':
+            self.tick.append((title, get_message()))
+        elif result == 'suppressed':
+            self.suppressed += 1
+
+    def flush(self, config_dict, b_sound):
+        # the alarms fired in the same tick are sent in one notification
+        if not self.tick:
+            return
+        if len(self.tick) == 1:
+            title, message = self.tick[0]
+        else:
+            title = ', '.join(title for title, _ in self.tick)
+            message = '\n'.join(f'{title}: {message}' for title, message in self.tick)
+        self.tick = []
+        try:
+            self.queue.put_nowait((title, message, config_dict, b_sound, time.monotonic()))
+        except queue.Full:
+            self.dropped += 1
+
+    def get_stats_msg(self):
+        latency = self.latency_total / (self.sent + self.failed) * 1000 if self.sent + self.failed else 0.0
+        return f'Notifications: {self.sent} sent, {self.failed} failed, {self.dropped} dropped, ' \
+               f'{self.suppressed} suppressed (latency: mean {latency:.1f}ms, max {self.latency_max * 1000:.1f}ms)'
+
+    def load_state(self):
+        if self.state_file is None:
+            return
+        try:
+            with open(self.state_file, 'r') as fp:
+                states = json.load(fp)
+            for name, state in states.items():
+                self.alarms[name] = Alarm(name)
+                self.alarms[name].set_state(state)
+        except (FileNotFoundError, ValueError, KeyError, TypeError, AttributeError):
+            self.alarms = {}
+
+    def save_state(self):
+        if self.state_file is None:
+            return
+        try:
+            Common.write_params(self.state_file, {name: alarm.get_state() for name, alarm in self.alarms.items()})
+        except OSError:
+            pass
+
+    def close(self, timeout=5):
+        # waits for the queued notifications (ex. one-shot execution by Cron)
+        try:
+            self.queue.put(None, timeout=timeout)
+        except queue.Full:
+            pass
+        self.thread.join(timeout)
+        self.save_state()
+
+
+if __name__ == '__main__':
+    pass
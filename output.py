@@ -0,0 +1,119 @@
+#
+# @file <output.py>
+#
+# @author Fernando Mendiburu - <fernando.mendiburu@ee.ufcg.edu.br>
+#
+
+import io
+import os
+import sys
+import csv
+import json
+import time
+import atexit
+
+from abc import ABC, abstractmethod
+
+
+class BufferedOutput:
+    # one buffered writer for all the output, flushed by record, by interval or when the buffer is full
+    FLUSH_POLICIES = ('record', 'interval', 'buffer')
+
+    def __init__(self, config_params, stream=None):
+        self.policy = config_params.get('OUTPUT_FLUSH', 'interval')
+        self.interval = config_params.get('OUTPUT_FLUSH_INTERVAL', 1)
+        if stream is None:
+            sys.stdout.flush()      # the previous prints first
+            stream = os.fdopen(sys.stdout.fileno(), 'wb', buffering=config_params.get('OUTPUT_BUFFER_SIZE', 65536),
+                               closefd=False)
+        self.stream = stream
+        self.flushed_at = time.monotonic()
+        atexit.register(self.close)     # ex. loop interrupted by Ctrl+C
+
+    def write(self, text):
+        self.stream.write(text.encode('utf-8'))
+        if self.policy == 'record':
+            self.flush()
+        elif self.policy == 'interval' and time.monotonic() - self.flushed_at >= self.interval:
+            self.flush()
+
+    def flush(self):
+        try:
+            self.stream.flush()
+        except BrokenPipeError:     # ex. piped to head
+            os._exit(0)
+        self.flushed_at = time.monotonic()
+
+    def close(self):
+        self.flush()
+
+
+class RecordFormat(ABC):
+    # the fields of the first record: all the values of the collectors, the ones not measured yet are None
+    B_FIXED_FIELDS = False      # the fields of the later records are written, or only the first ones
+
+    def __init__(self, output):
+        self.output = output
+        self.fields = None
+        self.names = None       # the keys of the last record, compared as a set
+
+    def set_fields(self, record):
+        self.names = set(record)
+        self.fields = ['time'] + list(record)
+
+    def write(self, record, now=None):
+        if self.fields is None:
+            self.set_fields(record)
+            self.write_header()
+        elif not self.B_FIXED_FIELDS and record.keys() != self.names:
+            self.set_fields(record)
+        record['time'] = round(time.time() if now is None else now, 3)
+        self.output.write(self.encode([record.get(field) for field in self.fields]))
+
+    def write_header(self):
+        pass
+
+    @abstractmethod
+    def encode(self, values):
+        pass
+
+
+class JSONLinesFormat(RecordFormat):
+    def set_fields(self, record):
+        super().set_fields(record)
+        # '{"time": ', ', "cpu_usage_percent.total": ', ...
+        self.keys = [('{' if i == 0 else ', ') + json.dumps(field) + ': ' for i, field in enumerate(self.fields)]
+
+    def encode(self, values):
+        return ''.join(key + json.dumps(value) for key, value in zip(self.keys, values)) + '}\n'
+
+
+class CSVFormat(RecordFormat):
+    # one header: the values of a device added later are not written, the ones missing are empty
+    B_FIXED_FIELDS = True
+
+    def write_header(self):
+        header = io.StringIO()
+        csv.writer(header, lineterminator='\n').writerow(self.fields)
+        self.output.write(header.getvalue())
+
+    @staticmethod
+    def format_value(value):
+        if value is None:
+            return ''
+        if isinstance(value, bool):
+            return '1' if value else '0'
+        return str(value)
+
+    def encode(self, values):
+        # the values are numbers, no quoting needed
+        return ','.join(map(CSVFormat.format_value, values)) + '\n'
+
+
+RECORD_FORMATS = {'jsonl': JSONLinesFormat,
+                  'csv': CSVFormat
+                  }
+
+
+if __name__ == '__main__':
+    pass
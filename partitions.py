@@ -0,0 +1,181 @@
+#
+# @file <partitions.py>
+#
+# @author Fernando Mendiburu - <fernando.mendiburu@ee.ufcg.edu.br>
+#
+
+import os
+import time
+import queue
+import select
+import fnmatch
+import threading
+import psutil
+
+
+class StatPool:
+    # statvfs in worker threads: a hung file system (ex. NFS) blocks a worker, not the monitor. A worker blocked
+    # after the deadline is replaced, up to max_workers threads, so that the other partitions are still measured
+    def __init__(self, workers=4, max_workers=32):
+        self.tasks = queue.Queue()
+        self.pending = {}       # mountpoint -> task not finished yet
+        self.workers = workers
+        self.max_workers = max_workers
+        self.lock = threading.Lock()
+        self.threads = 0
+        self.busy = 0           # workers in a statvfs: at the start of stat(), the ones blocked since a previous call
+        self.started = 0        # number of threads started, for their names
+        self.add_workers(workers)
+
+    def add_workers(self, count):
+        with self.lock:
+            count = min(count, self.max_workers - self.threads)
+            self.threads += max(count, 0)
+        for _ in range(count):
+            threading.Thread(target=self.loop, name=f'pc_status-statvfs{self.started}', daemon=True).start()
+            self.started += 1
+
+    def loop(self):
+        while True:
+            task = self.tasks.get()
+            with self.lock:
+                self.busy += 1
+            try:
+                task['usage'] = psutil.disk_usage(task['mountpoint'])
+            except OSError as error:     # PermissionError, stale file handle, ...
+                task['error'] = error
+            task['done'].set()
+            with self.lock:
+                self.busy -= 1
+                # a blocked worker came back: the replacement workers are not needed anymore
+                if self.threads - self.busy > self.workers and self.tasks.empty():
+                    self.threads -= 1
+                    return
+
+    def stat(self, mountpoints, timeout):
+        # mountpoint -> usage, or None if there is no usage (error or timeout)
+        tasks = {}
+        stalled = []
+        with self.lock:
+            available = self.threads - self.busy
+        if available < self.workers:
+            self.add_workers(self.workers - available)
+        for mountpoint in mountpoints:
+            task = self.pending.get(mountpoint)
+            if task is not None and not task['done'].is_set():
+                stalled.append(mountpoint)      # still blocked since a previous call
+                continue
+            task = {'mountpoint': mountpoint, 'usage': None, 'error': None, 'done': threading.Event()}
+            self.pending[mountpoint] = task
+            tasks[mountpoint] = task
+            self.tasks.put(task)
+
+        deadline = time.monotonic() + timeout
+        usages = {}
+        for mountpoint, task in tasks.items():
+            if task['done'].wait(max(deadline - time.monotonic(), 0)):
+                del self.pending[mountpoint]
+                usages[mountpoint] = task['usage']
+            else:
+                stalled.append(mountpoint)
+        return usages, stalled
+
+
+class PartitionIndex:
+    def __init__(self, mountinfo='/proc/self/mountinfo'):
+        self.mountinfo = mountinfo
+        self.fd = None
+        self.poller = None
+        self.mtime = None
+        self.filters = None
+        self.partitions = []        # displayed partitions, one per device if deduplicated
+        self.mountpoints = {}       # device -> all its displayed mountpoints
+        self.rebuild_count = 0
+        self.open_mountinfo()
+
+    def open_mountinfo(self):
+        # the kernel signals POLLPRI/POLLERR on the mount table file when a mount changes
+        try:
+            self.fd = os.open(self.mountinfo, os.O_RDONLY)
+            self.poller = select.poll()
+            self.poller.register(self.fd, select.POLLPRI | select.POLLERR)
+        except (OSError, AttributeError):
+            self.fd = None
+            self.poller = None
+
+    def read_mountinfo(self):
+        # reading the whole file acknowledges the change event
+        os.lseek(self.fd, 0, os.SEEK_SET)
+        while os.read(self.fd, 65536):
+            pass
+
+    def is_changed(self):
+        if self.poller is not None:
+            return bool(self.poller.poll(0))
+        try:
+            mtime = os.stat(self.mountinfo).st_mtime_ns
+        except OSError:
+            return True
+        return mtime != self.mtime
+
+    @staticmethod
+    def get_filters(config_params):
+        return (tuple(config_params.get('DISK_EXCLUDE_FSTYPES', [])),
+                tuple(config_params.get('DISK_EXCLUDE_DEVICES', ['*loop*'])),
+                tuple(config_params.get('DISK_EXCLUDE_MOUNTPOINTS', [])),
+                config_params.get('DISK_DEDUP_DEVICES', 'yes') == 'yes')
+
+    @staticmethod
+    def is_excluded(partition, filters):
+        fstypes, devices, mountpoints, _ = filters
+        if partition.fstype in fstypes:
+            return True
+        if any(fnmatch.fnmatch(partition.device, pattern) for pattern in devices):
+            return True
+        return any(fnmatch.fnmatch(partition.mountpoint, pattern) for pattern in mountpoints)
+
+    def is_excluded_device(self, device):
+        patterns = self.filters[1] if self.filters is not None else ()
+        return any(fnmatch.fnmatch(device, pattern) for pattern in patterns)
+
+    def get_other_mountpoints(self, partition):
+        # bind mounts not displayed because their device is already displayed
+        if not self.filters[3]:
+            return []
+        return self.mountpoints.get(partition.device, [])[1:]
+
+    def rebuild(self, filters):
+        if self.fd is not None:
+            self.read_mountinfo()
+        else:
+            try:
+                self.mtime = os.stat(self.mountinfo).st_mtime_ns
+            except OSError:
+                self.mtime = None
+
+        partitions = []
+        mountpoints = {}
+        for partition in psutil.disk_partitions():
+            if PartitionIndex.is_excluded(partition, filters):
+                continue
+            # bind mounts of the same device have the same usage: stat it only once
+            if partition.device in mountpoints and filters[3]:
+                mountpoints[partition.device].append(partition.mountpoint)
+                continue
+            mountpoints.setdefault(partition.device, []).append(partition.mountpoint)
+            partitions.append(partition)
+
+        self.partitions = partitions
+        self.mountpoints = mountpoints
+        self.filters = filters
+        self.rebuild_count += 1
+
+    def update(self, config_params):
+        filters = PartitionIndex.get_filters(config_params)
+        if filters != self.filters or self.is_changed():
+            self.rebuild(filters)
+        return self.partitions
+
+
+if __name__ == '__main__':
+    pass
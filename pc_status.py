@@ -4,69 +4,200 @@
 # @author Fernando Mendiburu - <fernando.mendiburu@ee.ufcg.edu.br>
 #
 
-from sensor import Sensor
-from rw_parameters import ReadParametersCMD, ReadParametersFiles, WriteParametersStatFile
+import sys
+import json
+import time
+START_TIME = time.perf_counter()
+
+from profiler import StartupProfile, SelfStats, IterationProfile
+from rw_parameters import ReadParametersCMD, ReadParametersFiles, WriteParametersStatFile, ReadHistoryCMD, \
+    ReadFleetCMD
+from daemon import DaemonServer, DaemonClient
+from history_store import HistoryStore
+from output import BufferedOutput, RECORD_FORMATS
+from shared_snapshot import SnapshotWriter
+from dashboard import Dashboard
 from common import Common
 
-if __name__ == '__main__':
+StartupProfile.record('import', 'pc_status', time.perf_counter() - START_TIME)
 
-    try:
-        Common.credits()
-        parser = ReadParametersCMD()
-        params_obj = ReadParametersFiles()
-        write_obj = WriteParametersStatFile()
 
-        sensor = Sensor(params_obj)
+def get_record_format(parser, output):
+    if parser.is_text():
+        return None
+    return RECORD_FORMATS[parser.get_format()](output)
+
+
+def write_startup_profile(parser, output):
+    # the records and the dashboard stay readable, the profile goes to stderr
+    if parser.is_text() and not parser.is_dashboard():
+        output.write(StartupProfile.get_report() + '\n' + Common.SEPARATOR + '\n')
+    else:
+        print(StartupProfile.get_report(), file=sys.stderr)
+
+
+def write_self_stats(output, report):
+    output.write(report + '\n' + Common.SEPARATOR + '\n')
+
 
-        b_loop = False
-        if parser.is_loop():
-            b_loop = True
+def run_client(parser, params_obj):
+    # returns False if there is no daemon running, to fall back to local sampling
+    output = BufferedOutput(params_obj.config_params)
+    record_format = get_record_format(parser, output)
+    command = parser.get_params().info if record_format is None else 'record'
+    b_startup_profile = parser.is_startup_profile()
+    while True:
+        with StartupProfile.timer('request', 'daemon'):
+            snapshot = DaemonClient.request(Common.SOCKET_FILE, command)
+        if snapshot is None:
+            return False
+        if record_format is not None:
+            record_format.write(json.loads(snapshot))
+        else:
+            output.write(snapshot + '\n')
+            if parser.is_self_stats():
+                write_self_stats(output, DaemonClient.request(Common.SOCKET_FILE, 'self') or '')
+        if b_startup_profile:
+            write_startup_profile(parser, output)
+            b_startup_profile = False
 
+        if not parser.is_loop():
+            output.close()
+            return True
+
+        time.sleep(params_obj.config_params.get('LOOP_INTERVAL', 1))
+        params_obj.update_parameters()
+
+
+def import_sensor():
+    # imported here, the client does not need psutil
+    for name in ('psutil', 'system', 'sensor'):
+        StartupProfile.import_module(name)
+    return StartupProfile.import_module('sensor').Sensor
+
+
+def run_local(parser, params_obj):
+    Sensor = import_sensor()
+
+    write_obj = WriteParametersStatFile(params_obj)
+    sensor = Sensor(params_obj, Sensor.get_collector_names(parser.is_full() or parser.is_dashboard(),
+                                                           parser.is_notification()), b_rules=parser.is_loop())
+    output = BufferedOutput(params_obj.config_params)
+    record_format = get_record_format(parser, output)
+    b_startup_profile = parser.is_startup_profile()
+    profile = None
+    if parser.get_profile_iterations() > 0:
+        profile = IterationProfile(parser.get_profile_iterations(), parser.get_params().profile_output)
+    snapshot_writer = None
+    if parser.is_loop() and params_obj.config_params.get('SNAPSHOT_PUBLISH', 'yes') == 'yes':
+        snapshot_writer = SnapshotWriter(Common.SNAPSHOT_FILE)
+    dashboard = Dashboard(output, params_obj.config_params, parser.is_self_stats()) if parser.is_dashboard() else None
+
+    try:
         while True:
+            if profile is not None:
+                profile.start()
             params_obj.update_parameters()
             sensor.update()
             sensor.set_parameters(params_obj)
 
             if parser.is_notification():
-                if sensor.battery.is_discharging_below_threshold() and sensor.battery.is_notification_battery():
-                    sensor.battery.alarm_discharging(parser.is_sound())
-                if sensor.memory.is_high_usage() and sensor.memory.is_notification_memory():
-                    sensor.memory.alarm(parser.is_sound())
-                if sensor.cpu.is_cpu_high_usage() and sensor.cpu.is_notification_cpu():
-                    sensor.cpu.alarm(parser.is_sound())
-                if sensor.temperature.is_high_temperature() and sensor.temperature.is_notification_temperature():
-                    sensor.temperature.alarm(parser.is_sound())
-                if sensor.gpu.is_high_load() and sensor.gpu.is_notification_gpu():
-                    sensor.gpu.alarm(parser.is_sound())
-
-            if parser.is_full():
-                print(Common.SEPARATOR)
-                sensor.run()
-                print(Common.SEPARATOR)
+                sensor.notify(parser.is_sound())
+            write_obj.write_parameters(sensor.get_stats_params())
+
+            record = None
+            if snapshot_writer is not None:
+                record = sensor.get_record()
+                with SelfStats.timer('render', 'snapshot'):
+                    snapshot_writer.publish(record)
+
+            if record_format is not None:
+                record_format.write(record if record is not None else sensor.get_record())
+
+            elif dashboard is not None:
+                dashboard.set_parameters(params_obj.config_params)
+                dashboard.show(sensor)
+
+            elif parser.is_full():
+                output.write('\n'.join([sensor.get_full_msg(), params_obj.get_reload_msg(), Common.SEPARATOR, '']))
 
             elif parser.is_status():
-                print(Common.SEPARATOR)
-                print(sensor.cpu.get_usage_msg())
-                print(Common.SEPARATOR)
-                print(sensor.temperature.get_temperature_string())
-                print(Common.SEPARATOR)
-                print(sensor.memory.get_mem_swap_msg())
-                print(sensor.battery.get_percentage_msg())
-                print(Common.SEPARATOR)
-                print(sensor.gpu.get_gpu_string())
-                print(Common.SEPARATOR)
-
-            if not b_loop:
+                output.write(sensor.get_status_msg() + '\n')
+
+            if parser.is_self_stats() and record_format is None and dashboard is None:
+                write_self_stats(output, SelfStats.get_report())
+
+            if b_startup_profile:
+                write_startup_profile(parser, output)
+                b_startup_profile = False
+
+            if profile is not None and profile.tick():
+                print(profile.get_report(), file=sys.stderr)
+
+            if not parser.is_loop():
                 break
 
-        # generate dict:
-        dict_stats_params = {"BATTERY_STATUS": sensor.battery.get_percentage(),
-                             "CPU_STATUS": sensor.cpu.get_cpu_usage(),
-                             "MEMORY_STATUS": sensor.memory.get_memory_usage(),
-                             "GPU_STATUS": sensor.memory.get_memory_usage()
-                             }
+            if dashboard is not None:
+                dashboard.wait(sensor.scheduler.get_next_deadline())
+            else:
+                sensor.wait()
+    finally:
+        if dashboard is not None:
+            dashboard.close()       # also on Ctrl+C and SIGTERM, before the 'Exit program!' message
+    output.close()
+    write_obj.close()
+    if snapshot_writer is not None:
+        snapshot_writer.close()
+    sensor.save_state()
+    sensor.close()
+
+
+def run_history(args):
+    history_parser = ReadHistoryCMD(args)
+    params_obj = ReadParametersFiles()
+    rows = params_obj.history_store.query(history_parser.get_params().metric, history_parser.get_seconds(),
+                                          level=history_parser.get_level())
+    print(HistoryStore.get_rows_msg(rows))
+
+
+def run_fleet(args):
+    fleet_parser = ReadFleetCMD(args)
+    command = fleet_parser.get_params().command
+    if command == 'query':
+        answer = DaemonClient.request(Common.FLEET_SOCKET_FILE, fleet_parser.get_query())
+        print(answer if answer is not None else 'ERROR: fleet collector not running!')
+        return
+
+    from fleet import FleetCollector, FleetSimulator
+    if command == 'collector':
+        FleetCollector(ReadParametersFiles(), fleet_parser.get_params().listen, Common.FLEET_SOCKET_FILE).run()
+    else:
+        params = fleet_parser.get_params()
+        FleetSimulator(params.to, params.protocol, params.hosts).run(params.rounds)
+
+
+if __name__ == '__main__':
+
+    try:
+        if len(sys.argv) > 1 and sys.argv[1] == 'history':
+            run_history(sys.argv[2:])
+            sys.exit()
+        if len(sys.argv) > 1 and sys.argv[1] == 'fleet':
+            run_fleet(sys.argv[2:])
+            sys.exit()
+
+        parser = ReadParametersCMD()
+        if parser.is_text():
+            Common.credits()
+        params_obj = ReadParametersFiles()
 
-        write_obj.write_parameters(dict_stats_params)
+        if parser.is_daemon():
+            daemon = DaemonServer(params_obj, Common.SOCKET_FILE, parser.is_notification(), parser.is_sound(),
+                                  parser.get_metrics_address(), parser.get_push_address(), parser.get_push_protocol(),
+                                  parser.get_profile_iterations(), parser.get_params().profile_output)
+            daemon.run()
+        elif parser.is_dashboard() or not run_client(parser, params_obj):
+            run_local(parser, params_obj)
 
     except KeyboardInterrupt:
         print('\nExit program!')
@@ -0,0 +1,122 @@
+#
+# @file <processes.py>
+#
+# @author Fernando Mendiburu - <fernando.mendiburu@ee.ufcg.edu.br>
+#
+
+import time
+import heapq
+import psutil
+
+from operator import itemgetter
+from common import Common
+
+
+class Processes:
+    # the psutil.Process of each process is kept between the updates (cpu_percent since the previous update). The
+    # process table is scanned again only if a process started or finished.
+    ATTRS = ['cpu_percent', 'memory_info']
+
+    def __init__(self, params_obj):
+        self.params_obj = params_obj
+        self.processes = {}     # pid -> (psutil.Process, name)
+        self.pids = set()
+        self.top_cpu = []       # (cpu %, rss, pid, name)
+        self.top_memory = []
+        self.b_cpu_ready = False
+        self.measured_at = None
+        self.cost = 0.0
+        self.updates = 0
+        self.scans = 0
+        self.reused = 0
+        self.update()
+
+    def add_process(self, pid):
+        try:
+            process = psutil.Process(pid)
+            self.processes[pid] = (process, process.name())
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            pass
+
+    def scan(self, pids):
+        for pid in self.pids - pids:
+            del self.processes[pid]
+        # a PID that finished and was reused by a new process since the previous scan (other create_time)
+        for pid, (process, _) in list(self.processes.items()):
+            try:
+                if process.is_running():
+                    continue
+            except psutil.AccessDenied:
+                continue
+            del self.processes[pid]
+            self.reused += 1
+            self.add_process(pid)
+        for pid in pids - self.pids:
+            self.add_process(pid)
+        self.pids = pids
+        self.scans += 1
+
+    def wait_window(self):
+        # the CPU usage of a shorter window would be mostly the start of pc_status (ex. first two updates)
+        min_window = self.params_obj.config_params.get('CPU_MIN_WINDOW', 0.5)
+        if self.measured_at is not None:
+            delay = self.measured_at + min_window - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+    def update(self):
+        self.wait_window()
+        start = time.perf_counter()
+        pids = set(psutil.pids())
+        if pids != self.pids:
+            self.scan(pids)
+
+        samples = []
+        for pid, (process, name) in list(self.processes.items()):
+            try:
+                values = process.as_dict(attrs=Processes.ATTRS)
+            except psutil.NoSuchProcess:
+                del self.processes[pid]
+                continue
+            if values['memory_info'] is None:   # access denied
+                continue
+            samples.append((values['cpu_percent'] or 0.0, values['memory_info'].rss, pid, name))
+        self.measured_at = time.monotonic()
+
+        top_n = self.params_obj.config_params.get('PROCESSES_TOP_N', 5)
+        self.top_cpu = heapq.nlargest(top_n, samples, key=itemgetter(0))
+        self.top_memory = heapq.nlargest(top_n, samples, key=itemgetter(1))
+        # cpu_percent is 0.0 in the first call of each process
+        self.b_cpu_ready = self.updates > 0
+        self.updates += 1
+        self.cost = time.perf_counter() - start
+
+    def get_top_cpu_msg(self):
+        if not self.b_cpu_ready:
+            return 'Top CPU: n/a (first measure)'
+        return 'Top CPU: ' + ', '.join(f'{name} ({pid}): {cpu:.1f}%' for cpu, _, pid, name in self.top_cpu)
+
+    def get_top_memory_msg(self):
+        return 'Top memory: ' + ', '.join(f'{name} ({pid}): {Common.convert_units(rss)}'
+                                          for _, rss, pid, name in self.top_memory)
+
+    def get_cost_msg(self):
+        return f'Processes: {len(self.processes)} ({self.scans} scans, {self.reused} PIDs reused), ' \
+               f'update time: {self.cost * 1000:.2f}ms'
+
+    def info(self):
+        print(Common.SEPARATOR)
+        print(self.get_top_cpu_msg())
+        print(self.get_top_memory_msg())
+        print(self.get_cost_msg())
+        print(Common.SEPARATOR)
+
+    def set_parameters(self, params_obj):
+        self.params_obj = params_obj
+
+    def run(self):
+        self.info()
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,291 @@
+#
+# @file <procfs.py>
+#
+# @author Fernando Mendiburu - <fernando.mendiburu@ee.ufcg.edu.br>
+#
+
+import os
+import errno
+import psutil
+
+from collections import namedtuple, Counter
+
+# same fields as the psutil (Linux) named tuples used by the collectors
+scputimes = namedtuple('scputimes', 'user nice system idle iowait irq softirq steal guest guest_nice')
+svmem = namedtuple('svmem', 'total available percent used free buffers cached')
+sswap = namedtuple('sswap', 'total used free percent sin sout')
+sdiskio = namedtuple('sdiskio', 'read_count write_count read_bytes write_bytes read_time write_time busy_time')
+snetio = namedtuple('snetio', 'bytes_sent bytes_recv packets_sent packets_recv errin errout dropin dropout')
+shwtemp = namedtuple('shwtemp', 'label current high critical')
+
+
+class ProcFile:
+    # opened once, and read again from the offset 0 (pread) into the same buffer
+    def __init__(self, path, size=4096):
+        self.path = path
+        self.fd = os.open(path, os.O_RDONLY | os.O_CLOEXEC)
+        self.buffer = bytearray(size)
+
+    def read(self):
+        while True:
+            size = os.preadv(self.fd, [self.buffer], 0)
+            if size < len(self.buffer):
+                return bytes(memoryview(self.buffer)[:size])
+            self.buffer = bytearray(len(self.buffer) * 2)     # the file does not fit, read it again
+
+    def close(self):
+        os.close(self.fd)
+
+
+class HwmonIndex:
+    # (chip, label) -> temp*_input file, high and critical temperatures: the hwmon directories are listed and the
+    # labels and limits read once, each sample reads only the input files. Built again when a device is added or
+    # removed.
+    def __init__(self, root='/'):
+        self.directory = os.path.join(root, 'sys/class/hwmon')
+        self.devices = None         # hwmon directories of the index
+        self.sensors = {}           # (chip, label) -> (input file, high, critical)
+        self.builds = 0
+
+    def is_available(self):
+        return os.path.isdir(self.directory)
+
+    @staticmethod
+    def read_value(path, default=None):
+        # values that do not change (names, labels, limits): not kept open
+        try:
+            with open(path, 'rb') as fp:
+                return fp.read().strip().decode()
+        except OSError:
+            return default
+
+    def get_chips(self, devices):
+        # chip of each hwmon directory: its name, with its device if several chips have the same name
+        # (ex. 'coretemp.0' and 'coretemp.1', one for each CPU package)
+        names = {device: HwmonIndex.read_value(os.path.join(self.directory, device, 'name'), device)
+                 for device in devices}
+        counts = Counter(names.values())
+        chips = {}
+        for device, name in names.items():
+            if counts[name] == 1:
+                chips[device] = name
+                continue
+            link = os.path.join(self.directory, device, 'device')
+            parent = os.path.basename(os.path.realpath(link)) if os.path.exists(link) else device
+            chips[device] = parent if parent.startswith(name) else f'{name}-{parent}'
+        return chips
+
+    def build(self, devices):
+        self.close()
+        self.devices = devices
+        self.builds += 1
+        for device, chip in self.get_chips(devices).items():
+            path = os.path.join(self.directory, device)
+            try:
+                files = sorted(os.listdir(path))
+            except OSError:
+                continue
+            for file in files:
+                if not (file.startswith('temp') and file.endswith('_input')):
+                    continue
+                sensor = file[:-len('_input')]
+                prefix = os.path.join(path, sensor)
+                try:
+                    input_file = ProcFile(prefix + '_input', 64)
+                except OSError:
+                    continue
+                label = HwmonIndex.read_value(prefix + '_label', sensor)
+                if (chip, label) in self.sensors:       # same label twice in a chip, ex. 'Tctl'
+                    label = f'{label} ({sensor})'
+                high = HwmonIndex.read_value(prefix + '_max')
+                critical = HwmonIndex.read_value(prefix + '_crit')
+                self.sensors[(chip, label)] = (input_file, int(high) / 1000 if high else None,
+                                               int(critical) / 1000 if critical else None)
+
+    def read(self):
+        # {(chip, label): shwtemp}, without the sensors not available (ex. device sleeping)
+        try:
+            devices = sorted(os.listdir(self.directory))
+        except OSError:
+            devices = []
+        if devices != self.devices:
+            self.build(devices)
+        temperatures = {}
+        for key, (input_file, high, critical) in self.sensors.items():
+            try:
+                current = int(input_file.read()) / 1000
+            except ValueError:
+                continue
+            except OSError as error:
+                if error.errno in (errno.ENODEV, errno.ENOENT):     # device removed: built again the next time
+                    self.devices = None
+                continue
+            temperatures[key] = shwtemp(key[1], current, high, critical)
+        return temperatures
+
+    def close(self):
+        # shared by the collectors: built again by the next read()
+        for input_file, _, _ in self.sensors.values():
+            input_file.close()
+        self.sensors = {}
+        self.devices = None
+
+
+class ProcfsBackend:
+    # Linux only: /proc and /sys read directly, parsing only the fields used by the collectors.
+    # The other psutil functions (ex. disk_partitions) are the psutil ones.
+    SECTOR_SIZE = 512
+    MEMINFO_KEYS = (b'MemTotal:', b'MemFree:', b'MemAvailable:', b'Buffers:', b'Cached:', b'SReclaimable:',
+                    b'SwapTotal:', b'SwapFree:')
+
+    def __init__(self, root='/'):
+        self.root = root
+        self.files = {}
+        self.clock_ticks = os.sysconf('SC_CLK_TCK')
+        self.btime = None
+        self.storage_devices = {}       # disk name -> is a whole disk (not a partition)
+        self.hwmon = get_root_hwmon_index(root)        # the one of the temperature collector
+
+    def __getattr__(self, name):
+        return getattr(psutil, name)
+
+    def get_path(self, path):
+        return os.path.join(self.root, path)
+
+    def read(self, path):
+        file = self.files.get(path)
+        if file is None:
+            file = self.files[path] = ProcFile(self.get_path(path))
+        return file.read()
+
+    def cpu_times(self, percpu=False):
+        times = []
+        for line in self.read('proc/stat').split(b'\n'):
+            if not line.startswith(b'cpu'):     # the cpu lines are the first ones
+                break
+            values = [int(value) / self.clock_ticks for value in line.split()[1:11]]
+            times.append(scputimes(*values, *[0.0] * (10 - len(values))))
+        return times[1:] if percpu else times[0]
+
+    def boot_time(self):
+        if self.btime is None:
+            for line in self.read('proc/stat').split(b'\n'):
+                if line.startswith(b'btime'):
+                    self.btime = float(line.split()[1])
+        return self.btime
+
+    def read_meminfo(self):
+        meminfo = {}
+        for line in self.read('proc/meminfo').split(b'\n'):
+            key, _, value = line.partition(b' ')
+            if key in ProcfsBackend.MEMINFO_KEYS:
+                meminfo[key] = int(value.split()[0]) * 1024
+        return meminfo
+
+    def virtual_memory(self):
+        # same computation as psutil
+        meminfo = self.read_meminfo()
+        total, free = meminfo[b'MemTotal:'], meminfo[b'MemFree:']
+        buffers = meminfo.get(b'Buffers:', 0)
+        cached = meminfo.get(b'Cached:', 0) + meminfo.get(b'SReclaimable:', 0)
+        available = meminfo.get(b'MemAvailable:', free + buffers + cached)
+        used = total - available
+        percent = round((total - available) / total * 100, 1) if total else 0.0
+        return svmem(total, available, percent, used, free, buffers, cached)
+
+    def swap_memory(self):
+        # sin and sout are not read (not used)
+        meminfo = self.read_meminfo()
+        total, free = meminfo.get(b'SwapTotal:', 0), meminfo.get(b'SwapFree:', 0)
+        used = total - free
+        return sswap(total, used, free, round(used / total * 100, 1) if total else 0.0, 0, 0)
+
+    def is_storage_device(self, name):
+        b_storage = self.storage_devices.get(name)
+        if b_storage is None:
+            b_storage = self.storage_devices[name] = os.path.exists(self.get_path(f'sys/block/{name}'))
+        return b_storage
+
+    def disk_io_counters(self, perdisk=False):
+        disks = {}
+        for line in self.read('proc/diskstats').split(b'\n'):
+            fields = line.split()
+            if len(fields) < 14:
+                continue
+            name = fields[2].decode()
+            if not perdisk and not self.is_storage_device(name):     # partitions counted in their disk
+                continue
+            disks[name] = sdiskio(int(fields[3]), int(fields[7]),
+                                  int(fields[5]) * ProcfsBackend.SECTOR_SIZE, int(fields[9]) * ProcfsBackend.SECTOR_SIZE,
+                                  int(fields[6]), int(fields[10]), int(fields[12]))
+        if perdisk:
+            return disks
+        if not disks:
+            return None
+        return sdiskio(*(sum(values) for values in zip(*disks.values())))
+
+    def net_io_counters(self, pernic=False):
+        nics = {}
+        for line in self.read('proc/net/dev').split(b'\n')[2:]:
+            name, _, values = line.partition(b':')
+            fields = values.split()
+            if len(fields) < 16:
+                continue
+            nics[name.strip().decode()] = snetio(int(fields[8]), int(fields[0]), int(fields[9]), int(fields[1]),
+                                                 int(fields[2]), int(fields[10]), int(fields[3]), int(fields[11]))
+        if pernic:
+            return nics
+        return snetio(*(sum(values) for values in zip(*nics.values())))
+
+    def sensors_temperatures(self, fahrenheit=False):
+        # same structure as psutil: {chip: [shwtemp]}
+        if self.hwmon is None:
+            return psutil.sensors_temperatures(fahrenheit) if self.root == '/' else {}
+        temperatures = {}
+        for (chip, _), value in self.hwmon.read().items():
+            temperatures.setdefault(chip, []).append(value)
+        return temperatures
+
+    def close(self):
+        for file in self.files.values():
+            file.close()
+        self.files = {}
+        if self.hwmon is not None:
+            self.hwmon.close()
+
+
+BACKENDS = {}       # root -> ProcfsBackend, shared by the collectors
+
+
+def get_backend(config_params):
+    # the procfs backend if it is configured and available, otherwise psutil
+    if config_params.get('BACKEND', 'psutil') != 'procfs':
+        return psutil
+    root = config_params.get('PROCFS_ROOT', '/')
+    if root not in BACKENDS:
+        if not os.path.exists(os.path.join(root, 'proc/stat')):
+            return psutil
+        BACKENDS[root] = ProcfsBackend(root)
+    return BACKENDS[root]
+
+
+HWMON_INDEXES = {}      # root -> HwmonIndex, None without hwmon
+
+
+def get_root_hwmon_index(root):
+    # one index by root, shared by the temperature collector and the procfs backend
+    if root not in HWMON_INDEXES:
+        index = HwmonIndex(root)
+        HWMON_INDEXES[root] = index if index.is_available() else None
+    return HWMON_INDEXES[root]
+
+
+def get_hwmon_index(config_params):
+    # the hwmon index of the temperature collector (Linux), None if it is not used or not available (psutil)
+    if config_params.get('TEMPERATURE_BACKEND', 'hwmon') != 'hwmon':
+        return None
+    return get_root_hwmon_index(config_params.get('PROCFS_ROOT', '/'))
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,184 @@
+#
+# @file <profiler.py>
+#
+# @author Fernando Mendiburu - <fernando.mendiburu@ee.ufcg.edu.br>
+#
+
+import os
+import sys
+import time
+import importlib
+import threading
+import contextlib
+
+from ring_buffer import RingBuffer
+
+
+class StartupProfile:
+    # (category, name) -> seconds, in insertion order
+    TIMES = {}
+
+    @staticmethod
+    def record(category, name, seconds):
+        key = (category, name)
+        StartupProfile.TIMES[key] = StartupProfile.TIMES.get(key, 0.0) + seconds
+
+    @staticmethod
+    @contextlib.contextmanager
+    def timer(category, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            StartupProfile.record(category, name, time.perf_counter() - start)
+
+    @staticmethod
+    def import_module(name):
+        # optional backends are imported only when they are used the first time
+        module = sys.modules.get(name)
+        if module is not None:
+            return module
+        with StartupProfile.timer('import', name):
+            return importlib.import_module(name)
+
+    @staticmethod
+    def get_report():
+        lines = ['Startup profile:']
+        total = 0.0
+        for (category, name), seconds in StartupProfile.TIMES.items():
+            lines.append(f'\t{category:<14}{name:<20}{seconds * 1000:9.2f}ms')
+            total += seconds
+        lines.append(f'\t{"total":<34}{total * 1000:9.2f}ms')
+        return '\n'.join(lines)
+
+
+class SelfStats:
+    # durations of the last measures of each (category, name), always recorded:
+    # collector updates, messages, config reloads and notifications
+    CAPACITY = 256
+    DURATIONS = {}
+    START_WALL = time.monotonic()
+    START_CPU = sum(os.times()[:2])
+
+    @staticmethod
+    def record(category, name, seconds):
+        key = (category, name)
+        buffer = SelfStats.DURATIONS.get(key)
+        if buffer is None:
+            buffer = SelfStats.DURATIONS[key] = RingBuffer(SelfStats.CAPACITY)
+        buffer.append(seconds)
+
+    @staticmethod
+    @contextlib.contextmanager
+    def timer(category, name):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            SelfStats.record(category, name, time.monotonic() - start)
+
+    @staticmethod
+    def get_durations():
+        # (category, name) -> (count, p50, p99, max), the count since the start
+        durations = {}
+        for key, buffer in list(SelfStats.DURATIONS.items()):
+            durations[key] = (buffer.seq, buffer.get_percentile(50), buffer.get_percentile(99), buffer.get_max())
+        return durations
+
+    @staticmethod
+    def get_cpu_time():
+        # user + system time of all the threads
+        return sum(os.times()[:2]) - SelfStats.START_CPU
+
+    @staticmethod
+    def get_cpu_usage():
+        wall = time.monotonic() - SelfStats.START_WALL
+        return SelfStats.get_cpu_time() / wall * 100 if wall > 0 else 0.0
+
+    @staticmethod
+    def get_rss():
+        # resident memory now (Linux), otherwise the peak
+        try:
+            with open('/proc/self/statm', 'r') as fp:
+                return int(fp.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        except (OSError, ValueError, IndexError):
+            import resource
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    @staticmethod
+    def get_report():
+        lines = [f'Self stats: CPU time {SelfStats.get_cpu_time():.2f}s ({SelfStats.get_cpu_usage():.2f}%), '
+                 f'memory {SelfStats.get_rss() / 1024 / 1024:.1f}MB']
+        for (category, name), (count, p50, p99, maximum) in SelfStats.get_durations().items():
+            lines.append(f'\t{category:<14}{name:<20}p50 {p50 * 1000:8.3f}ms  p99 {p99 * 1000:8.3f}ms  '
+                         f'max {maximum * 1000:8.3f}ms  ({count} times)')
+        return '\n'.join(lines)
+
+
+class IterationProfile:
+    # cProfile of the first iterations (main thread and collector threads), written to a file (pstats format)
+    ACTIVE = None
+    # Python 3.12+: cProfile uses sys.monitoring, one profile for all the threads (a second one raises ValueError)
+    B_GLOBAL = sys.version_info >= (3, 12)
+
+    def __init__(self, iterations, file):
+        import cProfile
+
+        self.iterations = iterations
+        self.file = file
+        self.profile = cProfile.Profile()
+        self.thread_profiles = {}       # thread name -> cProfile.Profile
+        self.lock = threading.Lock()
+        self.count = 0
+        IterationProfile.ACTIVE = self
+
+    def start(self):
+        # the waits between two iterations are not profiled
+        if self.count < self.iterations:
+            self.profile.enable()
+
+    def run(self, function):
+        # called by the collector threads while the profile is active
+        import cProfile
+
+        if IterationProfile.B_GLOBAL:
+            return function()
+        name = threading.current_thread().name
+        with self.lock:
+            profile = self.thread_profiles.get(name)
+            if profile is None:
+                profile = self.thread_profiles[name] = cProfile.Profile()
+        return profile.runcall(function)
+
+    def tick(self):
+        # returns True once, when the last iteration was profiled
+        if self.count >= self.iterations:
+            return False
+        self.profile.disable()
+        self.count += 1
+        if self.count < self.iterations:
+            return False
+        IterationProfile.ACTIVE = None
+        self.save()
+        return True
+
+    def save(self):
+        import pstats
+
+        stats = pstats.Stats(self.profile)
+        with self.lock:
+            for profile in self.thread_profiles.values():
+                stats.add(profile)
+        stats.dump_stats(self.file)
+
+    def get_report(self, count=15):
+        import io
+        import pstats
+
+        output = io.StringIO()
+        pstats.Stats(self.file, stream=output).sort_stats('cumulative').print_stats(count)
+        return f'Profile of {self.iterations} iterations written to {self.file}\n{output.getvalue()}'
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,68 @@
+#
+# @file <rates.py>
+#
+# @author Fernando Mendiburu - <fernando.mendiburu@ee.ufcg.edu.br>
+#
+
+import time
+
+
+class CounterRates:
+    # per device rates (per second) of cumulative counters. psutil already handles the wraparound of the 32 bits
+    # counters of the kernel (nowrap=True), so a decrease is a reset (ex. NIC driver reloaded, cgroup created again):
+    # no rates for that interval, the counters after the reset are the new base
+    def __init__(self, fields, min_interval=0.5):
+        self.fields = fields
+        self.min_interval = min_interval
+        self.previous = {}      # device -> (time, counters)
+        self.rates = {}         # device -> {field: rate}, the dictionaries are reused
+        self.deltas = {}        # device -> {field: delta}
+
+    def update(self, counters_by_device, now=None):
+        if now is None:
+            now = time.monotonic()
+
+        for device in list(self.previous):
+            if device not in counters_by_device:    # device removed
+                del self.previous[device]
+                self.rates.pop(device, None)
+                self.deltas.pop(device, None)
+
+        for device, counters in counters_by_device.items():
+            values = tuple(getattr(counters, field, 0) for field in self.fields)
+            previous = self.previous.get(device)
+            if previous is None:
+                self.previous[device] = (now, values)
+                continue
+            interval = now - previous[0]
+            if interval < self.min_interval:
+                continue
+
+            self.previous[device] = (now, values)
+            if any(value < previous_value for value, previous_value in zip(values, previous[1])):
+                self.rates.pop(device, None)
+                self.deltas.pop(device, None)
+                continue
+
+            rates = self.rates.setdefault(device, {})
+            deltas = self.deltas.setdefault(device, {})
+            for field, value, previous_value in zip(self.fields, values, previous[1]):
+                deltas[field] = value - previous_value
+                rates[field] = deltas[field] / interval
+            rates['interval'] = interval
+
+    def reset(self, device):
+        # the counters of the device start again (ex. a cgroup created again with the same name)
+        self.previous.pop(device, None)
+        self.rates.pop(device, None)
+        self.deltas.pop(device, None)
+
+    def get_rates(self, device):
+        return self.rates.get(device)
+
+    def get_deltas(self, device):
+        return self.deltas.get(device)
+
+
+if __name__ == '__main__':
+    pass
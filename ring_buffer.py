@@ -0,0 +1,177 @@
+#
+# @file <ring_buffer.py>
+#
+# @author Fernando Mendiburu - <fernando.mendiburu@ee.ufcg.edu.br>
+#
+
+import time
+
+from array import array
+
+
+class MonotonicQueue:
+    # sequence numbers of the samples that can still be the minimum (or maximum) of the buffer
+    def __init__(self, ring, capacity, b_max):
+        self.ring = ring
+        self.capacity = capacity
+        self.b_max = b_max
+        self.seqs = array('q', [0]) * capacity
+        self.head = 0
+        self.size = 0
+
+    def is_dominated(self, old_value, new_value):
+        if self.b_max:
+            return old_value <= new_value
+        return old_value >= new_value
+
+    def push(self, seq, value):
+        # drop the evicted sample from the front
+        if self.size and self.seqs[self.head] <= seq - self.capacity:
+            self.head = (self.head + 1) % self.capacity
+            self.size -= 1
+        # drop the samples that can not be the extreme anymore from the back
+        while self.size:
+            last = (self.head + self.size - 1) % self.capacity
+            if not self.is_dominated(self.ring.get_value(self.seqs[last]), value):
+                break
+            self.size -= 1
+        self.seqs[(self.head + self.size) % self.capacity] = seq
+        self.size += 1
+
+    def get(self):
+        if not self.size:
+            return None
+        return self.ring.get_value(self.seqs[self.head])
+
+
+class RingBuffer:
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.values = array('d', [0.0]) * capacity
+        self.times = array('d', [0.0]) * capacity
+        self.seq = 0        # number of samples ever appended
+        self.sum = 0.0
+        self.min_queue = MonotonicQueue(self, capacity, False)
+        self.max_queue = MonotonicQueue(self, capacity, True)
+
+    def __len__(self):
+        return min(self.seq, self.capacity)
+
+    def get_value(self, seq):
+        return self.values[seq % self.capacity]
+
+    def append(self, value, now=None):
+        if now is None:
+            now = time.time()
+        index = self.seq % self.capacity
+        if self.seq >= self.capacity:
+            self.sum -= self.values[index]
+        self.values[index] = value
+        self.times[index] = now
+        self.sum += value
+        self.min_queue.push(self.seq, value)
+        self.max_queue.push(self.seq, value)
+        self.seq += 1
+        # avoids the accumulation of rounding errors in the running sum
+        if self.seq % self.capacity == 0:
+            self.sum = sum(self.values)
+
+    def get_last(self):
+        if not self.seq:
+            return None
+        return self.get_value(self.seq - 1)
+
+    def get_values(self, count):
+        # the last 'count' values, oldest first
+        count = min(count, len(self))
+        return [self.get_value(seq) for seq in range(self.seq - count, self.seq)]
+
+    def get_min(self):
+        return self.min_queue.get()
+
+    def get_max(self):
+        return self.max_queue.get()
+
+    def get_mean(self):
+        if not self.seq:
+            return None
+        return self.sum / len(self)
+
+    def get_window(self, seconds, now=None):
+        # values of the last 'seconds', newest first
+        if now is None:
+            now = time.time()
+        start = now - seconds
+        window = array('d')
+        for seq in range(self.seq - 1, self.seq - 1 - len(self), -1):
+            index = seq % self.capacity
+            if self.times[index] < start:
+                break
+            window.append(self.values[index])
+        return window
+
+    @staticmethod
+    def get_percentile_sorted(sorted_values, percentile):
+        if not sorted_values:
+            return None
+        position = (len(sorted_values) - 1) * percentile / 100
+        lower = int(position)
+        upper = min(lower + 1, len(sorted_values) - 1)
+        return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+    def get_percentile(self, percentile, seconds=None, now=None):
+        if seconds is None:
+            values = self.values[:len(self)]
+        else:
+            values = self.get_window(seconds, now)
+        return RingBuffer.get_percentile_sorted(sorted(values), percentile)
+
+    def get_window_stats(self, seconds, percentile, now=None):
+        values = sorted(self.get_window(seconds, now))
+        if not values:
+            return None
+        return {'min': values[0],
+                'max': values[-1],
+                'mean': sum(values) / len(values),
+                'percentile': RingBuffer.get_percentile_sorted(values, percentile),
+                'count': len(values)
+                }
+
+
+class MetricHistory:
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.buffers = {}
+
+    def record(self, samples, now=None):
+        if now is None:
+            now = time.time()
+        for name, value in samples.items():
+            if value is None:
+                continue
+            buffer = self.buffers.get(name)
+            if buffer is None:
+                buffer = self.buffers[name] = RingBuffer(self.capacity)
+            buffer.append(value, now)
+
+    def get(self, name):
+        return self.buffers.get(name)
+
+    def get_percentile(self, name, percentile, seconds=None, now=None):
+        buffer = self.buffers.get(name)
+        if buffer is None:
+            return None
+        return buffer.get_percentile(percentile, seconds, now)
+
+    def get_summary_msg(self, name, seconds, percentile, unit):
+        buffer = self.buffers.get(name)
+        stats = buffer.get_window_stats(seconds, percentile) if buffer is not None else None
+        if stats is None:
+            return f'{name}: no samples in the last {seconds}s'
+        return f'{name} last {seconds}s: p{percentile} {stats["percentile"]:.1f}{unit} ' \
+               f'(min {stats["min"]:.1f}{unit}, mean {stats["mean"]:.1f}{unit}, ' \
+               f'max {stats["max"]:.1f}{unit}, {stats["count"]} samples)'
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,294 @@
+#
+# @file <rules.py>
+#
+# @author Fernando Mendiburu - <fernando.mendiburu@ee.ufcg.edu.br>
+#
+
+import re
+import sys
+import time
+import bisect
+import fnmatch
+import operator
+
+from collections import deque
+
+from history_store import HistoryStore
+
+
+class Window:
+    # samples of one series in the last 'seconds', with their running sum and the monotonic queues of the minimum
+    # and maximum: each sample is added and removed once, the cost does not depend on the length of the window
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.samples = deque()          # (time, value)
+        self.sum = 0.0
+        self.pushes = 0                 # since the last exact sum
+        self.min_queue = deque()        # (time, value), increasing values
+        self.max_queue = deque()        # (time, value), decreasing values
+        self.evicted_at = None
+
+    def push(self, now, value):
+        self.evicted_at = None
+        self.samples.append((now, value))
+        self.sum += value
+        while self.min_queue and self.min_queue[-1][1] >= value:
+            self.min_queue.pop()
+        self.min_queue.append((now, value))
+        while self.max_queue and self.max_queue[-1][1] <= value:
+            self.max_queue.pop()
+        self.max_queue.append((now, value))
+        self.evict(now)
+        # avoids the accumulation of rounding errors in the running sum
+        self.pushes += 1
+        if self.pushes >= len(self.samples):
+            self.sum = sum(value for _, value in self.samples)
+            self.pushes = 0
+
+    def evict(self, now):
+        start = now - self.seconds
+        while self.samples and self.samples[0][0] < start:
+            self.sum -= self.samples.popleft()[1]
+        while self.min_queue and self.min_queue[0][0] < start:
+            self.min_queue.popleft()
+        while self.max_queue and self.max_queue[0][0] < start:
+            self.max_queue.popleft()
+
+    def get_avg(self):
+        return self.sum / len(self.samples) if self.samples else None
+
+    def get_min(self):
+        return self.min_queue[0][1] if self.min_queue else None
+
+    def get_max(self):
+        return self.max_queue[0][1] if self.max_queue else None
+
+    def get_rate(self):
+        # change by second between the first and the last samples of the window
+        if len(self.samples) < 2:
+            return None
+        (first_time, first), (last_time, last) = self.samples[0], self.samples[-1]
+        if last_time <= first_time:
+            return None
+        return (last - first) / (last_time - first_time)
+
+    def get(self, function, now):
+        if now != self.evicted_at:
+            self.evict(now)     # the series may not have been measured since the last push
+            self.evicted_at = now
+        return Window.FUNCTIONS[function](self)
+
+    FUNCTIONS = {'avg': get_avg, 'min': get_min, 'max': get_max, 'rate': get_rate}
+
+
+class RuleGroup:
+    # series of the rules with the same function, pattern and window: their values are computed and sorted once by
+    # tick, whatever the number of rules
+    def __init__(self, function, pattern, seconds):
+        self.function = function
+        self.pattern = pattern
+        self.seconds = seconds
+        self.series = []            # (series name, window)
+        self.evaluated_at = None
+        self.values = []            # (value, series name), sorted
+        self.keys = []              # the values only, for bisect
+
+    def evaluate(self, now):
+        if now != self.evaluated_at:
+            self.evaluated_at = now
+            values = [(window.get(self.function, now), series) for series, window in self.series]
+            self.values = sorted(value for value in values if value[0] is not None)
+            self.keys = [value for value, _ in self.values]
+        return self.values
+
+
+class Rule:
+    # function(series pattern, window) operator threshold, ex. 'avg(cpu.total, 5m) > 90',
+    # 'max(temp.*, 30s) >= critical' or 'rate(battery, 10m) < -2%/min'
+    EXPRESSION = re.compile(r'^\s*(avg|min|max|rate)\(\s*([^,\s]+)\s*,\s*([0-9.]+[smhdw]?)\s*\)\s*'
+                            r'(>=|<=|>|<)\s*(.+?)\s*$')
+    THRESHOLD = re.compile(r'^([-+]?[0-9.]+)\s*%?\s*(/s|/min|/h)?$')
+    RATE_UNITS = {None: 1, '/s': 1, '/min': 60, '/h': 3600}
+    LIMITS = ('high', 'critical')       # limits of each temperature sensor
+    OPERATORS = {'>': operator.gt, '>=': operator.ge, '<': operator.lt, '<=': operator.le}
+    # index in the sorted values of the first value above (> and >=) or after the last value below (< and <=)
+    BISECT = {'>': bisect.bisect_right, '>=': bisect.bisect_left, '<': bisect.bisect_left, '<=': bisect.bisect_right}
+    MESSAGE_SERIES = 5
+
+    def __init__(self, name, expression, config_params, hysteresis=0, title=None):
+        match = Rule.EXPRESSION.match(expression)
+        if match is None:
+            raise ValueError(f'invalid rule {name}: {expression!r}')
+        self.name = name
+        self.expression = expression
+        self.title = title or name
+        self.function, self.pattern, seconds, self.operator, threshold = match.groups()
+        self.seconds = HistoryStore.parse_since(seconds)
+        self.compare = Rule.OPERATORS[self.operator]
+        self.unit = None        # of the rates, ex. '/min'
+        self.threshold, self.limit = self.parse_threshold(threshold, config_params)
+        self.scale = Rule.RATE_UNITS[self.unit]
+        self.hysteresis = hysteresis / self.scale
+        self.group = None       # set by the RuleEngine
+
+    def parse_threshold(self, threshold, config_params):
+        # (value, limit): a number (rates by second), a limit of the sensor or a key of config.txt
+        if threshold in Rule.LIMITS:
+            return None, threshold
+        if threshold in config_params:
+            if not isinstance(config_params[threshold], (int, float)):
+                raise ValueError(f'invalid rule {self.name}: {threshold} is not a number')
+            return config_params[threshold], None
+        match = Rule.THRESHOLD.match(threshold)
+        if match is None:
+            raise ValueError(f'invalid rule {self.name}: threshold {threshold!r}')
+        value, self.unit = match.groups()
+        if self.unit is not None and self.function != 'rate':
+            raise ValueError(f'invalid rule {self.name}: {self.unit} is only for rate()')
+        return float(value) / Rule.RATE_UNITS[self.unit], None
+
+    @staticmethod
+    def compile(name, config_rule, config_params):
+        # a rule of config.txt: the expression, or {"rule": expression, "hysteresis": ..., "title": ...}
+        if isinstance(config_rule, str):
+            return Rule(name, config_rule, config_params)
+        return Rule(name, config_rule['rule'], config_params, config_rule.get('hysteresis', 0),
+                    config_rule.get('title'))
+
+    def is_cleared(self, value, threshold):
+        if self.operator in ('>', '>='):
+            return value < threshold - self.hysteresis
+        return value > threshold + self.hysteresis
+
+    def evaluate(self, now, get_limit):
+        # (b_trigger, b_clear, [(series, value)] of the series reaching the threshold)
+        values = self.group.evaluate(now)
+        if self.limit is not None:
+            return self.evaluate_limits(values, get_limit)
+        if not values:
+            return False, True, []
+        b_above = self.operator in ('>', '>=')
+        # the values reaching the threshold are at one end of the sorted values
+        index = Rule.BISECT[self.operator](self.group.keys, self.threshold)
+        matches = values[index:][::-1] if b_above else values[:index]
+        b_clear = self.is_cleared(values[-1][0] if b_above else values[0][0], self.threshold)
+        return bool(matches), b_clear, [(series, value) for value, series in matches]
+
+    def evaluate_limits(self, values, get_limit):
+        # threshold of each series (ex. critical temperature of each sensor)
+        matches = []
+        b_clear = True
+        for value, series in values:
+            threshold = get_limit(series, self.limit)
+            if threshold is None:
+                continue
+            if self.compare(value, threshold):
+                matches.append((series, value))
+            if not self.is_cleared(value, threshold):
+                b_clear = False
+        return bool(matches), b_clear, matches
+
+    def get_message(self, matches):
+        unit = self.unit or ''
+        values = ', '.join(f'{series}: {value * self.scale:.2f}{unit}'
+                           for series, value in matches[:Rule.MESSAGE_SERIES])
+        more = f' (+{len(matches) - Rule.MESSAGE_SERIES})' if len(matches) > Rule.MESSAGE_SERIES else ''
+        return f'{self.expression} ({values}{more})'
+
+
+class RuleEngine:
+    # RULES of config.txt, compiled once (again only when config.txt is reloaded), all evaluated in one pass by tick
+    PRUNE_PERIOD = 60           # seconds between the removals of the series no longer measured
+
+    def __init__(self, config_params=None):
+        self.rules = []
+        self.config_params = None
+        self.groups = {}            # (function, pattern, seconds) -> RuleGroup
+        self.windows = {}           # (series, seconds) -> Window, shared by the groups with the same series and window
+        self.series_windows = {}    # series -> windows to update, matched once for each new series
+        self.pruned_at = None
+        self.set_parameters(config_params or {})
+
+    def set_parameters(self, config_params):
+        # a new dict when config.txt is reloaded (the thresholds may be keys of config.txt)
+        if config_params is self.config_params:
+            return
+        self.config_params = config_params
+        config_rules = config_params.get('RULES', {})
+        try:
+            rules = [Rule.compile(name, config_rule, config_params) for name, config_rule in config_rules.items()]
+        except (ValueError, TypeError, KeyError, AttributeError) as error:
+            print(f'WARNING: RULES not loaded ({error}), keeping the previous rules.', file=sys.stderr)
+            return
+        self.rules = rules
+        self.groups = {}
+        for rule in rules:
+            key = (rule.function, rule.pattern, rule.seconds)
+            if key not in self.groups:
+                self.groups[key] = RuleGroup(*key)
+            rule.group = self.groups[key]
+        # the series already seen are matched with the new rules, keeping the samples of the same windows
+        windows, self.windows = self.windows, {}
+        series, self.series_windows = list(self.series_windows), {}
+        for name in series:
+            self.match(name, windows)
+
+    def match(self, series, previous_windows=None):
+        windows = []
+        for group in self.groups.values():
+            if not fnmatch.fnmatchcase(series, group.pattern):
+                continue
+            key = (series, group.seconds)
+            window = self.windows.get(key)
+            if window is None:
+                window = (previous_windows or {}).get(key) or Window(group.seconds)
+                self.windows[key] = window
+                windows.append(window)
+            group.series.append((series, window))
+        self.series_windows[series] = windows
+        return windows
+
+    def record(self, samples, now=None):
+        if not self.rules:
+            return
+        if now is None:
+            now = time.monotonic()
+        for series, value in samples.items():
+            if value is None:
+                continue
+            windows = self.series_windows.get(series)
+            if windows is None:
+                windows = self.match(series)
+            for window in windows:
+                window.push(now, value)
+
+    def evaluate(self, dispatcher, config_dict, get_limit, now=None):
+        if now is None:
+            now = time.monotonic()
+        for rule in self.rules:
+            b_trigger, b_clear, matches = rule.evaluate(now, get_limit)
+            dispatcher.evaluate(f'rule.{rule.name}', b_trigger, b_clear, rule.title,
+                                lambda rule=rule, matches=matches: rule.get_message(matches), config_dict)
+        self.prune(now)
+
+    def prune(self, now):
+        # the series without samples in their windows (ex. a process that ended) are forgotten, the windows were
+        # evicted by the evaluation of their groups; the series matching no rule are matched again when measured
+        if self.pruned_at is None:
+            self.pruned_at = now
+        if now - self.pruned_at < RuleEngine.PRUNE_PERIOD:
+            return
+        self.pruned_at = now
+        gone = {series for series, windows in self.series_windows.items()
+                if not any(window.samples for window in windows)}
+        if not gone:
+            return
+        for series in gone:
+            for window in self.series_windows.pop(series):
+                del self.windows[(series, window.seconds)]
+        for group in self.groups.values():
+            group.series = [(series, window) for series, window in group.series if series not in gone]
+
+
+if __name__ == '__main__':
+    pass
@@ -4,9 +4,14 @@
 # @author Fernando Mendiburu - <fernando.mendiburu@ee.ufcg.edu.br>
 #
 
+import os
+import sys
+import time
 import argparse
 
 from common import Common
+from profiler import SelfStats
+from history_store import HistoryStore
 
 
 class ReadParametersCMD:
@@ -14,8 +19,9 @@ class ReadParametersCMD:
         self.parser = argparse.ArgumentParser(description='pc_status information')
         self.parser.add_argument('--info', '--i', '-i', dest='info',
                                  type=str, default='status',
-                                 choices=['full', 'status'],
-                                 help='System info.')
+                                 choices=['full', 'status', 'dashboard'],
+                                 help='System info. dashboard: full screen, redrawing only the values that changed '
+                                      '(with --loop y).')
         self.parser.add_argument('--loop', '--l', '-l', dest='loop',
                                  type=str, default='n',
                                  choices=['y', 'n'],
@@ -28,8 +34,44 @@ class ReadParametersCMD:
                                  type=str, default='n',
                                  choices=['y', 'n'],
                                  help='Sound of the notifications.')
+        self.parser.add_argument('--format', '--f', '-f', dest='format',
+                                 type=str, default='text',
+                                 choices=['text', 'jsonl', 'csv'],
+                                 help='Output format: text, or one record of all the values per measure.')
+        self.parser.add_argument('--daemon', dest='daemon', action='store_true',
+                                 help='Run in background sampling the values, serving them to the --info command.')
+        self.parser.add_argument('--serve-metrics', dest='serve_metrics', metavar='HOST:PORT',
+                                 type=ReadParametersCMD.parse_address, default=None,
+                                 help='Run as --daemon, also serving the values in the OpenMetrics format '
+                                      '(Prometheus) on http://HOST:PORT/metrics.')
+        self.parser.add_argument('--push', dest='push', metavar='HOST:PORT',
+                                 type=ReadParametersCMD.parse_address, default=None,
+                                 help='Run as --daemon, also sending the values to a fleet collector.')
+        self.parser.add_argument('--push-protocol', dest='push_protocol',
+                                 type=str, default='udp',
+                                 choices=['udp', 'tcp'],
+                                 help='Protocol of --push.')
+        self.parser.add_argument('--self-stats', dest='self_stats', action='store_true',
+                                 help="Display the time of each update, message, config reload and notification, "
+                                      "and the CPU time and memory of pc_status.")
+        self.parser.add_argument('--profile', dest='profile', metavar='N',
+                                 type=int, default=0,
+                                 help='Profile (cProfile) the first N measures.')
+        self.parser.add_argument('--profile-output', dest='profile_output', metavar='FILE',
+                                 type=str, default='pc_status.prof',
+                                 help='File of --profile (pstats format, default: pc_status.prof).')
+        self.parser.add_argument('--startup-profile', dest='startup_profile', action='store_true',
+                                 help='Display the import and construction time of each module and collector.')
         self.args = self.parser.parse_args()
 
+    @staticmethod
+    def parse_address(address):
+        # 'HOST:PORT', '[IPv6]:PORT' or ':PORT' (all the interfaces)
+        host, separator, port = address.rpartition(':')
+        if not separator or not port.isdigit() or not 0 < int(port) < 65536:
+            raise argparse.ArgumentTypeError(f'invalid address {address!r}, expected HOST:PORT')
+        return host.strip('[]') or '0.0.0.0', int(port)
+
     def get_params(self):
         return self.args
 
@@ -39,6 +81,15 @@ class ReadParametersCMD:
     def is_status(self):
         return self.args.info == 'status'
 
+    def is_dashboard(self):
+        return self.args.info == 'dashboard' and self.is_loop() and self.is_text()
+
+    def get_format(self):
+        return self.args.format
+
+    def is_text(self):
+        return self.args.format == 'text'
+
     def is_loop(self):
         return self.args.loop == 'y'
 
@@ -48,20 +99,248 @@ class ReadParametersCMD:
     def is_notification(self):
         return self.args.notifications == 'y'
 
+    def is_daemon(self):
+        return self.args.daemon or self.args.serve_metrics is not None or self.args.push is not None
+
+    def get_metrics_address(self):
+        return self.args.serve_metrics
+
+    def get_push_address(self):
+        return self.args.push
+
+    def get_push_protocol(self):
+        return self.args.push_protocol
+
+    def is_startup_profile(self):
+        return self.args.startup_profile
+
+    def is_self_stats(self):
+        return self.args.self_stats
+
+    def get_profile_iterations(self):
+        return self.args.profile
+
+
+class CachedParametersFile:
+    def __init__(self, file, required_keys=None, optional_keys=None):
+        self.file = file
+        self.required_keys = required_keys or {}
+        self.optional_keys = optional_keys or {}
+        self.params = None
+        self.file_key = None
+        self.reload_count = 0
+        self.error_count = 0
+        self.parse_time = 0.0
+
+    def get_file_key(self):
+        stat = os.stat(self.file)
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    def validate(self, params):
+        for key, types in self.required_keys.items():
+            if key not in params:
+                raise ValueError(f'missing key {key}')
+            if not isinstance(params[key], types):
+                raise ValueError(f'invalid value for key {key}: {params[key]}')
+        for key, types in self.optional_keys.items():
+            if key in params and not isinstance(params[key], types):
+                raise ValueError(f'invalid value for key {key}: {params[key]}')
+
+    def load(self):
+        try:
+            file_key = self.get_file_key()
+        except FileNotFoundError:
+            if self.params is None:
+                print(f'ERROR: File {self.file} not found!\nExit program!')
+                sys.exit()
+            return False
+
+        if file_key == self.file_key:
+            return False
+        self.file_key = file_key
+
+        start = time.perf_counter()
+        try:
+            params = Common.parse_params(self.file)
+            self.validate(params)
+        except (OSError, ValueError) as error:
+            self.error_count += 1
+            if self.params is None:
+                print(f'ERROR: Probably a problem in the data format of file {self.file} ({error})!\nExit program!')
+                sys.exit()
+            print(f'WARNING: {self.file} not reloaded ({error}), keeping the previous parameters.', file=sys.stderr)
+            return False
+        finally:
+            self.parse_time += time.perf_counter() - start
+
+        self.params = params
+        self.reload_count += 1
+        return True
+
 
 class ReadParametersFiles:
+    CONFIG_REQUIRED_KEYS = {'PATH_NOTIF_ICON': str,
+                            'PATH_NOTIF_SOUND': str,
+                            'HIGH_USAGE_CPU': (int, float),
+                            'HIGH_USAGE_MEM': (int, float),
+                            'HIGH_LOAD_GPU': (int, float),
+                            'DISCHARGING_BATTERY': (int, float),
+                            'DELTA_BATTERY': (int, float),
+                            'NOTIFICATION_BATTERY': str,
+                            'NOTIFICATION_MEMORY': str,
+                            'NOTIFICATION_CPU': str,
+                            'NOTIFICATION_TEMPERATURE': str,
+                            'NOTIFICATION_GPU': str
+                            }
+    # the newer keys, with a default value when they are not in config.txt
+    CONFIG_OPTIONAL_KEYS = {'DELTA_BATTERY_WINDOW': (int, float),
+                            'CPU_MIN_WINDOW': (int, float),
+                            'LOOP_INTERVAL': (int, float),
+                            'OUTPUT_FLUSH': str,
+                            'OUTPUT_FLUSH_INTERVAL': (int, float),
+                            'OUTPUT_BUFFER_SIZE': int,
+                            'SNAPSHOT_PUBLISH': str,
+                            'DASHBOARD_FPS': (int, float),
+                            'SAMPLE_PERIODS': dict,
+                            'ADAPTIVE_SAMPLING': str,
+                            'ADAPTIVE_PERIODS': dict,
+                            'ADAPTIVE_MARGIN': (int, float),
+                            'COLLECTOR_TIMEOUT': (int, float),
+                            'COLLECTOR_TIMEOUTS': dict,
+                            'PROCESSES_TOP_N': int,
+                            'CGROUPS_TOP_N': int,
+                            'CGROUPS_MAX_DEPTH': int,
+                            'CGROUPS_MAX_OPEN_FILES': int,
+                            'DISK_EXCLUDE_FSTYPES': list,
+                            'DISK_EXCLUDE_DEVICES': list,
+                            'DISK_EXCLUDE_MOUNTPOINTS': list,
+                            'DISK_DEDUP_DEVICES': str,
+                            'DISK_STAT_TIMEOUT': (int, float),
+                            'GPU_BACKEND': str,
+                            'BACKEND': str,
+                            'PROCFS_ROOT': str,
+                            'TEMPERATURE_BACKEND': str,
+                            'GPU_STREAM_INTERVAL_MS': (int, float),
+                            'GPU_STREAM_TIMEOUT': (int, float),
+                            'HISTORY_CAPACITY': int,
+                            'HISTORY_WINDOW': (int, float),
+                            'HISTORY_PERCENTILE': (int, float),
+                            'ALARM_WINDOW': (int, float),
+                            'ALARM_PERCENTILE': (int, float),
+                            'HISTORY_RETENTION': dict,
+                            'NOTIFICATION_SINK': str,
+                            'NOTIFICATION_QUEUE_SIZE': int,
+                            'ALARM_HYSTERESIS': (int, float),
+                            'RULES': dict,
+                            'ALARM_MIN_DURATION': (int, float),
+                            'ALARM_COOLDOWN': (int, float),
+                            'FLEET_HISTORY_CAPACITY': int,
+                            'FLEET_HOST_TIMEOUT': (int, float)
+                            }
+
     def __init__(self):
+        self.config_file = CachedParametersFile(Common.CONFIG_FILE, ReadParametersFiles.CONFIG_REQUIRED_KEYS,
+                                                ReadParametersFiles.CONFIG_OPTIONAL_KEYS)
+        self.history_store = HistoryStore(Common.HISTORY_DIR)
         self.update_parameters()
 
     def update_parameters(self):
-        self.config_params = Common.read_params(Common.CONFIG_FILE)
-        self.stats_params = Common.read_params(Common.STATS_FILE)
+        start = time.monotonic()
+        b_reloaded = self.config_file.load()
+        SelfStats.record('config', 'reload' if b_reloaded else 'check', time.monotonic() - start)
+        # the dictionary is swapped as a whole, never modified in place
+        self.config_params = self.config_file.params
+        if b_reloaded:
+            self.history_store.set_retention(self.config_params.get('HISTORY_RETENTION'))
+        return b_reloaded
+
+    def get_previous_stat(self, metric, seconds):
+        # last value stored at least 'seconds' ago
+        return self.history_store.get_value_before(metric, time.time() - seconds)
+
+    def get_reload_count(self):
+        return self.config_file.reload_count
+
+    def get_parse_time(self):
+        return self.config_file.parse_time
+
+    def get_reload_msg(self):
+        return f'Parameter files reloaded: {self.get_reload_count()} times ' \
+               f'(parse time: {self.get_parse_time() * 1000:.2f}ms, ' \
+               f'errors: {self.config_file.error_count})'
 
 
 class WriteParametersStatFile:
-    @staticmethod
-    def write_parameters(dict_stat):
-        Common.write_dict_file(Common.STATS_FILE, dict_stat)
+    def __init__(self, params_obj):
+        self.history_store = params_obj.history_store
+
+    def write_parameters(self, dict_stat):
+        now = time.time()
+        for metric, value in dict_stat.items():
+            self.history_store.append(metric, value, now)
+
+    def close(self):
+        self.history_store.close()
+
+
+class ReadHistoryCMD:
+    def __init__(self, args):
+        self.parser = argparse.ArgumentParser(prog='pc_status history', description='pc_status history of the values')
+        self.parser.add_argument('--metric', '--m', '-m', dest='metric',
+                                 type=str, default='CPU_STATUS',
+                                 help='BATTERY_STATUS, CPU_STATUS, MEMORY_STATUS or GPU_STATUS.')
+        self.parser.add_argument('--since', dest='since',
+                                 type=str, default='1h',
+                                 help='Time window, ex. 90s, 30m, 24h, 7d.')
+        self.parser.add_argument('--level', dest='level',
+                                 type=str, default=None,
+                                 choices=[level.name for level in HistoryStore.LEVELS],
+                                 help='Resolution (default: chosen from the time window).')
+        self.args = self.parser.parse_args(args)
+
+    def get_params(self):
+        return self.args
+
+    def get_seconds(self):
+        try:
+            return HistoryStore.parse_since(self.args.since)
+        except ValueError:
+            self.parser.error(f'invalid time window: {self.args.since}')
+
+    def get_level(self):
+        for level in HistoryStore.LEVELS:
+            if level.name == self.args.level:
+                return level
+        return None
+
+
+class ReadFleetCMD:
+    def __init__(self, args):
+        self.parser = argparse.ArgumentParser(prog='pc_status fleet', description='pc_status of several computers')
+        subparsers = self.parser.add_subparsers(dest='command', required=True)
+        collector = subparsers.add_parser('collector', help='Receive the values sent by the agents (--push).')
+        collector.add_argument('--listen', dest='listen', metavar='HOST:PORT',
+                               type=ReadParametersCMD.parse_address, default=('0.0.0.0', 9200),
+                               help='UDP and TCP address (default: 0.0.0.0:9200).')
+        query = subparsers.add_parser('query', help='Ask the running collector.')
+        query.add_argument('query', nargs='+',
+                           help="'status NAME!=STATUS', 'status NAME=STATUS', 'top FIELD [N]', 'host NAME' or 'stats'.")
+        simulate = subparsers.add_parser('simulate', help='Send the values of simulated agents.')
+        simulate.add_argument('--to', dest='to', metavar='HOST:PORT',
+                              type=ReadParametersCMD.parse_address, default=('127.0.0.1', 9200),
+                              help='Collector address (default: 127.0.0.1:9200).')
+        simulate.add_argument('--hosts', dest='hosts', type=int, default=1000,
+                              help='Number of simulated agents.')
+        simulate.add_argument('--protocol', dest='protocol', type=str, default='udp', choices=['udp', 'tcp'])
+        simulate.add_argument('--rounds', dest='rounds', type=int, default=None,
+                              help='Number of snapshots sent by each agent (default: until interrupted).')
+        self.args = self.parser.parse_args(args)
+
+    def get_params(self):
+        return self.args
+
+    def get_query(self):
+        return ' '.join(self.args.query)
 
 
 if __name__ == '__main__':
@@ -1,51 +1,537 @@
 #
-# @file <system_all.py>
+# @file <sensor.py>
 #
 # @author Fernando Mendiburu - <fernando.mendiburu@ee.ufcg.edu.br>
 #
 
+import io
+import sys
+import time
+import queue
+import threading
+import contextlib
+
+from common import Common
+from profiler import StartupProfile, SelfStats, IterationProfile
+from ring_buffer import MetricHistory
+from metrics import MetricFamily
+from notifier import NotificationDispatcher, NotifySink, NullSink
 from system import System, CPU, Memory, Disk, Network, Battery, Temperature, GPU
+from processes import Processes
+from cgroups import Cgroups
+from rules import RuleEngine
+
+
+class AdaptivePeriods:
+    # ADAPTIVE_SAMPLING: period of the collectors with a threshold between a minimum and a maximum, longer while the
+    # value is far from its threshold and stable, shorter when it approaches the threshold or changes quickly
+    DEFAULT_LIMITS = {'cpu': [0.5, 10],
+                      'memory': [1, 10],
+                      'temperature': [1, 20],
+                      'gpu': [1, 30],
+                      'battery': [10, 120]
+                      }
+    GROWTH = 1.5        # maximum growth of the period after each measure (the shrink is immediate)
+
+    def __init__(self, config_params=None):
+        self.last = {}          # name -> (time, distance to the threshold) of the last measure
+        self.set_parameters(config_params or {})
+
+    def set_parameters(self, config_params):
+        self.b_enabled = config_params.get('ADAPTIVE_SAMPLING', 'no') == 'yes'
+        self.limits = dict(AdaptivePeriods.DEFAULT_LIMITS, **config_params.get('ADAPTIVE_PERIODS', {}))
+        self.margin = config_params.get('ADAPTIVE_MARGIN', 20)
+
+    def get_period(self, name, period, distance, now):
+        # period after a measure at the distance of the threshold (percentage points or degrees, negative above it),
+        # None if it is not adaptive (not enabled, no threshold, or value not available)
+        if not self.b_enabled or name not in self.limits or distance is None:
+            self.last.pop(name, None)
+            return None
+        minimum, maximum = self.limits[name]
+        # proportional to the distance inside the margin, the maximum beyond it
+        target = maximum * min(max(distance / self.margin, 0), 1)
+        previous = self.last.get(name)
+        self.last[name] = (now, distance)
+        if previous is not None and now > previous[0]:
+            speed = abs(distance - previous[1]) / (now - previous[0])
+            if speed > 0:
+                # at least two measures before reaching the threshold at this speed
+                target = min(target, max(distance, 0) / speed / 2)
+        target = min(max(target, minimum), maximum)
+        return target if target <= period else min(target, period * AdaptivePeriods.GROWTH)
+
+
+class Scheduler:
+    # seconds, used when the period of a collector is not in SAMPLE_PERIODS
+    DEFAULT_PERIODS = {'cpu': 1,
+                       'memory': 1,
+                       'temperature': 2,
+                       'gpu': 5,
+                       'battery': 30,
+                       'disk': 5,
+                       'network': 5,
+                       'processes': 5,
+                       'cgroups': 5,
+                       'system': 3600
+                       }
+
+    def __init__(self, names, periods=None, config_params=None):
+        self.names = list(names)
+        self.deadlines = {name: 0.0 for name in self.names}    # all due at the start
+        self.last_refresh = {}
+        self.adaptive = AdaptivePeriods(config_params)
+        self.adaptive_periods = {}      # name -> current period, when it is adaptive
+        self.set_periods(periods)
+
+    def set_periods(self, periods):
+        self.periods = dict(Scheduler.DEFAULT_PERIODS)
+        if periods:
+            self.periods.update(periods)
+
+    def get_period(self, name):
+        return self.adaptive_periods.get(name, self.periods[name])
+
+    def get_due(self, now):
+        return [name for name in self.names if self.deadlines[name] <= now]
+
+    def set_refreshed(self, name, now, distance=None):
+        self.last_refresh[name] = now
+        period = self.adaptive.get_period(name, self.get_period(name), distance, now)
+        if period is None:
+            self.adaptive_periods.pop(name, None)
+        else:
+            self.adaptive_periods[name] = period
+        self.set_scheduled(name, now)
+
+    def set_scheduled(self, name, now):
+        # keeps the phase of the collector, unless it is late more than one period
+        period = self.get_period(name)
+        deadline = self.deadlines[name] + period
+        if deadline <= now or name in self.adaptive_periods:     # an adaptive period starts at the last measure
+            deadline = now + period
+        self.deadlines[name] = deadline
+
+    def get_next_deadline(self):
+        return min(self.deadlines.values())
+
+    def wait(self):
+        delay = self.get_next_deadline() - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def get_age(self, name, now=None):
+        if name not in self.last_refresh:
+            return None
+        if now is None:
+            now = time.monotonic()
+        return now - self.last_refresh[name]
+
+    def get_ages_msg(self):
+        now = time.monotonic()
+        ages = []
+        for name in self.names:
+            age = self.get_age(name, now)
+            if age is not None:
+                ages.append(f'{name}: {age:.1f}s')
+        return 'Age of the values: ' + ', '.join(ages)
+
+    def get_periods_msg(self):
+        periods = []
+        for name in self.names:
+            adaptive = ' (adaptive)' if name in self.adaptive_periods else ''
+            periods.append(f'{name}: {self.get_period(name):.1f}s{adaptive}')
+        return 'Sampling periods: ' + ', '.join(periods)
+
+
+class CollectorWorker:
+    # a thread per collector: a blocked collector does not block the others,
+    # and it is never updated twice at the same time
+    def __init__(self, name, collector):
+        self.name = name
+        self.collector = collector
+        self.requests = queue.Queue()
+        self.done = threading.Event()
+        self.done.set()
+        self.error = None
+        self.latency = None
+        self.cpu_time = None
+        self.finished_at = None
+        self.thread = threading.Thread(target=self.loop, name=f'pc_status-{name}', daemon=True)
+        self.thread.start()
+
+    def loop(self):
+        while True:
+            self.requests.get()
+            start = time.monotonic()
+            start_cpu = time.thread_time()
+            try:
+                profile = IterationProfile.ACTIVE
+                if profile is not None:
+                    profile.run(self.collector.update)
+                else:
+                    self.collector.update()
+                self.error = None
+            except Exception as error:
+                self.error = error
+            self.finished_at = time.monotonic()
+            self.latency = self.finished_at - start
+            self.cpu_time = time.thread_time() - start_cpu
+            self.done.set()
+
+    def submit(self):
+        self.done.clear()
+        self.requests.put(True)
+
+    def is_busy(self):
+        return not self.done.is_set()
+
+    def wait(self, timeout):
+        return self.done.wait(timeout)
 
 
 class Sensor:
-    def __init__(self, params_obj):
-        self.battery = Battery(params_obj)
-        self.memory = Memory(params_obj)
-        self.temperature = Temperature(params_obj)
-        self.cpu = CPU(params_obj)
-        self.system = System(params_obj)
-        self.disk = Disk(params_obj)
-        self.network = Network(params_obj)
-        self.gpu = GPU(params_obj)
+    # construction / update order
+    COLLECTORS = {'battery': Battery,
+                  'memory': Memory,
+                  'temperature': Temperature,
+                  'cpu': CPU,
+                  'system': System,
+                  'disk': Disk,
+                  'network': Network,
+                  'gpu': GPU,
+                  'processes': Processes,
+                  'cgroups': Cgroups
+                  }
+    RUN_ORDER = ['system', 'cpu', 'memory', 'processes', 'cgroups', 'disk', 'network', 'battery', 'temperature',
+                 'gpu']
+    STATUS_COLLECTORS = ['battery', 'memory', 'temperature', 'cpu', 'gpu']
+    # the top processes and cgroups are attached to the CPU and memory notifications
+    NOTIFICATION_COLLECTORS = STATUS_COLLECTORS + ['processes', 'cgroups']
+    # collectors with values kept in the history
+    SAMPLE_COLLECTORS = ['cpu', 'memory', 'temperature', 'gpu', 'battery']
+
+    def __init__(self, params_obj, names=None, b_rules=True):
+        # b_rules: the windows of the RULES are filled by the measures of this process, one measure by execution
+        # (Cron) does not fill them
+        if names is None:
+            names = list(Sensor.COLLECTORS)
+        self.collectors = {}
+        self.b_first_update = True
+        self.b_rules = b_rules
+        self.params_obj = params_obj
+        self.dispatcher = None
+        self.history = MetricHistory(params_obj.config_params.get('HISTORY_CAPACITY', 3600))
+        self.rules = RuleEngine(params_obj.config_params)
+        for name, collector_class in Sensor.COLLECTORS.items():
+            collector = None
+            if name in names:
+                with StartupProfile.timer('construction', name):
+                    collector = collector_class(params_obj)
+                self.collectors[name] = collector
+            setattr(self, name, collector)
+        self.scheduler = Scheduler(self.collectors, params_obj.config_params.get('SAMPLE_PERIODS'),
+                                   params_obj.config_params)
+        self.workers = {name: CollectorWorker(name, collector) for name, collector in self.collectors.items()}
+        self.stale = set()
+        self.timeouts = {name: 0 for name in self.collectors}
+        self.failed = set()         # last update failed
+        self.errors = {name: 0 for name in self.collectors}
+
+    @staticmethod
+    def get_collector_names(is_full, is_notification=False):
+        # system, disk and network are displayed only in full mode and have no notifications
+        if is_full:
+            return list(Sensor.COLLECTORS)
+        if is_notification:
+            return list(Sensor.NOTIFICATION_COLLECTORS)
+        return list(Sensor.STATUS_COLLECTORS)
+
+    def get_alarm_msg_function(self, get_alarm_msg, get_top_msg):
+        if self.processes is None and self.cgroups is None:
+            return get_alarm_msg
+        return lambda: f'{get_alarm_msg()}\n{get_top_msg()}'
+
+    def get_timeout(self, name):
+        timeouts = self.params_obj.config_params.get('COLLECTOR_TIMEOUTS', {})
+        return timeouts.get(name, self.params_obj.config_params.get('COLLECTOR_TIMEOUT', 2))
+
+    def set_finished(self, worker, now):
+        # False if the update failed: the collector keeps its previous values, marked as stale until an update succeeds
+        if worker.error is not None:
+            self.errors[worker.name] += 1
+            if worker.name not in self.failed:
+                print(f'WARNING: {worker.name} update failed ({worker.error!r}), keeping the previous values.',
+                      file=sys.stderr)
+            self.failed.add(worker.name)
+            self.scheduler.set_scheduled(worker.name, now)
+            return False
+        self.failed.discard(worker.name)
+        if self.b_first_update:
+            StartupProfile.record('first update', worker.name, worker.latency)
+        SelfStats.record('update', worker.name, worker.latency)
+        SelfStats.record('cpu time', worker.name, worker.cpu_time)
+        self.scheduler.set_refreshed(worker.name, now, self.get_threshold_distance(worker.name))
+        return True
+
+    def get_threshold_distance(self, name):
+        # distance of the value to its notification threshold, for the adaptive periods
+        get_distance = getattr(self.collectors[name], 'get_threshold_distance', None)
+        return None if get_distance is None else get_distance()
 
     def update(self):
-        self.battery.update()
-        self.memory.update()
-        self.temperature.update()
-        self.cpu.update()
-        self.disk.update()
-        self.network.update()
-        self.gpu.update()
+        with SelfStats.timer('update', 'sensor'):
+            return self.update_collectors()
+
+    def update_collectors(self):
+        # updates in parallel only the collectors whose period has elapsed, the others keep their last values
+        now = time.monotonic()
+        updated = []
+        # collectors that missed their deadline in a previous update and finished since then
+        for name in list(self.stale):
+            if not self.workers[name].is_busy():
+                self.stale.discard(name)
+                if self.set_finished(self.workers[name], self.workers[name].finished_at):
+                    updated.append(name)
+
+        started = []
+        for name in self.scheduler.get_due(now):
+            if self.workers[name].is_busy():
+                continue
+            self.workers[name].submit()
+            started.append(name)
+
+        for name in started:
+            worker = self.workers[name]
+            if worker.wait(max(now + self.get_timeout(name) - time.monotonic(), 0)):
+                if self.set_finished(worker, now):
+                    updated.append(name)
+            else:
+                # keeps the previous values, marked as stale until the collector finishes
+                self.stale.add(name)
+                self.timeouts[name] += 1
+                self.scheduler.set_scheduled(name, now)
+
+        self.b_first_update = False
+        if updated:
+            # only the new values: the ones of the collectors not measured would be repeated
+            samples = self.get_samples(updated)
+            self.history.record(samples)
+            if self.b_rules and self.rules.rules:
+                self.rules.record(samples, now)
+        return updated
+
+    def get_collector_metrics(self):
+        metrics = {}
+        for name, worker in self.workers.items():
+            metrics[name] = {'latency': worker.latency,
+                             'timeouts': self.timeouts[name],
+                             'errors': self.errors[name],
+                             'stale': name in self.stale or name in self.failed
+                             }
+        return metrics
+
+    def get_collectors_msg(self):
+        collectors = []
+        for name, metrics in self.get_collector_metrics().items():
+            latency = 'n/a' if metrics['latency'] is None else f'{metrics["latency"] * 1000:.1f}ms'
+            stale = ', stale' if metrics['stale'] else ''
+            collectors.append(f'{name}: {latency} ({metrics["timeouts"]} timeouts, {metrics["errors"]} errors{stale})')
+        return 'Collectors latency: ' + ', '.join(collectors)
+
+    def get_metrics(self):
+        # OpenMetrics families of the last measures, nothing is measured here
+        families = []
+        for name in Sensor.RUN_ORDER:
+            collector = self.collectors.get(name)
+            if collector is not None and hasattr(collector, 'get_metrics'):
+                families.extend(collector.get_metrics())
+
+        latency = MetricFamily('collector_latency_seconds', 'gauge', 'Duration of the last update of the collector.')
+        stale = MetricFamily('collector_stale', 'gauge',
+                             '1 if the collector missed its deadline and is still running, or its last update failed.')
+        errors = MetricFamily('collector_errors', 'counter', 'Updates of the collector that failed.')
+        timeouts = MetricFamily('collector_timeouts', 'counter', 'Updates of the collector that missed the deadline.')
+        period = MetricFamily('collector_period_seconds', 'gauge', 'Current sampling period of the collector.')
+        for name, metrics in self.get_collector_metrics().items():
+            latency.add(metrics['latency'], ('collector', name))
+            stale.add(metrics['stale'], ('collector', name))
+            timeouts.add(metrics['timeouts'], ('collector', name))
+            errors.add(metrics['errors'], ('collector', name))
+            period.add(self.scheduler.get_period(name), ('collector', name))
+        return families + [latency, stale, timeouts, errors, period] + Sensor.get_self_metrics()
+
+    @staticmethod
+    def get_self_metrics():
+        # a gauge by statistic of the last durations (not a summary: no sum of all the durations)
+        duration = MetricFamily('self_duration_seconds', 'gauge', 'Duration (p50, p99 and maximum of the last ones) '
+                                'of the updates, messages, config reloads and notifications of pc_status.')
+        calls = MetricFamily('self_calls', 'counter', 'Updates, messages, config reloads and notifications measured.')
+        for (category, name), (count, p50, p99, maximum) in SelfStats.get_durations().items():
+            labels = (('category', category), ('name', name))
+            duration.add(p50, *labels, ('stat', 'p50'))
+            duration.add(p99, *labels, ('stat', 'p99'))
+            duration.add(maximum, *labels, ('stat', 'max'))
+            calls.add(count, *labels)
+        cpu = MetricFamily('self_cpu_seconds', 'counter', 'CPU time used by pc_status.')
+        memory = MetricFamily('self_resident_memory_bytes', 'gauge', 'Memory used by pc_status.')
+        return [cpu.add(SelfStats.get_cpu_time()), memory.add(SelfStats.get_rss()), duration, calls]
+
+    def get_record(self):
+        # all the values of the last measures, one key per metric and labels (ex. 'disk_read_bytes.sda'), None for the
+        # values not available yet (ex. the rates in the first measure): the fields are known from the first record
+        record = {}
+        with SelfStats.timer('render', 'record'):
+            for family in self.get_metrics():
+                name = family.name[len(MetricFamily.PREFIX):]
+                for labels, value in family.samples:
+                    record['.'.join([name] + [str(label) for _, label in labels])] = value
+                for labels in family.missing:
+                    record['.'.join([name] + [str(label) for _, label in labels])] = None
+        return record
+
+    def wait(self):
+        self.scheduler.wait()
+
+    def get_last_refresh(self):
+        return dict(self.scheduler.last_refresh)
+
+    def get_samples(self, names=None):
+        samples = {}
+        for name in Sensor.SAMPLE_COLLECTORS:
+            if name in self.collectors and (names is None or name in names):
+                samples.update(self.collectors[name].get_samples())
+        return samples
+
+    def get_limit(self, sample, limit):
+        if self.temperature is None:
+            return None
+        return self.temperature.get_limit(sample, limit)
 
     def set_parameters(self, params_obj):
-        self.battery.set_parameters(params_obj)
-        self.memory.set_parameters(params_obj)
-        self.temperature.set_parameters(params_obj)
-        self.cpu.set_parameters(params_obj)
-        self.system.set_parameters(params_obj)
-        self.disk.set_parameters(params_obj)
-        self.network.set_parameters(params_obj)
-        self.gpu.set_parameters(params_obj)
+        self.params_obj = params_obj
+        self.scheduler.set_periods(params_obj.config_params.get('SAMPLE_PERIODS'))
+        self.scheduler.adaptive.set_parameters(params_obj.config_params)
+        self.rules.set_parameters(params_obj.config_params)
+        for collector in self.collectors.values():
+            collector.set_parameters(params_obj)
+
+    def get_top_cpu_msg(self):
+        messages = [self.processes.get_top_cpu_msg()] if self.processes is not None else []
+        if self.cgroups is not None and self.cgroups.is_available():
+            messages.append(self.cgroups.get_top_cpu_msg())
+        return '\n'.join(messages)
+
+    def get_top_memory_msg(self):
+        messages = [self.processes.get_top_memory_msg()] if self.processes is not None else []
+        if self.cgroups is not None and self.cgroups.is_available():
+            messages.append(self.cgroups.get_top_memory_msg())
+        return '\n'.join(messages)
+
+    def get_dispatcher(self):
+        if self.dispatcher is None:
+            if self.params_obj.config_params.get('NOTIFICATION_SINK', 'notify') == 'null':
+                sink = NullSink()
+            else:
+                sink = NotifySink()
+            self.dispatcher = NotificationDispatcher(sink, Common.ALARM_STATE_FILE,
+                                                     self.params_obj.config_params.get('NOTIFICATION_QUEUE_SIZE', 16))
+        return self.dispatcher
+
+    def notify(self, is_sound):
+        # the notifications are sent in background, with hysteresis:
+        # an alarm is triggered above the threshold, and cleared below threshold - ALARM_HYSTERESIS
+        with SelfStats.timer('alarm', 'notify'):
+            config = self.params_obj.config_params
+            hysteresis = config.get('ALARM_HYSTERESIS', 5)
+            dispatcher = self.get_dispatcher()
+
+            if self.battery.is_available() and self.battery.is_notification_battery():
+                dispatcher.evaluate('battery', self.battery.is_discharging_below_threshold(),
+                                    self.battery.get_percentage() > config['DISCHARGING_BATTERY'] + hysteresis,
+                                    'Battery', self.battery.get_discharging_msg, config)
+            usage = self.memory.get_alarm_value(self.history)
+            if usage is not None and self.memory.is_notification_memory():
+                dispatcher.evaluate('memory', usage >= config['HIGH_USAGE_MEM'],
+                                    usage < config['HIGH_USAGE_MEM'] - hysteresis,
+                                    'Memory', self.get_alarm_msg_function(self.memory.get_alarm_msg,
+                                                                          self.get_top_memory_msg), config)
+            usage = self.cpu.get_alarm_value(self.history)
+            if usage is not None and self.cpu.is_notification_cpu():
+                dispatcher.evaluate('cpu', usage >= config['HIGH_USAGE_CPU'],
+                                    usage < config['HIGH_USAGE_CPU'] - hysteresis,
+                                    'CPU', self.get_alarm_msg_function(self.cpu.get_alarm_msg,
+                                                                       self.get_top_cpu_msg), config)
+            margin = self.temperature.get_alarm_margin()
+            if margin is not None and self.temperature.is_notification_temperature():
+                dispatcher.evaluate('temperature', margin >= 0, margin < -hysteresis,
+                                    'Temperature', self.temperature.get_alarm_msg, config)
+            load = self.gpu.get_max_load()
+            if load is not None and self.gpu.is_notification_gpu():
+                dispatcher.evaluate('gpu', load >= config['HIGH_LOAD_GPU'],
+                                    load < config['HIGH_LOAD_GPU'] - hysteresis, 'GPU', self.gpu.get_alarm_msg, config)
+            if self.b_rules:
+                self.rules.evaluate(dispatcher, config, self.get_limit)
+
+            dispatcher.flush(config, is_sound)
+
+    def get_status_msg(self):
+        with SelfStats.timer('render', 'status'):
+            return '\n'.join([Common.SEPARATOR,
+                              self.cpu.get_usage_msg(),
+                              Common.SEPARATOR,
+                              self.temperature.get_temperature_string(),
+                              Common.SEPARATOR,
+                              self.memory.get_mem_swap_msg(),
+                              self.battery.get_percentage_msg(),
+                              Common.SEPARATOR,
+                              self.gpu.get_gpu_string(),
+                              Common.SEPARATOR,
+                              self.get_history_msg(),
+                              Common.SEPARATOR])
+
+    def get_history_msg(self):
+        window = self.params_obj.config_params.get('HISTORY_WINDOW', 300)
+        percentile = self.params_obj.config_params.get('HISTORY_PERCENTILE', 95)
+        return '\n'.join([self.history.get_summary_msg('cpu.total', window, percentile, '%'),
+                          self.history.get_summary_msg('memory', window, percentile, '%')])
+
+    def get_full_msg(self):
+        with SelfStats.timer('render', 'full'):
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                print(Common.SEPARATOR)
+                self.run()
+                print(Common.SEPARATOR)
+                print(self.scheduler.get_ages_msg())
+                print(self.scheduler.get_periods_msg())
+                print(self.get_collectors_msg())
+                if self.dispatcher is not None:
+                    print(self.dispatcher.get_stats_msg())
+            return Common.fix_string(output.getvalue())
+
+    def get_stats_params(self):
+        return {"BATTERY_STATUS": self.battery.get_percentage(),
+                "CPU_STATUS": self.cpu.get_cpu_usage(),
+                "MEMORY_STATUS": self.memory.get_memory_usage(),
+                "GPU_STATUS": self.gpu.get_max_load()
+                }
+
+    def save_state(self):
+        self.cpu.save_state()
+
+    def close(self):
+        if self.gpu is not None:
+            self.gpu.close()
+        if self.cgroups is not None:
+            self.cgroups.close()
+        if self.dispatcher is not None:
+            self.dispatcher.close()
 
     def run(self):
-        self.system.run()
-        self.cpu.run()
-        self.memory.run()
-        self.disk.run()
-        self.network.run()
-        self.battery.run()
-        self.temperature.run()
-        self.gpu.run()
+        for name in Sensor.RUN_ORDER:
+            if name in self.collectors:
+                self.collectors[name].run()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,264 @@
+#
+# @file <shared_snapshot.py>
+#
+# @author Fernando Mendiburu - <fernando.mendiburu@ee.ufcg.edu.br>
+#
+
+# Only the standard library: the readers (shell prompt, status bar) do not import psutil nor the rest of pc_status.
+
+import os
+import sys
+import math
+import mmap
+import fcntl
+import time
+import fnmatch
+import argparse
+
+from struct import Struct, error as StructError
+
+
+def get_default_file():
+    # in memory (/dev/shm) if available: the values are not written to the disk
+    name = f'pc_status-{os.getuid()}.snapshot'
+    if os.path.isdir('/dev/shm'):
+        return os.path.join('/dev/shm', name)
+    return os.path.join(os.path.expanduser('~'), 'pc_status', 'config', name)
+
+
+class SnapshotLayout:
+    # header | names ('\n' separated, utf-8) | values (float64, NaN if not available)
+    # The readers find the fields by name: new fields do not break them. VERSION changes only with the header.
+    MAGIC = b'PCST'
+    VERSION = 1
+    # magic, version, flags, sequence, layout generation, time, number of fields, size of the names
+    HEADER = Struct('<4sHHQQdII')
+    HEADER_SIZE = 64
+    SEQUENCE = Struct('<Q')
+    SEQUENCE_OFFSET = 8
+    FLAG_MOVED = 1          # the file was replaced by a larger one: open it again
+    FLAG_STOPPED = 2        # the writer stopped, the values are the last ones
+
+    @staticmethod
+    def get_values_offset(names_size):
+        return SnapshotLayout.HEADER_SIZE + (names_size + 7) // 8 * 8
+
+    @staticmethod
+    def get_size(names_size, count):
+        return SnapshotLayout.get_values_offset(names_size) + 8 * count
+
+
+class SnapshotWriter:
+    # publishes the last record in the file, with a sequence lock: odd while writing, the readers try again if the
+    # sequence is odd or changed during their read
+    def __init__(self, file=None):
+        self.file = file or get_default_file()
+        self.buffer = None
+        self.names = None
+        self.names_size = 0
+        self.values = None      # Struct of the values
+        self.values_offset = 0
+        self.sequence = 0
+        self.generation = 0
+        self.flags = 0
+        self.time = 0.0
+        self.lock_fd = None
+
+    def create(self, size):
+        # a new file replacing the previous one, which is marked as moved for its readers
+        size = (size * 2 + mmap.PAGESIZE - 1) // mmap.PAGESIZE * mmap.PAGESIZE     # room for new fields
+        temp_file = f'{self.file}.{os.getpid()}.tmp'
+        fd = os.open(temp_file, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.ftruncate(fd, size)
+            buffer = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        # being written (odd sequence) until the first values
+        SnapshotLayout.HEADER.pack_into(buffer, 0, SnapshotLayout.MAGIC, SnapshotLayout.VERSION, 0, self.sequence | 1,
+                                        0, 0.0, 0, 0)
+        os.replace(temp_file, self.file)
+        if self.buffer is not None:
+            self.set_flags(SnapshotLayout.FLAG_MOVED)
+            self.buffer.close()
+        self.buffer = buffer
+        self.flags = 0
+
+    @staticmethod
+    def encode_names(names):
+        return '\n'.join(names).encode('utf-8')
+
+    def set_layout(self, names, encoded):
+        # while the sequence is odd: the file is large enough (create() before)
+        self.names = names
+        self.names_size = len(encoded)
+        self.values = Struct(f'<{len(names)}d')
+        self.values_offset = SnapshotLayout.get_values_offset(len(encoded))
+        self.generation += 1
+        self.buffer[SnapshotLayout.HEADER_SIZE:SnapshotLayout.HEADER_SIZE + len(encoded)] = encoded
+
+    def write_header(self):
+        SnapshotLayout.HEADER.pack_into(self.buffer, 0, SnapshotLayout.MAGIC, SnapshotLayout.VERSION, self.flags,
+                                        self.sequence, self.generation, self.time, len(self.names), self.names_size)
+
+    def set_sequence(self):
+        self.sequence += 1
+        SnapshotLayout.SEQUENCE.pack_into(self.buffer, SnapshotLayout.SEQUENCE_OFFSET, self.sequence)
+
+    def set_flags(self, flags):
+        self.set_sequence()
+        self.flags |= flags
+        self.write_header()
+        self.set_sequence()
+
+    @staticmethod
+    def to_float(value):
+        return math.nan if value is None else float(value)
+
+    def publish(self, record, now=None):
+        # False if another process publishes in the file
+        if self.buffer is None and not self.acquire():
+            return False
+        names = list(record)
+        encoded = None
+        if names != self.names:     # ex. a new partition or sensor (the same file if it fits)
+            encoded = SnapshotWriter.encode_names(names)
+            size = SnapshotLayout.get_size(len(encoded), len(names))
+            if self.buffer is None or size > len(self.buffer):
+                # before the odd sequence: the previous file is left with an even sequence and FLAG_MOVED
+                self.create(size)
+        self.time = time.time() if now is None else now
+        self.set_sequence()         # odd: writing
+        if encoded is not None:
+            self.set_layout(names, encoded)
+        self.values.pack_into(self.buffer, self.values_offset, *map(SnapshotWriter.to_float, record.values()))
+        self.write_header()
+        self.set_sequence()         # even: written
+        return True
+
+    def acquire(self):
+        # one publisher by file (ex. the daemon and a local --loop), the lock is kept until close()
+        if self.lock_fd is None:
+            self.lock_fd = os.open(f'{self.file}.lock', os.O_RDWR | os.O_CREAT | os.O_CLOEXEC, 0o644)
+        try:
+            fcntl.flock(self.lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        return True
+
+    def close(self):
+        if self.buffer is not None:
+            self.set_flags(SnapshotLayout.FLAG_STOPPED)
+            self.buffer.close()
+            self.buffer = None
+        if self.lock_fd is not None:
+            os.close(self.lock_fd)
+            self.lock_fd = None
+
+
+class SnapshotReader:
+    # a few microseconds by read, without system call once the file is mapped
+    RETRIES = 1000
+    VALUE = Struct('<d')
+
+    def __init__(self, file=None):
+        self.file = file or get_default_file()
+        self.buffer = None
+        self.generation = None
+        self.fields = {}        # name -> offset of the value
+
+    def open(self):
+        with open(self.file, 'rb') as fp:
+            self.buffer = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        self.generation = None
+
+    def close(self):
+        if self.buffer is not None:
+            self.buffer.close()
+            self.buffer = None
+
+    def set_fields(self, names_size, count):
+        names = self.buffer[SnapshotLayout.HEADER_SIZE:SnapshotLayout.HEADER_SIZE + names_size]
+        offset = SnapshotLayout.get_values_offset(names_size)
+        names = names.decode('utf-8').split('\n') if count else []
+        self.fields = {name: offset + 8 * i for i, name in enumerate(names)}
+
+    def read(self, names=None):
+        # (time, flags, {name: value}) of the last snapshot, all the fields if names is None
+        # (FileNotFoundError if there is no snapshot, KeyError for an unknown field)
+        for _ in range(SnapshotReader.RETRIES):
+            if self.buffer is None:
+                self.open()
+            buffer = self.buffer
+            sequence = SnapshotLayout.SEQUENCE.unpack_from(buffer, SnapshotLayout.SEQUENCE_OFFSET)[0]
+            if sequence % 2:        # being written
+                if SnapshotLayout.HEADER.unpack_from(buffer)[2] & SnapshotLayout.FLAG_MOVED:
+                    self.close()    # only set, never cleared: replaced by a new file
+                else:
+                    time.sleep(0)
+                continue
+            magic, version, flags, _, generation, now, count, names_size = SnapshotLayout.HEADER.unpack_from(buffer)
+            if magic != SnapshotLayout.MAGIC or version != SnapshotLayout.VERSION:
+                raise ValueError(f'{self.file} is not a pc_status snapshot (version {version})')
+            if flags & SnapshotLayout.FLAG_MOVED:
+                self.close()
+                continue
+            values = None
+            try:
+                if generation != self.generation:
+                    self.generation = None
+                    self.set_fields(names_size, count)
+                values = {name: SnapshotReader.VALUE.unpack_from(buffer, self.fields[name])[0]
+                          for name in (self.fields if names is None else names)}
+            except (KeyError, UnicodeDecodeError, StructError) as error:
+                failure = error     # an unknown field, or a layout changed during the read
+            if SnapshotLayout.SEQUENCE.unpack_from(buffer, SnapshotLayout.SEQUENCE_OFFSET)[0] != sequence:
+                self.generation = None
+                continue            # written during the read: torn values
+            if values is None:
+                raise failure
+            self.generation = generation
+            return now, flags, values
+        self.close()        # ex. writer killed while writing: opened again by the next read
+        raise TimeoutError(f'{self.file} is written continuously')
+
+    def get(self, name):
+        return self.read([name])[2][name]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Last values published by pc_status (loop or daemon).')
+    parser.add_argument('fields', nargs='*', help='Fields (ex. cpu_usage_percent.total), with * for several ones. '
+                                                  'All the fields by default.')
+    parser.add_argument('--file', type=str, default=None, help=f'Snapshot file (default {get_default_file()}).')
+    parser.add_argument('--list', action='store_true', help='Only the names of the fields.')
+    parser.add_argument('--max-age', type=float, default=None,
+                        help='Exit code 2 if the values are older (seconds), ex. pc_status not running.')
+    args = parser.parse_args()
+
+    reader = SnapshotReader(args.file)
+    try:
+        now, flags, values = reader.read()
+    except (FileNotFoundError, ValueError) as error:
+        print(f'ERROR: no pc_status snapshot ({error})', file=sys.stderr)
+        sys.exit(1)
+    except TimeoutError as error:
+        print(f'ERROR: snapshot not read ({error})', file=sys.stderr)
+        sys.exit(3)
+    if args.max_age is not None and time.time() - now > args.max_age:
+        print(f'ERROR: values of {time.time() - now:.0f}s ago', file=sys.stderr)
+        sys.exit(2)
+
+    names = list(values)
+    if args.fields:
+        names = [name for pattern in args.fields for name in names if fnmatch.fnmatchcase(name, pattern)]
+    if args.list:
+        print('\n'.join(names))
+    elif len(args.fields) == 1 and len(names) == 1 and '*' not in args.fields[0]:
+        print(f'{values[names[0]]:g}')       # only the value, ex. for a shell prompt
+    else:
+        print('\n'.join(f'{name} {values[name]:g}' for name in names))
+
+
+if __name__ == '__main__':
+    main()
@@ -4,11 +4,18 @@
 # @author Fernando Mendiburu - <fernando.mendiburu@ee.ufcg.edu.br>
 #
 import psutil
-import GPUtil
 import platform
 
 from common import Common
+from profiler import StartupProfile
+from cpu_sampler import CPUSampler
+from gpu_backend import NvidiaSmiStream
+from rates import CounterRates
+from partitions import PartitionIndex, StatPool
+from procfs import get_backend, get_hwmon_index
+from metrics import MetricFamily
 from datetime import datetime
+from collections import Counter
 
 
 class System:
@@ -17,6 +24,10 @@ class System:
         self.bt = datetime.fromtimestamp(psutil.boot_time())
         self.params_obj = params_obj
 
+    def update(self):
+        # uname and boot time do not change
+        pass
+
     def print_info(self):
         print(Common.SEPARATOR)
         print(f'System: {self.uname.system}')
@@ -33,6 +44,9 @@ class System:
               f'{self.bt.hour:02d}:{self.bt.minute:02d}:{self.bt.second:02d}')
         print(Common.SEPARATOR)
 
+    def get_metrics(self):
+        return [MetricFamily('boot_time_seconds', 'gauge', 'Boot time (Unix time).').add(self.bt.timestamp())]
+
     def set_parameters(self, params_obj):
         self.params_obj = params_obj
 
@@ -47,11 +61,15 @@ class CPU:
         self.cpufreq = psutil.cpu_freq()
         self.params_obj = params_obj
         self.device = None
+        self.sampler = CPUSampler(params_obj.config_params.get('CPU_MIN_WINDOW', 0.5), Common.CPU_STATE_FILE,
+                                  get_backend(params_obj.config_params))
         self.update()
 
     def update(self):
-        self.cpu_usage = psutil.cpu_percent()
-        self.cores_usage = psutil.cpu_percent(percpu=True, interval=1)
+        self.cpu_usage, self.cores_usage = self.sampler.sample()
+
+    def save_state(self):
+        self.sampler.save()
 
     def print_info(self):
         print(Common.SEPARATOR)
@@ -76,6 +94,11 @@ class CPU:
     def get_cpu_usage(self):
         return self.cpu_usage
 
+    def get_threshold_distance(self):
+        if self.cpu_usage is None:
+            return None
+        return self.params_obj.config_params['HIGH_USAGE_CPU'] - self.cpu_usage
+
     def get_cores_usage_list(self):
         dev_usage_list = []
         for i, percentage in enumerate(self.cores_usage):
@@ -85,13 +108,55 @@ class CPU:
     def get_total_usage(self):
         return self.get_cpu_usage_list() + self.get_cores_usage_list()
 
+    def get_samples(self):
+        samples = {'cpu.total': self.cpu_usage}
+        for i, percentage in enumerate(self.cores_usage):
+            samples[f'cpu.core{i}'] = percentage
+        return samples
+
+    def get_metrics(self):
+        usage = MetricFamily('cpu_usage_percent', 'gauge', 'CPU usage, total and per core.')
+        usage.add(self.cpu_usage, ('cpu', 'total'))
+        for i, percentage in enumerate(self.cores_usage):
+            usage.add(percentage, ('cpu', str(i)))
+        frequency = MetricFamily('cpu_frequency_mhz', 'gauge', 'Current CPU frequency.')
+        if self.cpufreq is not None:
+            frequency.add(self.cpufreq.current)
+        return [usage, frequency]
+
+    def get_alarm_msg(self):
+        return f'The CPU usage has reached! ({Common.generate_message(self.device,"%")})'
+
     def alarm(self, is_sound):
         Common.notification_send('CPU',
-                                 f'The CPU usage has reached! ({Common.generate_message(self.device,"%")})',
+                                 self.get_alarm_msg(),
                                  self.params_obj.config_params,
                                  is_sound)
 
-    def is_cpu_high_usage(self):
+    def get_alarm_value(self, history=None):
+        # highest usage (total or core), or its percentile in the alarm window
+        window = self.params_obj.config_params.get('ALARM_WINDOW', 0)
+        if history is not None and window > 0:
+            percentile = self.params_obj.config_params.get('ALARM_PERCENTILE', 95)
+            usage = history.get_percentile('cpu.total', percentile, window)
+            if usage is not None:
+                self.device = [[f'CPU total p{percentile} ({window}s)', round(usage, 1)]]
+            return usage
+        device = max(self.get_total_usage(), key=lambda dev_usage: dev_usage[1])
+        self.device = [[device[0], device[1]]]
+        return device[1]
+
+    def is_cpu_high_usage(self, history=None):
+        window = self.params_obj.config_params.get('ALARM_WINDOW', 0)
+        if history is not None and window > 0:
+            # percentile of the total usage in the window instead of the instantaneous values
+            percentile = self.params_obj.config_params.get('ALARM_PERCENTILE', 95)
+            usage = history.get_percentile('cpu.total', percentile, window)
+            if usage is None:
+                return False
+            self.device = [[f'CPU total p{percentile} ({window}s)', round(usage, 1)]]
+            return usage >= self.params_obj.config_params['HIGH_USAGE_CPU']
+
         usage_list = self.get_total_usage()
         for device in usage_list:
             self.device = [[device[0], device[1]]]
@@ -114,11 +179,13 @@ class CPU:
 class Memory:
     def __init__(self, params_obj):
         self.params_obj = params_obj
+        self.alarm_usage = None
+        self.backend = get_backend(params_obj.config_params)
         self.update()
 
     def update(self):
-        self.svmem = psutil.virtual_memory()
-        self.swap = psutil.swap_memory()
+        self.svmem = self.backend.virtual_memory()
+        self.swap = self.backend.swap_memory()
 
     def get_usage_msg(self):
         return f'Memory Usage: {self.get_memory_usage()}% (Swap: {self.get_swap_usage()}%)'
@@ -139,8 +206,20 @@ class Memory:
         print(f'Swap Memory Usage: {self.swap.percent}%')
         print(Common.SEPARATOR)
 
-    def is_high_usage(self):
-        if self.get_memory_usage() >= self.params_obj.config_params['HIGH_USAGE_MEM']:
+    def get_alarm_value(self, history=None):
+        self.alarm_usage = self.get_memory_usage()
+        window = self.params_obj.config_params.get('ALARM_WINDOW', 0)
+        if history is not None and window > 0:
+            percentile = self.params_obj.config_params.get('ALARM_PERCENTILE', 95)
+            self.alarm_usage = history.get_percentile('memory', percentile, window)
+            if self.alarm_usage is not None:
+                self.alarm_usage = round(self.alarm_usage, 1)
+        return self.alarm_usage
+
+    def is_high_usage(self, history=None):
+        if self.get_alarm_value(history) is None:
+            return False
+        if self.alarm_usage >= self.params_obj.config_params['HIGH_USAGE_MEM']:
             return True
         else:
             return False
@@ -148,15 +227,36 @@ class Memory:
     def get_memory_usage(self):
         return self.svmem.percent
 
+    def get_threshold_distance(self):
+        return self.params_obj.config_params['HIGH_USAGE_MEM'] - self.svmem.percent
+
     def get_swap_usage(self):
         return self.swap.percent
 
     def get_mem_swap_msg(self):
         return f'Memory: {self.get_memory_usage()}% (swap: {self.get_swap_usage()}%)'
 
+    def get_samples(self):
+        return {'memory': self.get_memory_usage(),
+                'swap': self.get_swap_usage()
+                }
+
+    def get_metrics(self):
+        return [MetricFamily('memory_usage_percent', 'gauge', 'Memory usage.').add(self.svmem.percent),
+                MetricFamily('memory_total_bytes', 'gauge', 'Total memory.').add(self.svmem.total),
+                MetricFamily('memory_used_bytes', 'gauge', 'Used memory.').add(self.svmem.used),
+                MetricFamily('memory_available_bytes', 'gauge', 'Available memory.').add(self.svmem.available),
+                MetricFamily('swap_usage_percent', 'gauge', 'Swap memory usage.').add(self.swap.percent),
+                MetricFamily('swap_total_bytes', 'gauge', 'Total swap memory.').add(self.swap.total),
+                MetricFamily('swap_used_bytes', 'gauge', 'Used swap memory.').add(self.swap.used)
+                ]
+
+    def get_alarm_msg(self):
+        return f'The memory usage has reached {self.alarm_usage}%!'
+
     def alarm(self, is_sound):
         Common.notification_send('Memory',
-                                 f'The memory usage has reached {self.get_memory_usage()}%!',
+                                 self.get_alarm_msg(),
                                  self.params_obj.config_params,
                                  is_sound)
 
@@ -172,42 +272,125 @@ class Memory:
 
 
 class Disk:
+    IO_FIELDS = ('read_bytes', 'write_bytes', 'read_count', 'write_count', 'read_time', 'write_time', 'busy_time')
+
     def __init__(self, params_obj):
         self.disk_partition_list = []
         self.params_obj = params_obj
+        self.io_rates = CounterRates(Disk.IO_FIELDS)
+        self.backend = get_backend(params_obj.config_params)
+        self.partition_index = PartitionIndex()
+        self.stat_pool = StatPool()
         self.update()
 
     def update(self):
-        self.partitions = psutil.disk_partitions()
-        self.disk_io = psutil.disk_io_counters()
+        # the partitions are listed again only when the mount table changes
+        self.partitions = self.partition_index.update(self.params_obj.config_params)
+        self.usages, self.stalled = self.stat_pool.stat([partition.mountpoint for partition in self.partitions],
+                                                        self.params_obj.config_params.get('DISK_STAT_TIMEOUT', 1))
+        self.disk_io = self.backend.disk_io_counters()
+        self.disks_io = self.backend.disk_io_counters(perdisk=True) or {}
+        self.io_rates.update(self.disks_io)
+
+    def get_io_rates(self, disk):
+        # bytes/s, operations/s, average time of each operation (ms) and time busy (%)
+        rates = self.io_rates.get_rates(disk)
+        deltas = self.io_rates.get_deltas(disk)
+        if rates is None:
+            return None
+        operations = deltas['read_count'] + deltas['write_count']
+        return {'read': rates['read_bytes'],
+                'write': rates['write_bytes'],
+                'iops': rates['read_count'] + rates['write_count'],
+                'await': (deltas['read_time'] + deltas['write_time']) / operations if operations else 0.0,
+                'utilization': min(rates['busy_time'] / 10, 100.0)     # ms busy per second
+                }
+
+    def get_io_msg_list(self):
+        io_list = []
+        for disk in self.disks_io:
+            if self.partition_index.is_excluded_device(disk):     # ex. loop devices
+                continue
+            rates = self.get_io_rates(disk)
+            if rates is None:
+                io_list.append(f'Disk: {disk}: n/a')
+                continue
+            io_list.append(f'Disk: {disk}: read {Common.convert_units(rates["read"])}/s, '
+                           f'write {Common.convert_units(rates["write"])}/s, {rates["iops"]:.1f} IOPS, '
+                           f'await {rates["await"]:.2f}ms, utilization {rates["utilization"]:.1f}%')
+        return io_list
 
     def info(self):
-        self.read_since_boot = f'Total read since boot: {Common.convert_units(self.disk_io.read_bytes)}'
-        self.write_since_boot = f'Total write since boot: {Common.convert_units(self.disk_io.write_bytes)}'
-
+        # built again in each call, the lists do not grow in loop mode
+        self.disk_partition_list = []
         for partition in self.partitions:
-            if partition.device.find('loop') == -1:     # not display loop partitions
-                self.disk_partition_list.append(f'Device: {partition.device}')
-                self.disk_partition_list.append(f'\tMountpoint: {partition.mountpoint}')
-                self.disk_partition_list.append(f'\tFile system type: {partition.fstype}')
-
-                try:
-                    partition_usage = psutil.disk_usage(partition.mountpoint)
-                except PermissionError:
-                    continue
-
-                self.disk_partition_list.append(f'\tTotal Size part: {Common.convert_units(partition_usage.total)}')
-                self.disk_partition_list.append(f'\tUsed part: {Common.convert_units(partition_usage.used)}')
-                self.disk_partition_list.append(f'\tFree part: {Common.convert_units(partition_usage.free)}')
-                self.disk_partition_list.append(f'\tOccupancy part: {partition_usage.percent}%')
+            self.disk_partition_list.append(f'Device: {partition.device}')
+            self.disk_partition_list.append(f'\tMountpoint: {partition.mountpoint}')
+            other_mountpoints = self.partition_index.get_other_mountpoints(partition)
+            if other_mountpoints:
+                self.disk_partition_list.append(f'\tAlso mounted on: {", ".join(other_mountpoints)}')
+            self.disk_partition_list.append(f'\tFile system type: {partition.fstype}')
+
+            if partition.mountpoint in self.stalled:
+                self.disk_partition_list.append('\tUsage: not available (file system not responding)')
+                continue
+            partition_usage = self.usages.get(partition.mountpoint)
+            if partition_usage is None:
+                continue
+
+            self.disk_partition_list.append(f'\tTotal Size part: {Common.convert_units(partition_usage.total)}')
+            self.disk_partition_list.append(f'\tUsed part: {Common.convert_units(partition_usage.used)}')
+            self.disk_partition_list.append(f'\tFree part: {Common.convert_units(partition_usage.free)}')
+            self.disk_partition_list.append(f'\tOccupancy part: {partition_usage.percent}%')
 
         print(Common.SEPARATOR)
         for partition in self.disk_partition_list:
             print(partition)
-        print(self.read_since_boot)
-        print(self.write_since_boot)
+        for disk_io in self.get_io_msg_list():
+            print(disk_io)
+        if self.disk_io is not None:
+            print(f'Total read since boot: {Common.convert_units(self.disk_io.read_bytes)}')
+            print(f'Total write since boot: {Common.convert_units(self.disk_io.write_bytes)}')
         print(Common.SEPARATOR)
 
+    def get_metrics(self):
+        size = MetricFamily('partition_size_bytes', 'gauge', 'Total size of the partition.')
+        used = MetricFamily('partition_used_bytes', 'gauge', 'Used space of the partition.')
+        occupancy = MetricFamily('partition_usage_percent', 'gauge', 'Occupancy of the partition.')
+        stalled = MetricFamily('partition_stalled', 'gauge', '1 if the file system is not responding.')
+        for partition in self.partitions:
+            labels = (('device', partition.device), ('mountpoint', partition.mountpoint),
+                      ('fstype', partition.fstype))
+            stalled.add(partition.mountpoint in self.stalled, *labels)
+            partition_usage = self.usages.get(partition.mountpoint)
+            if partition_usage is None:
+                continue
+            size.add(partition_usage.total, *labels)
+            used.add(partition_usage.used, *labels)
+            occupancy.add(partition_usage.percent, *labels)
+
+        read_bytes = MetricFamily('disk_read_bytes', 'counter', 'Bytes read from the disk.')
+        write_bytes = MetricFamily('disk_written_bytes', 'counter', 'Bytes written to the disk.')
+        reads = MetricFamily('disk_reads_completed', 'counter', 'Read operations of the disk.')
+        writes = MetricFamily('disk_writes_completed', 'counter', 'Write operations of the disk.')
+        busy = MetricFamily('disk_io_time_seconds', 'counter', 'Time the disk was busy.')
+        utilization = MetricFamily('disk_utilization_percent', 'gauge', 'Time busy between the last two measures.')
+        await_time = MetricFamily('disk_await_milliseconds', 'gauge',
+                                  'Average time of the operations between the last two measures.')
+        for disk, counters in self.disks_io.items():
+            if self.partition_index.is_excluded_device(disk):
+                continue
+            read_bytes.add(counters.read_bytes, ('disk', disk))
+            write_bytes.add(counters.write_bytes, ('disk', disk))
+            reads.add(counters.read_count, ('disk', disk))
+            writes.add(counters.write_count, ('disk', disk))
+            if hasattr(counters, 'busy_time'):      # Linux only
+                busy.add(counters.busy_time / 1000, ('disk', disk))
+            rates = self.get_io_rates(disk) or {}       # None in the first measure
+            utilization.add(rates.get('utilization'), ('disk', disk))
+            await_time.add(rates.get('await'), ('disk', disk))
+        return [size, used, occupancy, stalled, read_bytes, write_bytes, reads, writes, busy, utilization, await_time]
+
     def set_parameters(self, params_obj):
         self.params_obj = params_obj
 
@@ -216,19 +399,36 @@ class Disk:
 
 
 class Network:
+    IO_FIELDS = ('bytes_sent', 'bytes_recv', 'packets_sent', 'packets_recv', 'errin', 'errout', 'dropin', 'dropout')
+
     def __init__(self, params_obj):
         self.interfaces = []
         self.params_obj = params_obj
+        self.io_rates = CounterRates(Network.IO_FIELDS)
+        self.backend = get_backend(params_obj.config_params)
         self.update()
 
     def update(self):
         self.if_addrs = psutil.net_if_addrs()
-        self.net_io = psutil.net_io_counters()
+        self.nics_io = self.backend.net_io_counters(pernic=True)
+        self.net_io = self.backend.net_io_counters()
+        self.io_rates.update(self.nics_io)
+
+    def get_io_rates(self, interface_name):
+        return self.io_rates.get_rates(interface_name)
+
+    def get_io_msg(self, interface_name):
+        rates = self.get_io_rates(interface_name)
+        if rates is None:
+            return '\tTraffic: n/a'
+        return f'\tTraffic: sent {Common.convert_units(rates["bytes_sent"])}/s ' \
+               f'({rates["packets_sent"]:.1f} packets/s), ' \
+               f'received {Common.convert_units(rates["bytes_recv"])}/s ({rates["packets_recv"]:.1f} packets/s), ' \
+               f'errors {rates["errin"] + rates["errout"]:.1f}/s, drops {rates["dropin"] + rates["dropout"]:.1f}/s'
 
     def info(self):
-        self.bytes_received = f'Total bytes received: {Common.convert_units(self.net_io.bytes_recv)}'
-        self.bytes_send = f'Total bytes sent: {Common.convert_units(self.net_io.bytes_sent)}'
-
+        # built again in each call, the lists do not grow in loop mode
+        self.interfaces = []
         for interface_name, interface_addresses in self.if_addrs.items():
             self.interfaces.append(f'Interface: {interface_name}')
             for address in interface_addresses:
@@ -240,14 +440,34 @@ class Network:
                     self.interfaces.append(f'\tMAC Address: {address.address}')
                     self.interfaces.append(f'\tIP Netmask: {address.netmask}')
                     self.interfaces.append(f'\tBroadcast MAC: {address.broadcast}')
+            if interface_name in self.nics_io:
+                self.interfaces.append(self.get_io_msg(interface_name))
 
         print(Common.SEPARATOR)
         for interface in self.interfaces:
             print(interface)
-        print(self.bytes_send)
-        print(self.bytes_received)
+        print(f'Total bytes sent: {Common.convert_units(self.net_io.bytes_sent)}')
+        print(f'Total bytes received: {Common.convert_units(self.net_io.bytes_recv)}')
         print(Common.SEPARATOR)
 
+    def get_metrics(self):
+        sent = MetricFamily('network_sent_bytes', 'counter', 'Bytes sent by the interface.')
+        received = MetricFamily('network_received_bytes', 'counter', 'Bytes received by the interface.')
+        packets_sent = MetricFamily('network_sent_packets', 'counter', 'Packets sent by the interface.')
+        packets_received = MetricFamily('network_received_packets', 'counter', 'Packets received by the interface.')
+        errors = MetricFamily('network_errors', 'counter', 'Errors of the interface.')
+        drops = MetricFamily('network_drops', 'counter', 'Packets dropped by the interface.')
+        for interface_name, counters in self.nics_io.items():
+            sent.add(counters.bytes_sent, ('interface', interface_name))
+            received.add(counters.bytes_recv, ('interface', interface_name))
+            packets_sent.add(counters.packets_sent, ('interface', interface_name))
+            packets_received.add(counters.packets_recv, ('interface', interface_name))
+            errors.add(counters.errin, ('interface', interface_name), ('direction', 'in'))
+            errors.add(counters.errout, ('interface', interface_name), ('direction', 'out'))
+            drops.add(counters.dropin, ('interface', interface_name), ('direction', 'in'))
+            drops.add(counters.dropout, ('interface', interface_name), ('direction', 'out'))
+        return [sent, received, packets_sent, packets_received, errors, drops]
+
     def set_parameters(self, params_obj):
         self.params_obj = params_obj
 
@@ -257,14 +477,21 @@ class Network:
 
 class Battery:
     def __init__(self, params_obj):
-        self.status = psutil.sensors_battery()
         self.params_obj = params_obj
         self.update()
 
     def update(self):
+        self.status = psutil.sensors_battery()
+        if self.status is None:     # no battery (ex. desktop PCs)
+            self.power_unplugged = True
+            self.battery_percent = None
+            return
         self.power_unplugged = self.status.power_plugged
         self.battery_percent = self.status.percent
 
+    def is_available(self):
+        return self.battery_percent is not None
+
     def info(self):
         print(Common.SEPARATOR)
         print(self.get_percentage_msg())
@@ -277,20 +504,47 @@ class Battery:
     def is_discharging_below_threshold(self):
         # is_unplugged() method fails in some PCs with damage battery
         # return self.is_below_threshold() and self.is_unplugged()
+        if not self.is_available():
+            return False
         return self.is_below_threshold() and self.is_discharge_higher_delta()
 
     def is_below_threshold(self):
         return self.params_obj.config_params['DISCHARGING_BATTERY'] >= self.get_percentage()
 
     def is_discharge_higher_delta(self):
-        return self.params_obj.stats_params['BATTERY_STATUS'] - self.get_percentage() > self.params_obj.config_params['DELTA_BATTERY']
+        previous = self.params_obj.get_previous_stat('BATTERY_STATUS',
+                                                     self.params_obj.config_params.get('DELTA_BATTERY_WINDOW', 60))
+        if previous is None:
+            return False
+        return previous - self.get_percentage() > self.params_obj.config_params['DELTA_BATTERY']
 
     def get_percentage(self):
+        if not self.is_available():
+            return None
         return round(self.battery_percent, 2)
 
+    def get_threshold_distance(self):
+        # only while discharging (psutil power_plugged False)
+        if not self.is_available() or self.power_unplugged:
+            return None
+        return self.battery_percent - self.params_obj.config_params['DISCHARGING_BATTERY']
+
     def get_percentage_msg(self):
+        if not self.is_available():
+            return 'Battery percentage: not available'
         return f'Battery percentage: {self.get_percentage():.2f}%'
 
+    def get_samples(self):
+        return {'battery': self.get_percentage()}
+
+    def get_metrics(self):
+        percent = MetricFamily('battery_percent', 'gauge', 'Battery charge.')
+        plugged = MetricFamily('battery_power_plugged', 'gauge', '1 if the power cable is plugged.')
+        if self.is_available():
+            percent.add(self.battery_percent)
+            plugged.add(self.power_unplugged)     # psutil power_plugged
+        return [percent, plugged]
+
     def get_unplugged_msg(self):
         return f'Unplugged: {self.is_unplugged()}'
 
@@ -300,9 +554,12 @@ class Battery:
                                  self.params_obj.config_params,
                                  is_sound)
 
+    def get_discharging_msg(self):
+        return f'The battery is discharging! ({self.get_percentage():0.2f}%)'
+
     def alarm_discharging(self, is_sound):
         Common.notification_send('Battery',
-                                 f'The battery is discharging! ({self.get_percentage():0.2f}%)',
+                                 self.get_discharging_msg(),
                                  self.params_obj.config_params,
                                  is_sound)
 
@@ -320,19 +577,46 @@ class Temperature:
     def __init__(self, params_obj):
         self.params_obj = params_obj
         self.temp = []
-        self.temp_v = {}
+        self.temp_v = {}        # (chip, label) -> shwtemp
+        self.names = {}         # (chip, label) -> displayed name
+        self.sample_keys = {}   # sample name (ex. 'temp.Core 0') -> (chip, label)
         self.device = None
+        self.alarm_sensor = None
+        self.backend = get_backend(params_obj.config_params)
+        self.hwmon = get_hwmon_index(params_obj.config_params)
         self.update()
 
     def update(self):
-        self.temp = psutil.sensors_temperatures()
-        self.set_temperatures()
+        if self.hwmon is not None:
+            temperatures = self.hwmon.read()
+        else:
+            self.temp = self.backend.sensors_temperatures()
+            temperatures = self.get_psutil_temperatures()
+        # new dicts, assigned together: the other threads never see values without their names
+        temp_v = {key: value for key, value in temperatures.items() if self.is_valid_temperature(value)}
+        if temp_v.keys() == self.names.keys():
+            self.temp_v = temp_v
+        else:
+            self.temp_v, self.names, self.sample_keys = (temp_v,) + Temperature.get_names(temp_v)
+
+    def get_psutil_temperatures(self):
+        temperatures = {}
+        for chip in self.temp:
+            for shwtemp in self.temp[chip]:
+                key = (chip, shwtemp.label)
+                index = 1
+                while key in temperatures:      # psutil gives the chips with the same name together
+                    index += 1
+                    key = (chip, f'{shwtemp.label} ({index})')
+                temperatures[key] = shwtemp
+        return temperatures
 
-    def set_temperatures(self):
-        for key in self.temp:
-            for shwtemp in self.temp[key]:
-                if self.is_valid_temperature(shwtemp):
-                    self.temp_v[shwtemp.label] = shwtemp
+    @staticmethod
+    def get_names(temp_v):
+        # the label, and the chip if several chips have this label (ex. 'Core 0' of each CPU package)
+        labels = Counter(label for _, label in temp_v)
+        names = {(chip, label): label if labels[label] == 1 else f'{chip} {label}' for chip, label in temp_v}
+        return names, {f'temp.{name}': key for key, name in names.items()}
 
     @staticmethod
     def is_valid_temperature(shwtemp):
@@ -350,10 +634,23 @@ class Temperature:
 
     def get_temperature_string(self):
         temp_string = ''
-        for value in self.temp_v.values():
-            temp_string += f'{value.label}: {value.current}º\n'
+        for key, value in self.temp_v.items():
+            temp_string += f'{self.names[key]}: {value.current}º\n'
         return Common.fix_string(temp_string)
 
+    def get_samples(self):
+        return {f'temp.{self.names[key]}': value.current for key, value in self.temp_v.items()}
+
+    def get_metrics(self):
+        current = MetricFamily('temperature_celsius', 'gauge', 'Temperature of the sensor.')
+        high = MetricFamily('temperature_high_celsius', 'gauge', 'High temperature of the sensor.')
+        critical = MetricFamily('temperature_critical_celsius', 'gauge', 'Critical temperature of the sensor.')
+        for (chip, label), value in self.temp_v.items():
+            current.add(value.current, ('chip', chip), ('sensor', label))
+            high.add(value.high, ('chip', chip), ('sensor', label))
+            critical.add(value.critical, ('chip', chip), ('sensor', label))
+        return [current, high, critical]
+
     def is_notification_temperature(self):
         return self.params_obj.config_params['NOTIFICATION_TEMPERATURE'] == 'yes'
 
@@ -361,12 +658,12 @@ class Temperature:
         return self.get_status() != 'OK'
 
     def get_status(self):
-        for device in self.temp_v.values():
-            self.device = [[device.label, device.current]]
+        for key, device in self.temp_v.items():
+            self.device = [[self.names[key], device.current]]
             if device.current >= device.critical:
                 return 'CRITICAL'
             elif device.current >= device.high:
-                return 'HIGH', device.label
+                return 'HIGH'
         self.device = ''
         return 'OK'
 
@@ -374,6 +671,30 @@ class Temperature:
         temp_msg = Common.generate_message(self.device, 'º')
         return temp_msg
 
+    def get_limit(self, sample, limit):
+        # 'high' or 'critical' temperature of the sensor of a sample, for the rules
+        device = self.temp_v.get(self.sample_keys.get(sample))
+        return None if device is None else getattr(device, limit)
+
+    def get_threshold_distance(self):
+        # degrees below the high temperature, of the nearest sensor
+        return min((device.high - device.current for device in self.temp_v.values()), default=None)
+
+    def get_alarm_margin(self):
+        # degrees above the high temperature of the hottest sensor (relative to its high value)
+        self.alarm_sensor = None
+        margin = None
+        for key, device in self.temp_v.items():
+            if margin is None or device.current - device.high > margin:
+                margin = device.current - device.high
+                self.alarm_sensor = (self.names[key], device)
+        return margin
+
+    def get_alarm_msg(self):
+        name, device = self.alarm_sensor
+        status = 'CRITICAL' if device.current >= device.critical else 'HIGH'
+        return f'Temperature is {status}! ({Common.generate_message([[name, device.current]], "º")})'
+
     def alarm(self, is_sound):
         status = self.get_status()
         temp_msg = self.get_temperature_msg()
@@ -392,9 +713,43 @@ class Temperature:
 class GPU:
     def __init__(self, params_obj):
         self.params_obj = params_obj
-        self.gpus = GPUtil.getGPUs()
+        self.device = ''
+        # nvidia-smi is executed only in the first update()
+        self.gpus = []
+        self.b_available = True
+        self.stream = None
 
     def update(self):
+        if self.params_obj.config_params.get('GPU_BACKEND', 'stream') == 'stream' and self.update_stream():
+            return
+        self.update_gputil()
+
+    def update_stream(self):
+        # a long-lived 'nvidia-smi -lms' child instead of a new nvidia-smi for each update
+        if self.stream is None:
+            timeout = self.params_obj.config_params.get('GPU_STREAM_TIMEOUT', 2)
+            self.stream = NvidiaSmiStream(self.params_obj.config_params.get('GPU_STREAM_INTERVAL_MS', 1000),
+                                          timeout=timeout)
+            if not self.stream.start():
+                return False
+            self.stream.wait_first_row(timeout)
+        if self.stream.is_failed():
+            return False
+        gpus = self.stream.get_gpus()
+        if not gpus:        # stale values are not kept, if GPUtil is not available
+            self.gpus = []
+            return False
+        self.gpus = gpus
+        return True
+
+    def update_gputil(self):
+        if not self.b_available:
+            return
+        try:
+            GPUtil = StartupProfile.import_module('GPUtil')
+        except ImportError:     # GPUtil not installed: no NVIDIA GPUs
+            self.b_available = False
+            return
         self.gpus = GPUtil.getGPUs()
 
     def info(self):
@@ -414,6 +769,36 @@ class GPU:
             gpu_string += f'{gpu.name} load: {Common.get_percentage(gpu.load)}%\n'
         return Common.fix_string(gpu_string)
 
+    def close(self):
+        if self.stream is not None:
+            self.stream.stop()
+
+    def get_max_load(self):
+        if not self.gpus:
+            return None
+        return max(Common.get_percentage(gpu.load) for gpu in self.gpus)
+
+    def get_threshold_distance(self):
+        load = self.get_max_load()
+        return None if load is None else self.params_obj.config_params['HIGH_LOAD_GPU'] - load
+
+    def get_samples(self):
+        # by index: the GPUs of the same model have the same name
+        return {f'gpu.{gpu.id}': Common.get_percentage(gpu.load) for gpu in self.gpus}
+
+    def get_metrics(self):
+        load = MetricFamily('gpu_load_percent', 'gauge', 'GPU load.')
+        memory_total = MetricFamily('gpu_memory_total_bytes', 'gauge', 'Total GPU memory.')
+        memory_used = MetricFamily('gpu_memory_used_bytes', 'gauge', 'Used GPU memory.')
+        temperature = MetricFamily('gpu_temperature_celsius', 'gauge', 'GPU temperature.')
+        for gpu in self.gpus:
+            labels = (('gpu', gpu.name), ('uuid', gpu.uuid))
+            load.add(Common.get_percentage(gpu.load), *labels)
+            memory_total.add(gpu.memoryTotal * 1024 * 1024, *labels)
+            memory_used.add(gpu.memoryUsed * 1024 * 1024, *labels)
+            temperature.add(gpu.temperature, *labels)
+        return [load, memory_total, memory_used, temperature]
+
     def is_notification_gpu(self):
         return self.params_obj.config_params['NOTIFICATION_GPU'] == 'yes'
 
@@ -435,6 +820,10 @@ class GPU:
         temp_msg = Common.generate_message(self.device, '%')
         return temp_msg
 
+    def get_alarm_msg(self):
+        gpu = max(self.gpus, key=lambda gpu: gpu.load)
+        return f'Load is HIGH! ({Common.generate_message([[gpu.name, Common.get_percentage(gpu.load)]], "%")})'
+
     def alarm(self, is_sound):
         status = self.get_status()
         gpu_msg = self.get_gpu_msg()
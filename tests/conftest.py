@@ -0,0 +1,49 @@
+#
+# @file <conftest.py>
+#
+# @author Fernando Mendiburu - <fernando.mendiburu@ee.ufcg.edu.br>
+#
+
+import os
+import sys
+
+import pytest
+
+# the modules of pc_status are not a package
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from common import Common      # noqa: E402
+
+
+class FakeParameters:
+    # same interface as ReadParametersFiles, without config file nor history store
+    def __init__(self, config_params):
+        self.config_params = config_params
+
+    def update_parameters(self):
+        return False
+
+    @staticmethod
+    def get_previous_stat(metric, seconds):
+        return 50.0
+
+
+@pytest.fixture(autouse=True)
+def state_files(tmp_path, monkeypatch):
+    # the tests never read nor write the files of the installed pc_status
+    state_dir = tmp_path / 'state'
+    state_dir.mkdir()
+    monkeypatch.setattr(Common, 'CONFIG_FILE', os.path.join(REPO_DIR, 'config', 'config.txt'))
+    monkeypatch.setattr(Common, 'HISTORY_DIR', str(state_dir / 'history'))
+    for attribute, name in (('CPU_STATE_FILE', 'cpu_state.txt'), ('ALARM_STATE_FILE', 'alarm_state.txt'),
+                            ('SOCKET_FILE', 'pc_status.sock'), ('FLEET_SOCKET_FILE', 'fleet.sock'),
+                            ('SNAPSHOT_FILE', 'snapshot')):
+        monkeypatch.setattr(Common, attribute, str(state_dir / name))
+    return state_dir
+
+
+@pytest.fixture
+def config_params():
+    # config.txt of the repository
+    return Common.parse_params(os.path.join(REPO_DIR, 'config', 'config.txt'))
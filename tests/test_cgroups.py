@@ -0,0 +1,101 @@
+#
+# @file <test_cgroups.py>
+#
+# @author Fernando Mendiburu - <fernando.mendiburu@ee.ufcg.edu.br>
+#
+
+import os
+import shutil
+
+import pytest
+
+from conftest import FakeParameters
+from fake_psutil import FakeCgroupfs
+from cgroups import Cgroups
+
+GROUPS = 12
+
+
+@pytest.fixture
+def root(tmp_path):
+    FakeCgroupfs.write(str(tmp_path), GROUPS, tick=1)
+    return str(tmp_path)
+
+
+@pytest.fixture
+def cgroups(root):
+    cgroups = Cgroups(FakeParameters({'PROCFS_ROOT': root}))
+    cgroups.io_rates.min_interval = 0
+    yield cgroups
+    cgroups.close()
+
+
+def get_path(root, group):
+    return os.path.join(root, 'sys/fs/cgroup', group)
+
+
+def get_node(cgroups, name):
+    return next(node for node in cgroups.leaves if node.name == name)
+
+
+def test_leaves(cgroups):
+    assert sorted(node.name for node in cgroups.leaves) == sorted(FakeCgroupfs.get_groups(GROUPS))
+    assert get_node(cgroups, 'system.slice/service1.service').memory == 2 << 24
+
+
+def test_scan_only_changed_directories(root, cgroups):
+    scans = cgroups.scans
+    cgroups.update()
+    assert cgroups.scans == scans
+    os.makedirs(get_path(root, 'system.slice/new.service'))
+    cgroups.update()
+    assert cgroups.scans == scans + 2      # system.slice and the new group
+    assert 'system.slice/new.service' in [node.name for node in cgroups.leaves]
+
+
+def test_removed_group_pruned(root, cgroups):
+    shutil.rmtree(get_path(root, 'user.slice/user-1000.slice/session-0.scope'))
+    cgroups.update()
+    assert len(cgroups.leaves) == GROUPS - 1
+    assert not any(node.name.endswith('session-0.scope') for node in cgroups.nodes.values())
+
+
+def test_rates_after_two_writes(root, cgroups):
+    FakeCgroupfs.write(root, GROUPS, tick=2)
+    cgroups.update()
+    node = get_node(cgroups, 'system.slice/service1.service')
+    rates = cgroups.io_rates.get_rates(node.name)
+    assert rates['usage_usec'] * rates['interval'] == pytest.approx(10000 * 2)
+    assert rates['wbytes'] * rates['interval'] == pytest.approx(8192)
+    assert cgroups.get_cpu_usage(node) == pytest.approx(rates['usage_usec'] / 1e4)
+    assert cgroups.top_cpu and cgroups.b_rates_ready
+
+
+def test_restarted_group_counters_reset(root, cgroups):
+    FakeCgroupfs.write(root, GROUPS, tick=1000)
+    cgroups.update()
+    path = get_path(root, 'system.slice/service1.service')
+    shutil.rmtree(path)
+    os.makedirs(path)
+    FakeCgroupfs.write_group(path, 1, 1)
+    cgroups.update()
+    node = get_node(cgroups, 'system.slice/service1.service')
+    assert cgroups.get_cpu_usage(node) is None      # a reset, not a wraparound
+    FakeCgroupfs.write_group(path, 1, 2)
+    cgroups.update()
+    assert cgroups.get_cpu_usage(node) is not None
+
+
+def test_unreadable_file(root, cgroups, monkeypatch):
+    # ex. pressure files without PSI: only this value is not available
+    node = get_node(cgroups, 'system.slice/service1.service')
+    pressure = node.files['cpu.pressure']
+
+    def read():
+        raise OSError(95, 'Operation not supported')
+
+    monkeypatch.setattr(pressure, 'read', read)
+    cgroups.update()
+    assert node in cgroups.leaves
+    assert node.pressure['cpu'] is None and node.pressure['io'] is not None
+    assert node.memory is not None
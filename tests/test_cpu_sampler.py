@@ -0,0 +1,56 @@
+#
+# @file <test_cpu_sampler.py>
+#
+# @author Fernando Mendiburu - <fernando.mendiburu@ee.ufcg.edu.br>
+#
+
+import cpu_sampler
+from cpu_sampler import CPUSampler
+from fake_psutil import scputimes
+
+
+class FakeCPU:
+    # one core: the counters advance with the (fake) time, busy at the given usage
+    def __init__(self):
+        self.now = 1000.0
+        self.usage = 0.1
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+    def boot_time(self):
+        return 1600000000.0
+
+    def cpu_times(self, percpu=False):
+        times = scputimes(self.now * self.usage, 0.0, 0.0, self.now * (1 - self.usage), 0.0, 0.0, 0.0, 0.0, 0.0, 0.0)
+        return [times] if percpu else times
+
+
+def test_saved_counters_too_recent(tmp_path, monkeypatch):
+    cpu = FakeCPU()
+    monkeypatch.setattr(cpu_sampler.time, 'sleep', cpu.sleep)
+    state_file = str(tmp_path / 'cpu_state.txt')
+    sampler = CPUSampler(0.5, state_file, cpu)
+    assert sampler.sample() == (10.0, [10.0])
+    sampler.save()
+
+    # next execution 0.1s later, with a busy start: the rest of the window is waited
+    cpu.sleep(0.1)
+    cpu.usage = 1.0
+    sampler = CPUSampler(0.5, state_file, cpu)
+    cpu.usage = 0.2
+    sampler.sample()
+    assert sampler.window >= 0.5
+
+
+def test_saved_counters_old_enough(tmp_path, monkeypatch):
+    cpu = FakeCPU()
+    sleeps = []
+    monkeypatch.setattr(cpu_sampler.time, 'sleep', sleeps.append)
+    state_file = str(tmp_path / 'cpu_state.txt')
+    sampler = CPUSampler(0.5, state_file, cpu)
+    sampler.prev_times = sampler.read_counters()
+    sampler.save()
+    cpu.sleep(60)
+    assert CPUSampler(0.5, state_file, cpu).sample() == (10.0, [10.0])
+    assert sleeps == []
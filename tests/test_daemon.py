@@ -0,0 +1,42 @@
+#
+# @file <test_daemon.py>
+#
+# @author Fernando Mendiburu - <fernando.mendiburu@ee.ufcg.edu.br>
+#
+
+from conftest import FakeParameters
+from daemon import DaemonServer, DaemonClient
+
+
+class FakeHistoryStore:
+    def __init__(self):
+        self.values = []
+        self.b_closed = False
+
+    def append(self, metric, value, now):
+        self.values.append((metric, value))
+
+    def close(self):
+        self.b_closed = True
+
+
+def get_daemon(config_params, socket_file):
+    params_obj = FakeParameters(dict(config_params, SNAPSHOT_PUBLISH='no'))
+    params_obj.history_store = FakeHistoryStore()
+    return DaemonServer(params_obj, socket_file, is_notification=False, is_sound=False)
+
+
+def test_second_daemon_exits_before_sampling(tmp_path, config_params):
+    socket_file = str(tmp_path / 'pc_status.sock')
+    first = get_daemon(config_params, socket_file)
+    assert first.start_server()
+    try:
+        assert DaemonClient.request(socket_file, 'ping') == 'pong'
+        second = get_daemon(config_params, socket_file)
+        second.run()
+        assert second.sensor is None
+        assert second.params_obj.history_store.values == []
+        assert second.params_obj.history_store.b_closed
+        assert DaemonClient.request(socket_file, 'ping') == 'pong'     # the socket of the first one is kept
+    finally:
+        first.stop_server()
@@ -0,0 +1,52 @@
+#
+# @file <test_dashboard.py>
+#
+# @author Fernando Mendiburu - <fernando.mendiburu@ee.ufcg.edu.br>
+#
+
+import io
+import os
+import signal
+
+import pytest
+
+from dashboard import Dashboard, TerminalScreen
+
+SIZE = (40, 10)
+
+
+def test_frame_only_changes():
+    screen = TerminalScreen()
+    lines = ['pc_status 10:00:00', 'CPU usage: 12.5%', 'Memory usage: 40.0%']
+    assert screen.get_frame(lines, SIZE).startswith('\x1b[H\x1b[2J')
+    # unchanged lines: nothing is sent
+    assert screen.get_frame(lines, SIZE) == ''
+    # one changed cell: the cursor move and the new character only
+    assert screen.get_frame(['pc_status 10:00:01'] + lines[1:], SIZE) == '\x1b[1;18H1'
+    # changed runs closer than GAP are sent in one write, the end of a shorter line is erased
+    assert screen.get_frame(['pc_status 10:00:01', 'CPU usage: 7.5%', 'Memory usage: 40.0%'], SIZE) == \
+           '\x1b[2;12H7.5%\x1b[2;16H\x1b[K'
+    # the removed lines are erased
+    assert screen.get_frame(['pc_status 10:00:01'], SIZE) == '\x1b[2;1H\x1b[K\x1b[3;1H\x1b[K'
+    # resized terminal: everything is drawn again
+    assert screen.get_frame(['pc_status 10:00:01'], (80, 24)) == '\x1b[H\x1b[2J\x1b[1;1Hpc_status 10:00:01'
+
+
+class FakeOutput(io.StringIO):
+    def flush(self):
+        pass
+
+
+def test_sigterm_restores_terminal():
+    previous_handler = signal.getsignal(signal.SIGTERM)
+    output = FakeOutput()
+    dashboard = Dashboard(output, {})
+    dashboard.b_started = True      # as after the first frame
+    with pytest.raises(SystemExit) as exit_info:
+        os.kill(os.getpid(), signal.SIGTERM)
+    assert exit_info.value.code == 128 + signal.SIGTERM
+    dashboard.close()
+    assert output.getvalue().startswith(Dashboard.LEAVE)
+    assert signal.getsignal(signal.SIGTERM) == previous_handler
+    dashboard.close()
+    assert output.getvalue().count(Dashboard.LEAVE) == 1
@@ -0,0 +1,64 @@
+#
+# @file <test_fleet.py>
+#
+# @author Fernando Mendiburu - <fernando.mendiburu@ee.ufcg.edu.br>
+#
+
+import time
+import socket
+
+import pytest
+
+from conftest import FakeParameters
+from daemon import DaemonClient
+from fleet import FleetAgent, FleetCollector, FleetSimulator
+
+
+def get_free_port(host):
+    try:
+        with socket.socket(socket.AF_INET6, socket.SOCK_STREAM) as probe:
+            probe.bind((host, 0))
+            return probe.getsockname()[1]
+    except OSError:
+        pytest.skip('no IPv6 loopback')
+
+
+@pytest.mark.parametrize('protocol', ['udp', 'tcp'])
+def test_push_ipv6(tmp_path, config_params, protocol):
+    address = ('::1', get_free_port('::1'))
+    collector = FleetCollector(FakeParameters(config_params), address,
+                               str(tmp_path / 'fleet.sock'))
+    collector.start()
+    try:
+        simulator = FleetSimulator(address, protocol, 3)
+        agent = simulator.agent
+        for host in simulator.hosts:
+            agent.send(simulator.get_snapshot(host, 1).encode())
+        deadline = time.monotonic() + 5
+        while len(collector.state.hosts) < 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert agent.errors == 0
+        assert sorted(collector.state.hosts) == simulator.hosts
+        agent.close()
+    finally:
+        collector.stop()
+    assert collector.udp_socket is None and not collector.udp_thread.is_alive()
+
+
+def test_second_collector_keeps_socket(tmp_path, config_params, capsys):
+    query_socket_file = str(tmp_path / 'fleet.sock')
+    first = FleetCollector(FakeParameters(config_params), ('127.0.0.1', 0), query_socket_file)
+    first.start()
+    try:
+        assert DaemonClient.request(query_socket_file, 'ping') == 'pong'
+        FleetCollector(FakeParameters(config_params), ('127.0.0.1', 0), query_socket_file).run()
+        assert 'already running' in capsys.readouterr().out
+        assert DaemonClient.request(query_socket_file, 'stats') is not None
+    finally:
+        first.stop()
+
+
+def test_agent_unresolved_address():
+    agent = FleetAgent(('host.invalid', 9200))
+    agent.send(b'snapshot')
+    assert agent.errors == 1 and agent.socket is None
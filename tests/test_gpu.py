@@ -0,0 +1,89 @@
+#
+# @file <test_gpu.py>
+#
+# @author Fernando Mendiburu - <fernando.mendiburu@ee.ufcg.edu.br>
+#
+
+import os
+import sys
+import time
+
+from conftest import FakeParameters
+from fake_psutil import FakeGPU
+from gpu_backend import NvidiaSmiStream
+from system import GPU
+
+
+def test_samples_of_identical_gpus():
+    gpu = GPU(FakeParameters({}))
+    gpu.gpus = [FakeGPU(i, f'GPU-{i:08d}', 'NVIDIA A100', 0.1 * (i + 1), 40960.0, 0.0, 40960.0, 0.0, 40.0)
+                for i in range(2)]
+    assert gpu.get_samples() == {'gpu.0': 10.0, 'gpu.1': 20.0}
+
+
+# nvidia-smi replacement: the intervals of rows in NVIDIA_SMI_ROWS (separated by empty lines), then it hangs
+FAKE_NVIDIA_SMI = '''#!{python}
+import os
+import sys
+import time
+
+interval = int(sys.argv[sys.argv.index('-lms') + 1]) / 1000
+with open(os.environ['NVIDIA_SMI_ROWS']) as rows_file:
+    blocks = rows_file.read().split('\\n\\n')
+with open(os.environ['NVIDIA_SMI_ROWS'] + '.starts', 'a') as starts_file:
+    starts_file.write('start\\n')
+for block in blocks:
+    print(block.strip(), flush=True)
+    time.sleep(interval)
+time.sleep(60)
+'''
+
+
+def get_row(index, load):
+    return f'{index}, GPU-{index:08d}, NVIDIA A100, {load}, 40960, 1024, 39936, 40'
+
+
+def get_stream(tmp_path, monkeypatch, blocks, interval_ms=50, timeout=0.3):
+    script = tmp_path / 'nvidia-smi'
+    script.write_text(FAKE_NVIDIA_SMI.format(python=sys.executable))
+    script.chmod(0o755)
+    rows = tmp_path / 'rows.txt'
+    rows.write_text('\n\n'.join('\n'.join(block) for block in blocks))
+    monkeypatch.setenv('PATH', f'{tmp_path}{os.pathsep}{os.environ["PATH"]}')
+    monkeypatch.setenv('NVIDIA_SMI_ROWS', str(rows))
+    stream = NvidiaSmiStream(interval_ms, timeout=timeout)
+    assert stream.start()
+    assert stream.wait_first_row(5)
+    return stream
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_stream_removes_missing_gpus(tmp_path, monkeypatch):
+    stream = get_stream(tmp_path, monkeypatch, [[get_row(0, 10), get_row(1, 20)],
+                                                [get_row(0, 30)],
+                                                [get_row(0, 40)]])
+    try:
+        assert wait_for(lambda: [(gpu.id, gpu.load) for gpu in stream.get_gpus()] == [(0, 0.4)])
+    finally:
+        stream.stop()
+
+
+def test_stream_restarts_hung_child(tmp_path, monkeypatch):
+    stream = get_stream(tmp_path, monkeypatch, [[get_row(0, 10), get_row(1, 20)]])
+    try:
+        assert wait_for(lambda: [gpu.id for gpu in stream.get_gpus()] == [0, 1])
+        # the child hangs after the first interval: no stale values, and a new child
+        assert wait_for(lambda: not stream.get_gpus())
+        assert wait_for(lambda: stream.restart_count >= 1)
+        assert wait_for(lambda: (tmp_path / 'rows.txt.starts').read_text().count('start') >= 2)
+        assert wait_for(lambda: [gpu.id for gpu in stream.get_gpus()] == [0, 1])
+    finally:
+        stream.stop()
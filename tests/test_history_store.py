@@ -0,0 +1,33 @@
+#
+# @file <test_history_store.py>
+#
+# @author Fernando Mendiburu - <fernando.mendiburu@ee.ufcg.edu.br>
+#
+
+import os
+import time
+
+import pytest
+
+from history_store import HistoryStore
+
+
+def test_stray_segment_files(tmp_path):
+    store = HistoryStore(str(tmp_path))
+    now = time.time()
+    store.append('CPU_STATUS', 42.0, now)
+    directory = store.get_dir('CPU_STATUS', HistoryStore.RAW)
+    for name in ('copy.seg', '.seg', 'notes.txt'):
+        open(os.path.join(directory, name), 'w').close()
+    assert len(store.get_segments('CPU_STATUS', HistoryStore.RAW)) == 1
+    assert [row[1] for row in store.query('CPU_STATUS', 60, now + 1, HistoryStore.RAW)] == [42.0]
+    store.close()
+
+
+def test_parse_since():
+    assert HistoryStore.parse_since('90') == 90.0
+    assert HistoryStore.parse_since('5m') == 300.0
+    assert HistoryStore.parse_since('1.5h') == 5400.0
+    for since in ('', 's', '0', '0s', '-5m', 'nan', 'abc'):
+        with pytest.raises(ValueError):
+            HistoryStore.parse_since(since)
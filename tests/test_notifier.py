@@ -0,0 +1,87 @@
+#
+# @file <test_notifier.py>
+#
+# @author Fernando Mendiburu - <fernando.mendiburu@ee.ufcg.edu.br>
+#
+
+import pytest
+
+import notifier
+from notifier import NotificationDispatcher, NullSink
+
+CONFIG = {'ALARM_MIN_DURATION': 0, 'ALARM_COOLDOWN': 300}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(notifier.time, 'time', clock.time)
+    return clock
+
+
+def run_ticks(dispatcher, clock, ticks, config_dict=CONFIG, name='cpu'):
+    # (seconds since the previous tick, b_trigger, b_clear) of one alarm
+    for seconds, b_trigger, b_clear in ticks:
+        clock.now += seconds
+        dispatcher.evaluate(name, b_trigger, b_clear, 'CPU', lambda: f'CPU at {clock.now:.0f}', config_dict)
+        dispatcher.flush(config_dict, False)
+
+
+def get_sent(dispatcher):
+    dispatcher.close()
+    return dispatcher.sink.sent
+
+
+def test_hysteresis(clock):
+    dispatcher = NotificationDispatcher(NullSink())
+    # above the threshold, between both thresholds (still active), cleared, then above again
+    run_ticks(dispatcher, clock, [(1, True, False), (1, False, False), (1, True, False), (1, False, True),
+                                  (20, True, False)], dict(CONFIG, ALARM_COOLDOWN=10))
+    assert get_sent(dispatcher) == [('CPU', 'CPU at 1001'), ('CPU', 'CPU at 1024')]
+
+
+def test_cooldown(clock):
+    dispatcher = NotificationDispatcher(NullSink())
+    # reminder of an active alarm after the cooldown, and no notification of an alarm back before its end
+    run_ticks(dispatcher, clock, [(1, True, False), (100, True, False), (200, True, False), (1, False, True),
+                                  (1, True, False)])
+    assert get_sent(dispatcher) == [('CPU', 'CPU at 1001'), ('CPU', 'CPU at 1301')]
+    assert dispatcher.suppressed == 1
+
+
+def test_min_duration(clock):
+    dispatcher = NotificationDispatcher(NullSink())
+    config_dict = dict(CONFIG, ALARM_MIN_DURATION=30)
+    # interrupted before 30 seconds, then 30 seconds above the threshold
+    run_ticks(dispatcher, clock, [(1, True, False), (20, True, False), (1, False, True), (1, True, False),
+                                  (29, True, False), (1, True, False)], config_dict)
+    assert get_sent(dispatcher) == [('CPU', 'CPU at 1053')]
+
+
+def test_coalesced_tick(clock):
+    dispatcher = NotificationDispatcher(NullSink())
+    dispatcher.evaluate('cpu', True, False, 'CPU', lambda: 'CPU: 95%', CONFIG)
+    dispatcher.evaluate('memory', True, False, 'Memory', lambda: 'Memory: 90%', CONFIG)
+    dispatcher.evaluate('gpu', False, True, 'GPU', lambda: 'GPU: 10%', CONFIG)
+    dispatcher.flush(CONFIG, False)
+    assert get_sent(dispatcher) == [('CPU, Memory', 'CPU: CPU: 95%\nMemory: Memory: 90%')]
+
+
+def test_sink_errors(clock, capsys):
+    class FailingSink:
+        def send(self, title, message, config_dict, b_sound):
+            raise OSError(5, 'Input/output error')
+
+    dispatcher = NotificationDispatcher(FailingSink())
+    run_ticks(dispatcher, clock, [(1, True, False), (1, False, True)] * 3, dict(CONFIG, ALARM_COOLDOWN=0))
+    dispatcher.close()
+    assert dispatcher.failed == 3 and dispatcher.sent == 0
+    assert capsys.readouterr().err.count('WARNING: notification not sent (OSError') == 1
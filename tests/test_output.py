@@ -0,0 +1,35 @@
+#
+# @file <test_output.py>
+#
+# @author Fernando Mendiburu - <fernando.mendiburu@ee.ufcg.edu.br>
+#
+
+import io
+import json
+
+from output import BufferedOutput, JSONLinesFormat, CSVFormat
+
+
+def get_output():
+    stream = io.BytesIO()
+    return stream, BufferedOutput({'OUTPUT_FLUSH': 'record'}, stream)
+
+
+def test_jsonl_new_fields():
+    stream, output = get_output()
+    record_format = JSONLinesFormat(output)
+    record_format.write({'cpu': 1.0}, now=1)
+    record_format.write({'cpu': 2.0, 'disk_utilization_percent.sda': 5.0}, now=2)
+    lines = [json.loads(line) for line in stream.getvalue().decode().splitlines()]
+    assert lines == [{'time': 1, 'cpu': 1.0}, {'time': 2, 'cpu': 2.0, 'disk_utilization_percent.sda': 5.0}]
+
+
+def test_csv_one_header():
+    stream, output = get_output()
+    record_format = CSVFormat(output)
+    record_format.write({'cpu': 1.0, 'disk_utilization_percent.sda': None}, now=1)
+    record_format.write({'cpu': 2.0, 'disk_utilization_percent.sda': 5.0}, now=2)
+    record_format.write({'cpu': 3.0, 'disk_utilization_percent.sda': 6.0, 'disk_utilization_percent.sdb': 1.0}, now=3)
+    record_format.write({'cpu': 4.0}, now=4)
+    assert stream.getvalue().decode().splitlines() == ['time,cpu,disk_utilization_percent.sda', '1,1.0,', '2,2.0,5.0',
+                                                       '3,3.0,6.0', '4,4.0,']
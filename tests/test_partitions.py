@@ -0,0 +1,35 @@
+#
+# @file <test_partitions.py>
+#
+# @author Fernando Mendiburu - <fernando.mendiburu@ee.ufcg.edu.br>
+#
+
+import threading
+
+import partitions
+from partitions import StatPool
+
+
+def test_blocked_workers_are_replaced(monkeypatch):
+    hung = threading.Event()
+
+    def disk_usage(mountpoint):
+        if mountpoint.startswith('/nfs'):
+            hung.wait()
+        return mountpoint
+
+    monkeypatch.setattr(partitions.psutil, 'disk_usage', disk_usage)
+    pool = StatPool(workers=2, max_workers=4)
+    try:
+        usages, stalled = pool.stat(['/nfs0', '/nfs1'], 0.1)
+        assert usages == {} and sorted(stalled) == ['/nfs0', '/nfs1']
+        # both workers are blocked: two new ones measure the other partitions
+        usages, stalled = pool.stat(['/nfs0', '/nfs1', '/', '/home'], 1)
+        assert usages == {'/': '/', '/home': '/home'} and sorted(stalled) == ['/nfs0', '/nfs1']
+        assert pool.threads == 4
+
+        pool.stat(['/nfs2', '/nfs3'], 0.1)
+        usages, stalled = pool.stat(['/'], 0.1)        # at most max_workers threads
+        assert pool.threads == 4 and stalled == ['/']
+    finally:
+        hung.set()
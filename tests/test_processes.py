@@ -0,0 +1,49 @@
+#
+# @file <test_processes.py>
+#
+# @author Fernando Mendiburu - <fernando.mendiburu@ee.ufcg.edu.br>
+#
+
+import processes
+from conftest import FakeParameters
+from fake_psutil import FakePsutil
+from processes import Processes
+
+
+def get_collector(monkeypatch, fake_psutil, config_params=None):
+    monkeypatch.setattr(processes, 'psutil', fake_psutil)
+    return Processes(FakeParameters(dict({'PROCESSES_TOP_N': 3, 'CPU_MIN_WINDOW': 0}, **(config_params or {}))))
+
+
+def test_scan_only_when_pids_change(monkeypatch):
+    fake_psutil = FakePsutil(processes=3)
+    collector = get_collector(monkeypatch, fake_psutil)
+    assert [cpu for cpu, _, _, _ in collector.top_cpu] == [0.0] * 3       # first measure of each process
+    collector.update()
+    assert all(cpu > 0 for cpu, _, _, _ in collector.top_cpu)
+    assert collector.scans == 1
+
+    fake_psutil.processes = 4
+    collector.update()
+    assert collector.scans == 2 and sorted(collector.processes) == [1, 2, 3, 4]
+
+
+def test_reused_pid(monkeypatch):
+    fake_psutil = FakePsutil(processes=3)
+    collector = get_collector(monkeypatch, fake_psutil)
+    collector.update()
+    # the PID 2 is now another process (and the PID 3 finished): its CPU usage is not known yet
+    fake_psutil.create_times[2] = 2000.0
+    fake_psutil.processes = 2
+    collector.update()
+    assert {pid: cpu > 0 for cpu, _, pid, _ in collector.top_cpu} == {1: True, 2: False}
+    assert collector.reused == 1 and collector.processes[2][0].create_time == 2000.0
+
+
+def test_cpu_min_window(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(processes.time, 'sleep', sleeps.append)
+    collector = get_collector(monkeypatch, FakePsutil(processes=3), {'CPU_MIN_WINDOW': 0.5})
+    collector.update()
+    # the second update, just after the first one, waits the rest of the window
+    assert len(sleeps) == 1 and 0.4 < sleeps[0] <= 0.5
@@ -0,0 +1,94 @@
+#
+# @file <test_procfs.py>
+#
+# @author Fernando Mendiburu - <fernando.mendiburu@ee.ufcg.edu.br>
+#
+
+import os
+import sys
+
+import psutil
+import pytest
+
+from conftest import FakeParameters
+from fake_psutil import FakeProcfs
+from procfs import HwmonIndex, ProcfsBackend, get_backend, get_hwmon_index
+from system import Temperature
+
+
+@pytest.fixture
+def root(tmp_path):
+    FakeProcfs.write(str(tmp_path), cores=4, mounts=2, nics=2, sensors=4, packages=2)
+    return str(tmp_path)
+
+
+def test_hwmon_core_of_each_package(root):
+    temperatures = HwmonIndex(root).read()
+    assert sorted(temperatures) == [('coretemp.0', 'Core 0'), ('coretemp.0', 'Core 1'),
+                                    ('coretemp.1', 'Core 0'), ('coretemp.1', 'Core 1')]
+    assert temperatures[('coretemp.1', 'Core 0')].current == 30.5
+    assert temperatures[('coretemp.1', 'Core 0')].critical == 100.0
+
+
+def test_temperature_names(root):
+    config_params = {'PROCFS_ROOT': root, 'BACKEND': 'procfs'}
+    temperature = Temperature(FakeParameters(config_params))
+    assert sorted(temperature.get_samples()) == ['temp.coretemp.0 Core 0', 'temp.coretemp.0 Core 1',
+                                                 'temp.coretemp.1 Core 0', 'temp.coretemp.1 Core 1']
+    assert temperature.get_limit('temp.coretemp.1 Core 0', 'high') == 80.0
+    # one index for the collector and the procfs backend
+    assert get_backend(config_params).hwmon is get_hwmon_index(config_params)
+
+
+def test_fake_procfs(root):
+    backend = ProcfsBackend(root)
+    assert backend.virtual_memory().total == 536870912 * 1024
+    assert backend.virtual_memory().available == 268435456 * 1024
+    assert len(backend.cpu_times(percpu=True)) == 4
+    assert backend.boot_time() == 1600000000.0
+    assert backend.net_io_counters(pernic=True)['eth1'].bytes_recv == 3000
+    assert backend.disk_io_counters().read_bytes == 80 * 512
+    backend.close()
+
+
+linux_only = pytest.mark.skipif(not sys.platform.startswith('linux') or not os.path.exists('/proc/stat'),
+                                reason='procfs backend')
+
+
+def assert_between(first, value, last):
+    # counters read by psutil before and after the procfs backend
+    for field in value._fields:
+        assert getattr(first, field) <= getattr(value, field) <= getattr(last, field), field
+
+
+@linux_only
+def test_parsers_same_as_psutil():
+    backend = ProcfsBackend('/')
+    assert backend.boot_time() == pytest.approx(psutil.boot_time(), abs=1)
+    assert len(backend.cpu_times(percpu=True)) == len(psutil.cpu_times(percpu=True))
+    assert backend.virtual_memory().total == psutil.virtual_memory().total
+    assert backend.virtual_memory().available == pytest.approx(psutil.virtual_memory().available,
+                                                               abs=psutil.virtual_memory().total * 0.02)
+    assert backend.swap_memory().total == psutil.swap_memory().total
+
+    first = psutil.cpu_times()
+    value = backend.cpu_times()
+    last = psutil.cpu_times()
+    for field in ('user', 'system', 'idle'):
+        assert getattr(first, field) - 0.01 <= getattr(value, field) <= getattr(last, field) + 0.01, field
+
+    first = psutil.net_io_counters(pernic=True)
+    values = backend.net_io_counters(pernic=True)
+    last = psutil.net_io_counters(pernic=True)
+    assert values.keys() == first.keys()
+    for nic, value in values.items():
+        assert_between(first[nic], value, last[nic])
+
+    first = psutil.disk_io_counters(perdisk=True)
+    values = backend.disk_io_counters(perdisk=True)
+    last = psutil.disk_io_counters(perdisk=True)
+    assert values.keys() == first.keys()
+    for disk, value in values.items():
+        for field in ('read_count', 'write_count', 'read_bytes', 'write_bytes'):
+            assert getattr(first[disk], field) <= getattr(value, field) <= getattr(last[disk], field), field
+    backend.close()
@@ -0,0 +1,36 @@
+#
+# @file <test_profiler.py>
+#
+# @author Fernando Mendiburu - <fernando.mendiburu@ee.ufcg.edu.br>
+#
+
+import threading
+
+from metrics import OpenMetrics
+from profiler import SelfStats, IterationProfile
+from sensor import Sensor
+
+
+def test_self_duration_stats():
+    with SelfStats.timer('render', 'test'):
+        pass
+    page = OpenMetrics.encode(Sensor.get_self_metrics()).decode()
+    assert 'quantile=' not in page
+    assert 'pc_status_self_duration_seconds{category="render",name="test",stat="p99"}' in page
+    assert 'pc_status_self_calls_total{category="render",name="test"}' in page
+
+
+def test_collector_threads_profiled(tmp_path, monkeypatch):
+    for b_global in (False, True):
+        monkeypatch.setattr(IterationProfile, 'B_GLOBAL', b_global)
+        profile = IterationProfile(1, str(tmp_path / 'pc_status.prof'))
+        profile.start()
+        results = []
+        thread = threading.Thread(target=lambda: results.append(profile.run(lambda: 42)))
+        thread.start()
+        thread.join()
+        assert profile.tick()
+        assert results == [42]
+        # Python 3.12+: the profile of the main thread has the other threads
+        assert len(profile.thread_profiles) == (0 if b_global else 1)
+        assert 'Profile of 1 iterations' in profile.get_report()
@@ -0,0 +1,34 @@
+#
+# @file <test_rates.py>
+#
+# @author Fernando Mendiburu - <fernando.mendiburu@ee.ufcg.edu.br>
+#
+
+from collections import namedtuple
+
+from rates import CounterRates
+
+Counters = namedtuple('Counters', ['bytes_recv', 'packets_recv'])
+
+
+def test_decrease_is_reset():
+    rates = CounterRates(['bytes_recv', 'packets_recv'])
+    rates.update({'eth0': Counters(4000000000, 100)}, 0)
+    rates.update({'eth0': Counters(4000001000, 110)}, 1)
+    assert rates.get_rates('eth0') == {'bytes_recv': 1000.0, 'packets_recv': 10.0, 'interval': 1}
+    # NIC reset: no rates (not a 32 bits wraparound of ~4GiB), then from the counters after the reset
+    rates.update({'eth0': Counters(500, 5)}, 2)
+    assert rates.get_rates('eth0') is None and rates.get_deltas('eth0') is None
+    rates.update({'eth0': Counters(2500, 7)}, 3)
+    assert rates.get_deltas('eth0') == {'bytes_recv': 2000, 'packets_recv': 2}
+
+
+def test_min_interval_and_removed_device():
+    rates = CounterRates(['bytes_recv', 'packets_recv'], min_interval=0.5)
+    rates.update({'eth0': Counters(0, 0), 'eth1': Counters(0, 0)}, 0)
+    rates.update({'eth0': Counters(100, 1), 'eth1': Counters(100, 1)}, 0.2)
+    assert rates.get_rates('eth0') is None
+    rates.update({'eth0': Counters(400, 4), 'eth1': Counters(400, 4)}, 2)
+    assert rates.get_rates('eth0')['bytes_recv'] == 200.0
+    rates.update({'eth0': Counters(600, 6)}, 3)
+    assert rates.get_rates('eth1') is None and 'eth1' not in rates.previous
@@ -0,0 +1,67 @@
+#
+# @file <test_ring_buffer.py>
+#
+# @author Fernando Mendiburu - <fernando.mendiburu@ee.ufcg.edu.br>
+#
+
+import random
+
+import pytest
+
+from ring_buffer import MetricHistory, RingBuffer
+
+
+def test_wrap_and_eviction():
+    buffer = RingBuffer(4)
+    assert (buffer.get_min(), buffer.get_max(), buffer.get_mean(), buffer.get_last()) == (None, None, None, None)
+    for value in [1.0, 9.0, 5.0, 3.0]:
+        buffer.append(value, 0)
+    assert (buffer.get_min(), buffer.get_max(), buffer.get_mean()) == (1.0, 9.0, 4.5)
+    # the minimum is evicted first, then the maximum
+    buffer.append(4.0, 0)
+    assert (buffer.get_min(), buffer.get_max(), buffer.get_mean()) == (3.0, 9.0, 5.25)
+    buffer.append(2.0, 0)
+    assert (buffer.get_min(), buffer.get_max(), buffer.get_mean()) == (2.0, 5.0, 3.5)
+    assert len(buffer) == 4 and buffer.get_values(10) == [5.0, 3.0, 4.0, 2.0] and buffer.get_last() == 2.0
+
+
+@pytest.mark.parametrize('capacity', [1, 2, 7, 16])
+def test_same_as_slices(capacity):
+    rng = random.Random(capacity)
+    buffer = RingBuffer(capacity)
+    values = []
+    for _ in range(capacity * 10):
+        # repeated values, increasing and decreasing runs
+        value = float(rng.choice([rng.randint(0, 5), len(values) % 13, -(len(values) % 11)]))
+        buffer.append(value, 0)
+        values.append(value)
+        last = values[-capacity:]
+        assert buffer.get_min() == min(last)
+        assert buffer.get_max() == max(last)
+        assert buffer.get_mean() == pytest.approx(sum(last) / len(last))
+
+
+def test_percentile_windows():
+    buffer = RingBuffer(8)
+    for now in range(12):       # 4 to 11 are kept
+        buffer.append(float(now), now)
+    assert list(buffer.get_window(3, 11)) == [11.0, 10.0, 9.0, 8.0]
+    assert list(buffer.get_window(100, 11)) == [float(value) for value in range(11, 3, -1)]
+    assert buffer.get_window(1, 20).tolist() == []
+    assert buffer.get_percentile(50) == 7.5
+    assert buffer.get_percentile(100) == 11.0 and buffer.get_percentile(0) == 4.0
+    assert buffer.get_percentile(50, 3, 11) == 9.5
+    assert buffer.get_percentile(90, 4, 11) == pytest.approx(10.6)
+    assert buffer.get_percentile(50, 1, 20) is None
+    assert buffer.get_window_stats(3, 50, 11) == {'min': 8.0, 'max': 11.0, 'mean': 9.5, 'percentile': 9.5, 'count': 4}
+    assert buffer.get_window_stats(1, 50, 20) is None
+
+
+def test_history_skips_missing_values():
+    history = MetricHistory(4)
+    history.record({'cpu': 10.0, 'gpu': None}, 0)
+    history.record({'cpu': 30.0}, 1)
+    assert history.get('gpu') is None
+    assert history.get_percentile('cpu', 50) == 20.0
+    assert history.get_percentile('gpu', 50) is None
+    assert history.get_summary_msg('gpu', 60, 95, '%') == 'gpu: no samples in the last 60s'
@@ -0,0 +1,133 @@
+#
+# @file <test_rules.py>
+#
+# @author Fernando Mendiburu - <fernando.mendiburu@ee.ufcg.edu.br>
+#
+
+import pytest
+
+from rules import Rule, RuleEngine, Window
+
+
+class FakeDispatcher:
+    # the last state of each alarm, as given to NotificationDispatcher.evaluate
+    def __init__(self):
+        self.states = {}
+
+    def evaluate(self, name, b_trigger, b_clear, title, get_message, config_dict):
+        self.states[name] = (b_trigger, b_clear, get_message() if b_trigger else None)
+
+
+LIMITS = {('temp.core0', 'high'): 80.0, ('temp.core0', 'critical'): 100.0,
+          ('temp.core1', 'high'): 70.0, ('temp.core1', 'critical'): 90.0}
+
+
+def get_limit(series, limit):
+    return LIMITS.get((series, limit))
+
+
+def evaluate(engine, now):
+    dispatcher = FakeDispatcher()
+    engine.evaluate(dispatcher, {}, get_limit, now)
+    return dispatcher.states
+
+
+def test_rate_per_minute():
+    rule = Rule('battery', 'rate(battery, 10m) < -2%/min', {})
+    assert (rule.function, rule.pattern, rule.seconds, rule.operator) == ('rate', 'battery', 600.0, '<')
+    assert rule.unit == '/min' and rule.threshold == pytest.approx(-2 / 60)
+
+    engine = RuleEngine({'RULES': {'battery': 'rate(battery, 10m) < -2%/min'}})
+    engine.record({'battery': 90.0}, 0)
+    engine.record({'battery': 87.0}, 60)
+    b_trigger, b_clear, message = evaluate(engine, 60)['rule.battery']
+    assert b_trigger and not b_clear
+    assert message == 'rate(battery, 10m) < -2%/min (battery: -3.00/min)'
+    engine.record({'battery': 86.0}, 120)
+    assert evaluate(engine, 120)['rule.battery'][0] is False        # -2%/min between 0 and 120s
+
+
+def test_sensor_limits():
+    engine = RuleEngine({'RULES': {'hot': 'max(temp.*, 30s) >= high', 'burning': 'max(temp.*, 30s) >= critical'}})
+    engine.record({'temp.core0': 85.0, 'temp.core1': 65.0, 'temp.other': 200.0}, 0)
+    states = evaluate(engine, 0)
+    assert states['rule.hot'][:2] == (True, False) and 'temp.core0: 85.00' in states['rule.hot'][2]
+    assert 'temp.core1' not in states['rule.hot'][2] and 'temp.other' not in states['rule.hot'][2]   # no limit
+    assert states['rule.burning'][:2] == (False, True)
+
+
+def test_config_key_threshold():
+    config_params = {'HIGH_USAGE_CPU': 90, 'RULES': {'cpu': 'avg(cpu.total, 1m) > HIGH_USAGE_CPU'}}
+    engine = RuleEngine(config_params)
+    assert engine.rules[0].threshold == 90
+    engine.record({'cpu.total': 95.0}, 0)
+    assert evaluate(engine, 0)['rule.cpu'][0]
+    # reloaded config.txt: the threshold of the new dict
+    engine.set_parameters(dict(config_params, HIGH_USAGE_CPU=99))
+    assert engine.rules[0].threshold == 99
+    assert not evaluate(engine, 1)['rule.cpu'][0]
+
+
+@pytest.mark.parametrize('expression', ['avg(cpu.total) > 90', 'sum(cpu.total, 5m) > 90', 'avg(cpu.total, 5m) = 90',
+                                        'avg(cpu.total, 5m) > ninety', 'avg(cpu.total, 0s) > 90',
+                                        'avg(cpu.total, 5m) > 2%/min', 'avg(cpu.total, 5m) > PATH_NOTIF_ICON'])
+def test_rejected_expressions(expression):
+    with pytest.raises(ValueError):
+        Rule('rule', expression, {'PATH_NOTIF_ICON': '/tmp/icon.png'})
+
+
+def test_invalid_rules_keep_previous(capsys):
+    engine = RuleEngine({'RULES': {'cpu': 'avg(cpu.total, 1m) > 90'}})
+    engine.set_parameters({'RULES': {'cpu': 'avg(cpu.total, 1m) > 90', 'bad': 'avg(cpu.total, 1m) => 90'}})
+    assert [rule.name for rule in engine.rules] == ['cpu']
+    assert 'WARNING: RULES not loaded' in capsys.readouterr().err
+
+
+def test_window_eviction():
+    window = Window(10)
+    for now, value in enumerate([5.0, 1.0, 9.0, 3.0, 7.0]):
+        window.push(now, value)
+    assert (window.get('min', 4), window.get('max', 4), window.get('avg', 4)) == (1.0, 9.0, 5.0)
+    # the samples of 0 and 1 are out of the window
+    assert (window.get('min', 11.5), window.get('max', 11.5), window.get('avg', 11.5)) == (3.0, 9.0, 19.0 / 3)
+    # the minimum and maximum are not the first pushed values of their queues
+    window.push(12.5, 4.0)
+    assert (window.get('min', 12.5), window.get('max', 12.5), window.get('avg', 12.5)) == (3.0, 7.0, 14.0 / 3)
+    assert window.get('rate', 12.5) == pytest.approx((4.0 - 3.0) / (12.5 - 3))
+    assert (window.get('min', 30), window.get('max', 30), window.get('avg', 30), window.get('rate', 30)) == \
+           (None, None, None, None)
+
+
+def test_hysteresis_clearing():
+    engine = RuleEngine({'RULES': {'cpu': {'rule': 'avg(cpu.total, 1s) > 90', 'hysteresis': 5}}})
+    expected = [(95.0, (True, False)), (88.0, (False, False)), (85.0, (False, False)), (84.0, (False, True))]
+    for now, (value, state) in enumerate(expected):
+        engine.record({'cpu.total': value}, now * 2)
+        assert evaluate(engine, now * 2)['rule.cpu'][:2] == state
+
+
+def test_hysteresis_of_rates():
+    # in the unit of the threshold: 1%/min of hysteresis
+    rule = Rule('battery', 'rate(battery, 10m) < -2%/min', {}, hysteresis=1)
+    assert not rule.is_cleared(-1.5 / 60, rule.threshold)
+    assert rule.is_cleared(-0.5 / 60, rule.threshold)
+
+
+def test_vanished_series_pruned():
+    engine = RuleEngine({'RULES': {'process': 'avg(process.*, 10s) > 50', 'cpu': 'max(cpu.*, 10s) > 90'}})
+    engine.record({'process.1': 60.0, 'process.2': 70.0, 'cpu.total': 10.0, 'memory': 40.0}, 0)
+    assert 'rule.process' in evaluate(engine, 0)
+    assert sorted(engine.series_windows) == ['cpu.total', 'memory', 'process.1', 'process.2']
+
+    # process.1 ended: its window is empty after 10s
+    for now in range(5, 5 + RuleEngine.PRUNE_PERIOD + 1, 5):
+        engine.record({'process.2': 70.0, 'cpu.total': 10.0}, now)
+        evaluate(engine, now)
+    assert sorted(engine.series_windows) == ['cpu.total', 'process.2']
+    assert sorted(engine.windows) == [('cpu.total', 10.0), ('process.2', 10.0)]
+    assert [series for group in engine.groups.values() for series, _ in group.series] == ['process.2', 'cpu.total']
+
+    # measured again
+    engine.record({'process.1': 60.0, 'memory': 40.0}, 100)
+    b_trigger, _, message = evaluate(engine, 100)['rule.process']
+    assert b_trigger and 'process.1: 60.00' in message
@@ -0,0 +1,45 @@
+#
+# @file <test_rw_parameters.py>
+#
+# @author Fernando Mendiburu - <fernando.mendiburu@ee.ufcg.edu.br>
+#
+
+import os
+
+import pytest
+
+from common import Common
+from rw_parameters import CachedParametersFile, ReadParametersFiles
+
+
+def get_config_file(tmp_path, config_params):
+    config_file = CachedParametersFile(str(tmp_path / 'config.txt'), ReadParametersFiles.CONFIG_REQUIRED_KEYS,
+                                       ReadParametersFiles.CONFIG_OPTIONAL_KEYS)
+    Common.write_params(config_file.file, config_params)
+    assert config_file.load()
+    return config_file
+
+
+def rewrite(config_file, config_params):
+    Common.write_params(config_file.file, config_params)
+    stat = os.stat(config_file.file)
+    os.utime(config_file.file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))     # another mtime
+
+
+@pytest.mark.parametrize('key, value', [('SAMPLE_PERIODS', [1, 2]), ('HISTORY_RETENTION', '2d'),
+                                        ('HISTORY_CAPACITY', 3600.5), ('DISK_EXCLUDE_FSTYPES', 'tmpfs'),
+                                        ('LOOP_INTERVAL', '1'), ('HIGH_USAGE_CPU', None)])
+def test_invalid_reload_keeps_previous(tmp_path, config_params, capsys, key, value):
+    config_file = get_config_file(tmp_path, config_params)
+    rewrite(config_file, dict(config_params, **{key: value}))
+    assert not config_file.load()
+    assert config_file.params == config_params and config_file.error_count == 1
+    assert f'invalid value for key {key}' in capsys.readouterr().err
+
+
+def test_optional_keys(tmp_path, config_params):
+    config_file = get_config_file(tmp_path, config_params)
+    # the optional keys may be missing
+    rewrite(config_file, {key: value for key, value in config_params.items()
+                          if key not in ReadParametersFiles.CONFIG_OPTIONAL_KEYS})
+    assert config_file.load() and 'SAMPLE_PERIODS' not in config_file.params
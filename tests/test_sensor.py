@@ -0,0 +1,54 @@
+#
+# @file <test_sensor.py>
+#
+# @author Fernando Mendiburu - <fernando.mendiburu@ee.ufcg.edu.br>
+#
+
+import pytest
+
+from conftest import FakeParameters
+from sensor import Sensor
+
+
+@pytest.fixture
+def sensor(config_params):
+    config_params['SAMPLE_PERIODS'] = {'memory': 0}
+    return Sensor(FakeParameters(config_params), ['memory'])
+
+
+def test_failed_update_keeps_values(sensor, capsys):
+    usage = sensor.memory.get_memory_usage()
+
+    def update():
+        raise PermissionError(13, 'Permission denied')
+
+    sensor.memory.update = update
+    assert sensor.update() == []
+    assert sensor.update() == []
+    metrics = sensor.get_collector_metrics()['memory']
+    assert metrics['errors'] == 2 and metrics['stale']
+    assert sensor.memory.get_memory_usage() == usage
+    assert 'WARNING: memory update failed' in capsys.readouterr().err
+
+    del sensor.memory.update
+    assert sensor.update() == ['memory']
+    assert not sensor.get_collector_metrics()['memory']['stale']
+
+
+def test_rules_only_in_loop(config_params):
+    config_params.update(SAMPLE_PERIODS={'memory': 0}, RULES={'memory': 'avg(memory, 5m) >= 0'})
+    for b_rules in (True, False):
+        sensor = Sensor(FakeParameters(config_params), ['memory'], b_rules=b_rules)
+        sensor.update()
+        assert bool(sensor.rules.windows) == b_rules
+        sensor.close()
+
+
+def test_history_records_updated_collectors(config_params):
+    config_params.update(SAMPLE_PERIODS={'memory': 0, 'cpu': 3600}, CPU_MIN_WINDOW=0)
+    sensor = Sensor(FakeParameters(config_params), ['memory', 'cpu'])
+    assert sorted(sensor.update()) == ['cpu', 'memory']
+    assert sensor.update() == ['memory']
+    assert len(sensor.history.get('memory')) == 2
+    assert len(sensor.history.get('cpu.total')) == 1
+    sensor.close()
@@ -0,0 +1,89 @@
+#
+# @file <test_shared_snapshot.py>
+#
+# @author Fernando Mendiburu - <fernando.mendiburu@ee.ufcg.edu.br>
+#
+
+import sys
+import math
+
+import pytest
+
+import shared_snapshot
+from shared_snapshot import SnapshotWriter, SnapshotReader, SnapshotLayout
+
+
+def test_publish_read(tmp_path):
+    file = str(tmp_path / 'snapshot')
+    writer = SnapshotWriter(file)
+    assert writer.publish({'cpu': 12.5, 'battery': None}, now=100.0)
+    now, flags, values = SnapshotReader(file).read()
+    assert now == 100.0 and flags == 0
+    assert values['cpu'] == 12.5 and math.isnan(values['battery'])
+    writer.close()
+
+
+def test_grow_reopens_reader(tmp_path):
+    # a layout larger than the file: the readers of the previous file open the new one
+    file = str(tmp_path / 'snapshot')
+    writer = SnapshotWriter(file)
+    writer.publish({'a': 1.0})
+    reader = SnapshotReader(file)
+    assert reader.get('a') == 1.0
+    previous = reader.buffer
+    record = {f'field{i}': float(i) for i in range(2000)}
+    writer.publish(record)
+    sequence = SnapshotLayout.SEQUENCE.unpack_from(previous, SnapshotLayout.SEQUENCE_OFFSET)[0]
+    assert sequence % 2 == 0
+    assert SnapshotLayout.HEADER.unpack_from(previous)[2] & SnapshotLayout.FLAG_MOVED
+    assert reader.get('field1999') == 1999.0
+    writer.close()
+    assert reader.read()[1] & SnapshotLayout.FLAG_STOPPED
+
+
+def test_new_fields_same_file(tmp_path):
+    file = str(tmp_path / 'snapshot')
+    writer = SnapshotWriter(file)
+    writer.publish({'a': 1.0})
+    reader = SnapshotReader(file)
+    reader.get('a')
+    writer.publish({'a': 2.0, 'b': 3.0})
+    assert reader.read()[2] == {'a': 2.0, 'b': 3.0}
+    writer.close()
+
+
+def test_one_publisher(tmp_path):
+    file = str(tmp_path / 'snapshot')
+    owner = SnapshotWriter(file)
+    other = SnapshotWriter(file)
+    assert owner.publish({'a': 1.0})
+    assert not other.publish({'a': 2.0})
+    assert SnapshotReader(file).get('a') == 1.0
+    owner.close()
+    assert other.publish({'a': 3.0})
+    assert SnapshotReader(file).get('a') == 3.0
+    other.close()
+
+
+def test_main_exit_codes(tmp_path, monkeypatch, capsys):
+    file = str(tmp_path / 'snapshot')
+    monkeypatch.setattr(sys, 'argv', ['shared_snapshot.py', '--file', file, 'a'])
+    with pytest.raises(SystemExit) as exit_info:
+        shared_snapshot.main()
+    assert exit_info.value.code == 1
+
+    writer = SnapshotWriter(file)
+    assert writer.publish({'a': 1.5})
+    shared_snapshot.main()
+    assert capsys.readouterr().out == '1.5\n'
+
+    # writer killed while writing: the sequence stays odd
+    with open(file, 'r+b') as fp:
+        sequence = SnapshotLayout.SEQUENCE.unpack_from(fp.read(), SnapshotLayout.SEQUENCE_OFFSET)[0]
+        fp.seek(SnapshotLayout.SEQUENCE_OFFSET)
+        fp.write(SnapshotLayout.SEQUENCE.pack(sequence + 1))
+    with pytest.raises(SystemExit) as exit_info:
+        shared_snapshot.main()
+    assert exit_info.value.code == 3
+    assert 'is written continuously' in capsys.readouterr().err
+    writer.close()